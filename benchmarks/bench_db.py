@@ -0,0 +1,382 @@
+"""
+Offline micro-benchmarks of the database manager and of the checks.
+
+The benchmarks run against a temporary SQLite database filled with a realistic
+amount of blacklisted users and warnings, no Discord connection is needed. Run them
+from the root of the repository:
+
+    python -m benchmarks.bench_db --rows 10000 100000 --output report.json
+    python -m benchmarks.bench_db --rows 10000 --compare report.json
+
+The report is a JSON file with the ops/sec and the latency percentiles of every
+benchmark for every database size, so that two commits can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from contextlib import closing
+from typing import Awaitable, Callable, Dict, List
+
+import aiosqlite
+
+from exceptions import UserBlacklisted, UserNotOwner
+from helpers import checks, db_manager, migrations
+from helpers.config import config_service
+
+# Discord IDs are snowflakes, any 18 digit number looks like one.
+SNOWFLAKE_MIN = 100_000_000_000_000_000
+SNOWFLAKE_MAX = 999_999_999_999_999_999
+
+SERVERS = 200
+OWNER_ID = 123_456_789_012_345_678
+
+
+def seed(path: str, rows: int, rng: random.Random) -> Dict[str, list]:
+    """
+    Create the database and fill it with `rows` blacklisted users and `rows`
+    warnings, spread over a few servers with a few users having most warnings.
+    """
+
+    async def migrate():
+        async with aiosqlite.connect(path) as db:
+            await migrations.migrate(db)
+
+    asyncio.run(migrate())
+
+    blacklisted = rng.sample(range(SNOWFLAKE_MIN, SNOWFLAKE_MAX), rows)
+    servers = [rng.randint(SNOWFLAKE_MIN, SNOWFLAKE_MAX) for _ in range(SERVERS)]
+    users = [
+        rng.randint(SNOWFLAKE_MIN, SNOWFLAKE_MAX) for _ in range(max(1, rows // 5))
+    ]
+    next_ids: Dict[tuple, int] = {}
+    warnings = []
+    for _ in range(rows):
+        # A Pareto distribution gives a few users a long history, like in real
+        # servers.
+        user = users[min(int(rng.paretovariate(1.2)) - 1, len(users) - 1)]
+        server = servers[rng.randrange(len(servers))]
+        warn_id = next_ids.get((server, user), 0) + 1
+        next_ids[(server, user)] = warn_id
+        warnings.append((server, user, warn_id, OWNER_ID, "Benchmark warning"))
+
+    with closing(sqlite3.connect(path)) as db, db:
+        db.executemany(
+            "INSERT INTO blacklist(user_id) VALUES (?)",
+            ((user_id,) for user_id in blacklisted),
+        )
+        db.executemany(
+            "INSERT INTO warns(server_id, user_id, id, moderator_id, reason) "
+            "VALUES (?, ?, ?, ?, ?)",
+            warnings,
+        )
+    heavy = max(next_ids, key=next_ids.get)
+    return {
+        "blacklisted": blacklisted,
+        "servers": servers,
+        "users": users,
+        "heavy_user": [heavy],
+        "heavy_user_warns": next_ids[heavy],
+        "warned": list(next_ids),
+    }
+
+
+def percentile(samples: List[float], value: float) -> float:
+    index = min(len(samples) - 1, int(round(value / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+async def measure(
+    operation: Callable[[], Awaitable], iterations: int, concurrency: int
+) -> Dict[str, float]:
+    """
+    Run an operation `iterations` times from `concurrency` concurrent workers and
+    measure the latency of every call.
+    """
+    latencies: List[float] = []
+    remaining = iterations
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started_at = time.perf_counter()
+            await operation()
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    return {
+        "iterations": len(latencies),
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_us": round(percentile(latencies, 50) * 1e6, 1),
+        "p95_us": round(percentile(latencies, 95) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 99) * 1e6, 1),
+        "max_us": round(latencies[-1] * 1e6, 1),
+    }
+
+
+async def run_benchmarks(
+    path: str, data: Dict[str, list], args: argparse.Namespace
+) -> Dict[str, dict]:
+    rng = random.Random(args.seed + 1)
+    await db_manager.connect(
+        path, durability=args.durability, commit_window=args.commit_window
+    )
+    not_blacklisted = checks.not_blacklisted().predicate
+    is_owner = checks.is_owner().predicate
+
+    def context(user_id: int):
+        return types.SimpleNamespace(author=types.SimpleNamespace(id=user_id))
+
+    def blacklisted_or_not() -> int:
+        if rng.random() < 0.1:
+            return rng.choice(data["blacklisted"])
+        return rng.randint(SNOWFLAKE_MIN, SNOWFLAKE_MAX)
+
+    def warned():
+        return rng.choice(data["warned"])
+
+    new_users: List[int] = []
+    added_warns: List[tuple] = []
+
+    async def add_user_to_blacklist():
+        user_id = rng.randint(SNOWFLAKE_MIN, SNOWFLAKE_MAX)
+        new_users.append(user_id)
+        await db_manager.add_user_to_blacklist(user_id)
+
+    async def remove_user_from_blacklist():
+        if not new_users:
+            await add_user_to_blacklist()
+        await db_manager.remove_user_from_blacklist(new_users.pop())
+
+    async def add_users_to_blacklist():
+        # One chunk of a blacklist import.
+        await db_manager.add_users_to_blacklist(
+            rng.randint(SNOWFLAKE_MIN, SNOWFLAKE_MAX) for _ in range(1000)
+        )
+
+    async def get_blacklist_page():
+        await db_manager.get_blacklist_page(rng.choice(data["blacklisted"]), limit=1000)
+
+    async def iter_blacklist():
+        async for _ in db_manager.iter_blacklist():
+            pass
+
+    async def add_warn():
+        server, user = warned()
+        warn_id = await db_manager.add_warn(user, server, OWNER_ID, "Benchmark")
+        added_warns.append((warn_id, user, server))
+
+    async def remove_warn():
+        if not added_warns:
+            await add_warn()
+        await db_manager.remove_warn(*added_warns.pop())
+
+    async def add_warns():
+        server = rng.choice(data["servers"])
+        await db_manager.add_warns(
+            rng.sample(data["users"], min(50, len(data["users"]))),
+            server,
+            OWNER_ID,
+            "Benchmark raid",
+        )
+
+    async def get_warnings():
+        server, user = warned()
+        await db_manager.get_warnings(user, server)
+
+    async def get_warnings_heavy_user():
+        server, user = data["heavy_user"][0]
+        await db_manager.get_warnings(user, server)
+
+    async def get_warnings_page():
+        server, user = warned()
+        await db_manager.get_warnings_page(user, server, limit=10)
+
+    async def get_warnings_page_heavy_user():
+        server, user = data["heavy_user"][0]
+        await db_manager.get_warnings_page(user, server, limit=10)
+
+    async def get_warnings_page_deep_heavy_user():
+        server, user = data["heavy_user"][0]
+        before_id = rng.randint(1, data["heavy_user_warns"]) + 1
+        await db_manager.get_warnings_page(user, server, before_id=before_id, limit=10)
+
+    async def iter_warnings_heavy_user():
+        server, user = data["heavy_user"][0]
+        async for _ in db_manager.iter_warnings(user, server):
+            pass
+
+    async def count_warnings():
+        server, user = warned()
+        await db_manager.count_warnings(user, server)
+
+    async def check_not_blacklisted():
+        try:
+            await not_blacklisted(context(blacklisted_or_not()))
+        except UserBlacklisted:
+            pass
+
+    async def check_is_owner():
+        try:
+            await is_owner(context(rng.choice((OWNER_ID, SNOWFLAKE_MIN))))
+        except UserNotOwner:
+            pass
+
+    iterations = args.iterations
+    benchmarks = [
+        ("is_blacklisted", lambda: db_manager.is_blacklisted(blacklisted_or_not())),
+        ("checks.not_blacklisted", check_not_blacklisted),
+        ("checks.is_owner", check_is_owner),
+        ("refresh_blacklist", db_manager.refresh_blacklist),
+        ("add_user_to_blacklist", add_user_to_blacklist),
+        ("remove_user_from_blacklist", remove_user_from_blacklist),
+        ("add_users_to_blacklist[1000]", add_users_to_blacklist),
+        ("get_blacklist_page[1000]", get_blacklist_page),
+        ("iter_blacklist", iter_blacklist),
+        ("add_warn", add_warn),
+        ("remove_warn", remove_warn),
+        ("add_warns[50]", add_warns),
+        ("get_warnings", get_warnings),
+        ("get_warnings[heavy user]", get_warnings_heavy_user),
+        ("get_warnings_page", get_warnings_page),
+        ("get_warnings_page[heavy user]", get_warnings_page_heavy_user),
+        ("get_warnings_page[heavy, deep]", get_warnings_page_deep_heavy_user),
+        ("iter_warnings[heavy user]", iter_warnings_heavy_user),
+        ("count_warnings", count_warnings),
+    ]
+    # Going through the whole blacklist is much slower than the rest, keep it short.
+    slow = {
+        "refresh_blacklist": max(1, iterations // 100),
+        "iter_blacklist": max(1, iterations // 100),
+        "add_users_to_blacklist[1000]": max(1, iterations // 20),
+    }
+    results = {}
+    try:
+        for name, operation in benchmarks:
+            if args.only and not any(part in name for part in args.only):
+                continue
+            results[name] = await measure(
+                operation, slow.get(name, iterations), args.concurrency
+            )
+            result = results[name]
+            print(
+                f"  {name:<32} {result['ops_per_sec']:>12} ops/s   "
+                f"p50 {result['p50_us']:>10} us   p99 {result['p99_us']:>10} us"
+            )
+    finally:
+        await db_manager.close()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """
+    Print the change of ops/sec and p99 latency against a previous report.
+    """
+    print(f"\nCompared to {baseline['meta'].get('commit', 'unknown')}:")
+    for rows, results in report["results"].items():
+        previous_results = baseline["results"].get(rows, {})
+        for name, result in results.items():
+            previous = previous_results.get(name)
+            if previous is None:
+                continue
+            throughput = result["ops_per_sec"] / previous["ops_per_sec"] - 1
+            p99 = (
+                result["p99_us"] / previous["p99_us"] - 1 if previous["p99_us"] else 0
+            )
+            print(f"  [{rows}] {name:<32} ops/s {throughput:+7.1%}   p99 {p99:+7.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[10_000],
+        help="Number of blacklisted users and of warnings to pre-fill, one run per "
+        "value.",
+    )
+    parser.add_argument("--iterations", type=int, default=2_000)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of concurrent callers, more than one shows the group commit.",
+    )
+    parser.add_argument(
+        "--durability", choices=("full", "normal", "fast"), default="normal"
+    )
+    parser.add_argument("--commit-window", type=float, default=0.005)
+    parser.add_argument(
+        "--only", nargs="+", help="Only run the benchmarks containing these names."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--compare", help="A previous JSON report to compare with.")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "durability": args.durability,
+            "commit_window": args.commit_window,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, "config.json")
+        with open(config_path, "w") as file:
+            json.dump({"prefix": "!", "owners": [OWNER_ID]}, file)
+        config_service.path = config_path
+        config_service.load()
+
+        for rows in args.rows:
+            path = os.path.join(directory, f"benchmark-{rows}.db")
+            print(f"Filling a database with {rows} rows...")
+            data = seed(path, rows, random.Random(args.seed))
+            print(f"Running the benchmarks on {rows} rows:")
+            report["results"][str(rows)] = asyncio.run(
+                run_benchmarks(path, data, args)
+            )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"\nReport written to {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,659 @@
+"""
+End-to-end load test of the bot, without connecting to Discord.
+
+A stream of messages and slash command interactions, either synthetic or recorded,
+is fed to the bot through the same gateway parsers discord.py uses, so every event
+goes through `on_message`, `process_commands`, the checks, the cogs and
+`context.send`. The REST API and the interaction webhooks are replaced by a local
+stand-in that records every outbound call and answers with rate limits the way
+Discord does. Run it from the root of the repository:
+
+    python -m benchmarks.replay --events 5000
+    python -m benchmarks.replay --events 20000 --rate 500 --output replay.json
+    python -m benchmarks.replay --input recording.jsonl --speed 4
+
+A recording is a JSON-lines file with one event per line:
+
+    {"t": 0.0, "content": "!ping", "author": 3, "channel": 1}
+    {"t": 0.2, "interaction": "8ball", "options": {"question": "Yes?"}}
+
+where `t` is the offset in seconds from the start, and `author` and `channel` are
+indexes into the synthetic users and channels.
+"""
+import argparse
+import asyncio
+import datetime
+import importlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import discord
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+
+from helpers import db_manager
+from helpers.cache_policy import rss_bytes
+from helpers.config import config_service
+from helpers.metrics import metrics
+
+GUILD_ID = 900_000_000_000_000_001
+BOT_ID = 900_000_000_000_000_002
+PREFIX = "!"
+
+# The default mix of the synthetic stream. Most messages in a busy server are not
+# commands, names starting with a slash are sent as interactions.
+DEFAULT_MIX = (
+    "chatter=70,ping=8,8ball=6,help=3,server_info=3,get_bot_info=3,warnings=2,"
+    "rps=2,/ping=2,/8ball=1"
+)
+
+COMMAND_MESSAGES = {
+    "ping": "{prefix}ping",
+    "8ball": "{prefix}8ball Will this hold the load?",
+    "help": "{prefix}help",
+    "server_info": "{prefix}server_info",
+    "get_bot_info": "{prefix}get_bot_info",
+    "warnings": "{prefix}warnings {user_id}",
+    "rps": "{prefix}rps",
+    "coinflip": "{prefix}coinflip",
+    "stats": "{prefix}stats",
+}
+
+INTERACTION_OPTIONS = {
+    "8ball": {"question": "Will this hold the load?"},
+}
+
+CHATTER = (
+    "hello everyone",
+    "did anyone see the patch notes?",
+    "lol",
+    "brb",
+    "that's what I said yesterday",
+    "gg",
+)
+
+ALL_PERMISSIONS = str(discord.Permissions.all().value)
+
+_snowflakes = itertools.count(discord.utils.time_snowflake(datetime.datetime.now()))
+
+
+def snowflake() -> str:
+    return str(next(_snowflakes))
+
+
+def now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def user_payload(user_id: int, name: str, bot: bool = False) -> dict:
+    return {
+        "id": str(user_id),
+        "username": name,
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def member_payload(user: Optional[dict] = None) -> dict:
+    payload = {
+        "roles": [],
+        "joined_at": now_iso(),
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+        "nick": None,
+    }
+    if user is not None:
+        payload["user"] = user
+    return payload
+
+
+class FakeDiscord:
+    """
+    A stand-in for the REST API and the interaction webhooks of Discord.
+
+    Every call is recorded by route. Like Discord, each route and major parameter
+    (a channel for example) only accepts `limit` calls per `per` seconds, a call over
+    the limit is answered with a rate limit and, like the real client does, waits
+    for the bucket to reset before going through.
+    """
+
+    def __init__(self, limit: int = 5, per: float = 5.0, enabled: bool = True):
+        self.limit = limit
+        self.per = per
+        self.enabled = enabled
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.waited = 0.0
+        self._windows: Dict[str, Deque[float]] = defaultdict(deque)
+        # The guild answered to GET /guilds/{guild_id}, set once the workload is.
+        self.guild: Optional[dict] = None
+
+    async def _rate_limit(self, bucket: str) -> None:
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        window = self._windows[bucket]
+        while True:
+            now = loop.time()
+            while window and now - window[0] >= self.per:
+                window.popleft()
+            if len(window) < self.limit:
+                window.append(now)
+                return
+            retry_after = self.per - (now - window[0])
+            self.rate_limited[bucket.split(":")[0]] += 1
+            self.waited += retry_after
+            await asyncio.sleep(retry_after)
+
+    def message(self, channel_id: Any, payload: Optional[dict]) -> dict:
+        payload = payload or {}
+        return {
+            "id": snowflake(),
+            "channel_id": str(channel_id),
+            "author": user_payload(BOT_ID, "ReplayBot", bot=True),
+            "content": payload.get("content") or "",
+            "timestamp": now_iso(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": payload.get("embeds") or [],
+            "components": payload.get("components") or [],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+        }
+
+    async def request(
+        self, route: discord.http.Route, *, files=None, form=None, **kwargs
+    ):
+        self.calls[route.key] += 1
+        await self._rate_limit(f"{route.key}:{route.major_parameters}")
+        payload = kwargs.get("json")
+        if form:
+            for field in form:
+                if field.get("name") == "payload_json":
+                    payload = json.loads(field["value"])
+        if route.method in ("POST", "PATCH") and "/messages" in route.path:
+            return self.message(route.channel_id, payload)
+        if route.method == "GET" and route.path == "/guilds/{guild_id}" and self.guild:
+            return {
+                **self.guild,
+                "approximate_member_count": self.guild["member_count"],
+                "approximate_presence_count": self.guild["member_count"],
+            }
+        return {}
+
+
+class FakeGateway:
+    """
+    Takes the place of the gateway websocket, which the bot only reads the latency
+    of outside of the connection handling.
+    """
+
+    latency = 0.042
+    open = False
+    shard_id = None
+
+
+class FakeWebhookAdapter(AsyncWebhookAdapter):
+    """
+    Answers the interaction callbacks and webhooks locally, through `FakeDiscord`.
+    """
+
+    def __init__(self, discord_api: FakeDiscord, channel_id: int):
+        super().__init__()
+        self.discord_api = discord_api
+        self.channel_id = channel_id
+
+    async def request(
+        self,
+        route: discord.http.Route,
+        session,
+        *,
+        payload=None,
+        multipart=None,
+        **kwargs,
+    ):
+        api = self.discord_api
+        api.calls[route.key] += 1
+        await api._rate_limit(f"{route.key}:{route.major_parameters}")
+        if multipart:
+            for field in multipart:
+                if field.get("name") == "payload_json":
+                    payload = json.loads(field["value"])
+        if route.path.endswith("/callback"):
+            message = api.message(self.channel_id, (payload or {}).get("data"))
+            return {
+                "interaction": {
+                    "id": str(route.webhook_id),
+                    "type": 2,
+                    "response_message_id": message["id"],
+                },
+                "resource": {"type": 4, "message": message},
+            }
+        if route.method in ("GET", "POST", "PATCH") and "/messages" in route.path:
+            return api.message(self.channel_id, payload)
+        return None
+
+
+class Workload:
+    """
+    Builds the gateway payloads of the replayed events.
+    """
+
+    def __init__(self, users: int, channels: int, seed: int):
+        self.rng = random.Random(seed)
+        self.users = [
+            user_payload(800_000_000_000_000_000 + index, f"user{index}")
+            for index in range(users)
+        ]
+        self.channels = [
+            {
+                "id": str(700_000_000_000_000_000 + index),
+                "type": 0,
+                "guild_id": str(GUILD_ID),
+                "name": f"chat-{index}",
+                "position": index,
+                "permission_overwrites": [],
+                "nsfw": False,
+                "parent_id": None,
+                "topic": None,
+                "rate_limit_per_user": 0,
+                "last_message_id": None,
+            }
+            for index in range(channels)
+        ]
+
+    def guild(self) -> dict:
+        bot_user = user_payload(BOT_ID, "ReplayBot", bot=True)
+        return {
+            "id": str(GUILD_ID),
+            "name": "Replay Guild",
+            "icon": None,
+            "owner_id": self.users[0]["id"],
+            "roles": [
+                {
+                    "id": str(GUILD_ID),
+                    "name": "@everyone",
+                    "permissions": ALL_PERMISSIONS,
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                    "flags": 0,
+                }
+            ],
+            "channels": self.channels,
+            "members": [member_payload(bot_user)]
+            + [member_payload(user) for user in self.users],
+            "member_count": len(self.users) + 1,
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+            "verification_level": 0,
+            "default_message_notifications": 0,
+            "explicit_content_filter": 0,
+            "mfa_level": 0,
+            "premium_tier": 0,
+            "preferred_locale": "en-US",
+            "nsfw_level": 0,
+            "afk_timeout": 300,
+            "system_channel_flags": 0,
+            "large": False,
+            "unavailable": False,
+        }
+
+    def message(self, content: str, author: int, channel: int) -> dict:
+        return {
+            "id": snowflake(),
+            "channel_id": self.channels[channel]["id"],
+            "guild_id": str(GUILD_ID),
+            "author": self.users[author],
+            "member": member_payload(),
+            "content": content,
+            "timestamp": now_iso(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+        }
+
+    def interaction(
+        self, name: str, options: Dict[str, Any], author: int, channel: int
+    ) -> dict:
+        member = member_payload(self.users[author])
+        member["permissions"] = ALL_PERMISSIONS
+        return {
+            "id": snowflake(),
+            "application_id": str(BOT_ID),
+            "type": 2,
+            "token": "replay-token",
+            "version": 1,
+            "guild_id": str(GUILD_ID),
+            "channel_id": self.channels[channel]["id"],
+            "channel": self.channels[channel],
+            "member": member,
+            "app_permissions": ALL_PERMISSIONS,
+            "locale": "en-US",
+            "guild_locale": "en-US",
+            "entitlements": [],
+            "authorizing_integration_owners": {},
+            "attachment_size_limit": 8 * 1024 * 1024,
+            "data": {
+                "id": snowflake(),
+                "name": name,
+                "type": 1,
+                "guild_id": str(GUILD_ID),
+                "options": [
+                    {"name": key, "type": 3, "value": value}
+                    for key, value in options.items()
+                ],
+            },
+        }
+
+    def event(self, name: str, author: int, channel: int) -> dict:
+        if name.startswith("/"):
+            name = name[1:]
+            return {
+                "interaction": name,
+                "options": INTERACTION_OPTIONS.get(name, {}),
+                "author": author,
+                "channel": channel,
+            }
+        if name == "chatter":
+            content = self.rng.choice(CHATTER)
+        else:
+            content = COMMAND_MESSAGES[name].format(
+                prefix=PREFIX, user_id=self.users[author]["id"]
+            )
+        return {"content": content, "author": author, "channel": channel}
+
+    def synthetic(self, events: int, rate: float, mix: str) -> Iterator[dict]:
+        weights = {}
+        for part in mix.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name.lstrip("/") not in COMMAND_MESSAGES and name != "chatter":
+                raise SystemExit(f"Unknown event '{name}' in the mix.")
+            weights[name] = float(weight or 1)
+        names, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+        for index in range(events):
+            name = self.rng.choices(names, cum_weights=cumulative)[0]
+            event = self.event(
+                name,
+                self.rng.randrange(len(self.users)),
+                self.rng.randrange(len(self.channels)),
+            )
+            event["t"] = index / rate if rate > 0 else 0.0
+            yield event
+
+
+def recorded(path: str) -> Iterator[dict]:
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    samples = sorted(samples)
+
+    def at(value: float) -> float:
+        return samples[min(len(samples) - 1, int(value / 100 * len(samples)))]
+
+    return {
+        "p50_ms": round(at(50) * 1000, 2),
+        "p99_ms": round(at(99) * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+async def monitor_lag(samples: List[float], interval: float = 0.01) -> None:
+    """
+    Measure how late the event loop wakes up a sleeping task, a busy loop can't
+    answer the gateway heartbeats in time.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started_at = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started_at - interval))
+
+
+def completed_commands() -> int:
+    return sum(metrics.outcomes.values())
+
+
+async def replay(args: argparse.Namespace, directory: str) -> dict:
+    workload = Workload(args.users, args.channels, args.seed)
+    config_path = os.path.join(directory, "config.json")
+    with open(config_path, "w") as file:
+        json.dump(
+            {
+                "prefix": PREFIX,
+                "token": "replay",
+                "owners": [int(workload.users[0]["id"])],
+                "guild_id": GUILD_ID,
+                "lazy_cogs": args.lazy_cogs,
+                "intents": args.intents,
+                "rate_limits": {"enabled": args.message_limits},
+                "logging": {
+                    "file": os.path.join(directory, "bot.jsonl"),
+                    "level": args.log_level,
+                },
+            },
+            file,
+        )
+    config_service.path = config_path
+    db_manager.DATABASE = os.path.join(directory, "database.db")
+
+    # bot.py reads its config when imported, so it is only imported now.
+    bot = importlib.import_module("bot").bot
+    discord_api = FakeDiscord(args.rate_limit, args.rate_limit_per, args.rate_limits)
+    async_context.set(FakeWebhookAdapter(discord_api, int(workload.channels[0]["id"])))
+
+    memory = {"start_bytes": rss_bytes()}
+    await bot._async_setup_hook()
+    bot.http.request = discord_api.request
+    await bot.setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(
+        state=state, data=user_payload(BOT_ID, "ReplayBot", bot=True)
+    )
+    state.application_id = BOT_ID
+    discord_api.guild = workload.guild()
+    state._add_guild(discord.Guild(data=discord_api.guild, state=state))
+    bot.ws = FakeGateway()
+    memory["ready_bytes"] = rss_bytes()
+    try:
+        return await run_events(args, bot, workload, discord_api, memory)
+    finally:
+        bot.ws = None
+        await bot.close()
+
+
+async def run_events(
+    args: argparse.Namespace,
+    bot: discord.Client,
+    workload: Workload,
+    discord_api: FakeDiscord,
+    memory: Dict[str, int],
+) -> dict:
+    state = bot._connection
+
+    if args.input:
+        events = recorded(args.input)
+    else:
+        events = workload.synthetic(args.events, args.rate, args.mix)
+
+    started = [0]
+
+    async def on_command(context) -> None:
+        started[0] += 1
+
+    bot.add_listener(on_command)
+
+    lag: List[float] = []
+    lag_task = asyncio.create_task(monitor_lag(lag))
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    sent = Counter()
+    for event in events:
+        delay = started_at + event.get("t", 0.0) / args.speed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        author = event.get("author", 0) % len(workload.users)
+        channel = event.get("channel", 0) % len(workload.channels)
+        if "interaction" in event:
+            state.parse_interaction_create(
+                workload.interaction(
+                    event["interaction"], event.get("options", {}), author, channel
+                )
+            )
+            sent["interactions"] += 1
+        else:
+            state.parse_message_create(
+                workload.message(event["content"], author, channel)
+            )
+            sent["messages"] += 1
+        # Yield to the loop like the gateway reader does between two events.
+        await asyncio.sleep(0)
+    fed_at = loop.time()
+
+    # Let the commands still running finish, some wait on the rate limits, or give
+    # up after the drain timeout.
+    while completed_commands() < started[0] and loop.time() - fed_at < args.drain:
+        await asyncio.sleep(0.05)
+    finished_at = loop.time()
+    lag_task.cancel()
+    memory["end_bytes"] = rss_bytes()
+    memory["growth_bytes"] = memory["end_bytes"] - memory["ready_bytes"]
+
+    # Whatever is left is cancelled before the bot closes, so that nothing runs
+    # against a closed client.
+    current = asyncio.current_task()
+    pending = [task for task in asyncio.all_tasks() if task is not current]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    elapsed = finished_at - started_at
+    total_latency = [
+        metrics.summary(command).get("total", {}) for command in metrics.commands()
+    ]
+    report = {
+        "events": dict(sent),
+        "elapsed_s": round(elapsed, 3),
+        "feed_s": round(fed_at - started_at, 3),
+        "commands_started": started[0],
+        "commands_completed": completed_commands(),
+        "commands_per_sec": round(completed_commands() / elapsed, 1) if elapsed else 0,
+        "outcomes": {
+            f"{command} {outcome}": count
+            for (command, outcome), count in sorted(metrics.outcomes.items())
+        },
+        "command_latency": {
+            command: {
+                key: round(value * 1000, 2) if key != "count" else value
+                for key, value in summary.items()
+            }
+            for command, summary in zip(metrics.commands(), total_latency)
+        },
+        "event_loop_lag": percentiles(lag),
+        "memory": memory,
+        "pending_tasks": len(pending),
+        "discord_calls": dict(discord_api.calls),
+        "rate_limited": dict(discord_api.rate_limited),
+        "rate_limit_wait_s": round(discord_api.waited, 3),
+        "messages_discarded": bot.prefixes.discarded,
+        "messages_dropped": dict(bot.rate_limiter.rejected),
+    }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=2_000)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="Events per second of the synthetic stream, 0 to send them as fast as "
+        "possible.",
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--input", help="A JSON-lines recording to replay instead.")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Replay speed multiplier."
+    )
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=5,
+        help="Calls allowed per route and channel within --rate-limit-per seconds.",
+    )
+    parser.add_argument("--rate-limit-per", type=float, default=5.0)
+    parser.add_argument(
+        "--no-rate-limits", dest="rate_limits", action="store_false"
+    )
+    parser.add_argument(
+        "--drain",
+        type=float,
+        default=30.0,
+        help="Seconds to wait for the running commands once every event is sent.",
+    )
+    parser.add_argument(
+        "--intents",
+        choices=("all", "minimal"),
+        default="all",
+        help="The intents mode of the bot, minimal also shrinks its caches.",
+    )
+    parser.add_argument(
+        "--message-limits",
+        action="store_true",
+        help="Apply the rate limits of the bot to the messages, with the defaults.",
+    )
+    parser.add_argument(
+        "--lazy-cogs",
+        nargs="*",
+        default=[],
+        help="Cogs to load on first use, to measure the lazy loading.",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = asyncio.run(replay(args, directory))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
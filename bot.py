@@ -2,13 +2,13 @@
 Modified from https://github.com/kkrypt0nn (https://krypton.ninja)
 """
 import asyncio
-import json
-import nest_asyncio
+import logging
 import os
-from pathlib import Path
 import platform
 import random
 import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
 import aiosqlite
 import discord
@@ -16,40 +16,525 @@ from discord.ext import commands, tasks
 from discord.ext.commands import Bot, Context
 
 import exceptions
+from helpers import db_manager, migrations
+from helpers.cache_policy import cache_policy, memory_report, rss_bytes
+from helpers.cluster import IpcClient, worker_settings
+from helpers.command_sync import CommandSync, ScopeDiff, describe
+from helpers.config import Config, config_service
+from helpers.errors import ErrorResponses
+from helpers.hot_reload import HotReloader
+from helpers.lazy_cogs import LazyCommandTree, PlaceholderCog, read_manifest
+from helpers.logger import COMMAND_LOGGER, LOG_FILE, setup_logging
+from helpers.metrics import metrics, start_exporter, track_discord
+from helpers.prefixes import PrefixMatcher
+from helpers.ratelimit import RateLimiter
+from helpers.shards import ShardMonitor
+
+STARTED_AT = time.perf_counter()
+
+try:
+    config = config_service.load()
+except exceptions.ConfigError as e:
+    sys.exit(e.message)
+
+# Set by the launcher when the bot runs as one of the workers of a cluster, see
+# launcher.py.
+cluster = worker_settings()
+
+logging_settings = dict(config.get("logging", {}))
+if cluster is not None:
+    # Every worker writes its own log files, rotating a shared file from several
+    # processes would lose records.
+    path, extension = os.path.splitext(logging_settings.get("file", LOG_FILE))
+    logging_settings["file"] = f"{path}.{cluster['cluster_id']}{extension}"
+log_listener = setup_logging(logging_settings)
+logger = logging.getLogger("discord_bot")
+command_logger = logging.getLogger(COMMAND_LOGGER)
+
+# The intents and the caches, every intent unless the config asks for the minimal
+# ones, see helpers/cache_policy.py.
+policy = cache_policy(config)
+
+
+class DiscordBot(Bot):
+    # The events about the gateway connection, and what they mean for its health.
+    connection_events = {
+        "connect": "connected",
+        "resumed": "resumed",
+        "disconnect": "disconnected",
+    }
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.shard_monitor = ShardMonitor()
+        # The time spent in every startup phase, in seconds, logged once the bot is
+        # ready.
+        self.startup_timings: Dict[str, float] = {}
+        self._phase_started_at = STARTED_AT
+        # The placeholders of the lazy cogs not loaded yet, by extension, and the
+        # extension of each of their commands.
+        self.placeholders: Dict[str, PlaceholderCog] = {}
+        self.lazy_commands: Dict[str, str] = {}
+        self._lazy_lock = asyncio.Lock()
+        # Bumped whenever a cog is added or removed, so that what is derived from
+        # the cog set, like the help pages, knows when to render again.
+        self.cogs_version = 0
+        self.rate_limiter = RateLimiter(config.get("rate_limits", {}))
+        self._prefixes = PrefixMatcher()
+        self.command_sync = CommandSync(self.tree, guild_ids=self.command_guild_ids)
+
+    def end_startup_phase(self, phase: str) -> None:
+        """
+        Record the time spent since the end of the previous startup phase.
 
-nest_asyncio.apply()
+        Parameters
+        ----------
+        phase : str
+            The name of the phase that just ended.
 
-if not (Path.cwd() / "config.json").exists():
-    sys.exit("'config.json' not found! Please add it and try again.")
-else:
-    with open("config.json") as file:
-        config = json.load(file)
+        Returns
+        -------
+        None
+        """
+        now = time.perf_counter()
+        self.startup_timings[phase] = now - self._phase_started_at
+        self._phase_started_at = now
+
+    @property
+    def config(self) -> Config:
+        """
+        The current config, reloaded automatically when config.json changes.
+        """
+        return config_service.get()
+
+    def dispatch(self, event_name: str, /, *args, **kwargs) -> None:
+        # The command events are dispatched synchronously from the task running the
+        # command, right before its checks and right after it ends, so timing them
+        # here rather than in the listeners, which run later in their own tasks,
+        # measures the command itself.
+        if event_name == "command":
+            metrics.start(args[0])
+        elif event_name == "command_completion":
+            metrics.finish(args[0], "success")
+        elif event_name == "command_error":
+            metrics.finish(args[0], "error")
+        elif event_name == "socket_event_type":
+            self.socket_event()
+        elif event_name in self.connection_events:
+            getattr(self.shard_monitor, self.connection_events[event_name])(
+                self.event_shard_id(args)
+            )
+        super().dispatch(event_name, *args, **kwargs)
+
+    def event_shard_id(self, args: tuple) -> Optional[int]:
+        """
+        Get the shard a connection event is about.
+        """
+        return self.shard_id
+
+    def socket_event(self) -> None:
+        """
+        Count a gateway event of the shard whose event is being dispatched.
+        """
+        self.shard_monitor.event(self.shard_id)
+
+    def shard_latencies(self) -> List[Tuple[int, float]]:
+        """
+        Get the ID and the heartbeat latency of every shard of the bot.
+        """
+        return [(self.shard_id or 0, self.latency)]
+
+    async def setup_hook(self) -> None:
+        """
+        The code in this function is executed once, after the bot has logged in and
+        before it connects to the gateway. The database and the cogs don't depend on
+        each other, so they are set up concurrently.
+
+        Returns
+        -------
+        None
+        """
+        self.end_startup_phase("login")
+        self.http.request = track_discord(self.http.request)
+        self.metrics_server = None
+        metrics_port = self.config.get("metrics", {}).get("port")
+        if metrics_port:
+            if cluster is not None:
+                metrics_port += cluster["cluster_id"]
+            self.metrics_server = await start_exporter(port=metrics_port)
+        self.ipc = IpcClient.from_environment()
+        if self.ipc is not None:
+            self.ipc.on("blacklist_add", self.handle_blacklist_add)
+            self.ipc.on("blacklist_remove", self.handle_blacklist_remove)
+            self.ipc.on("blacklist_refresh", self.handle_blacklist_refresh)
+            self.ipc.on("config_reload", self.handle_config_reload)
+            self.ipc.start()
+        await asyncio.gather(
+            self.timed("database", self.setup_database()),
+            self.timed("cogs", load_cogs()),
+        )
+        self.hot_reloader = HotReloader(self)
+        hot_reload = self.config.get("hot_reload", {})
+        if hot_reload.get("enabled"):
+            hot_reload_task.change_interval(seconds=hot_reload.get("interval", 1.0))
+            hot_reload_task.start()
+        # Only one worker of a cluster syncs, the others run the same commands.
+        if self.config.get("sync_commands_on_startup") and (
+            cluster is None or cluster["cluster_id"] == 0
+        ):
+            try:
+                await self.timed("sync", self.sync_commands())
+            except (discord.HTTPException, OSError):
+                logger.exception("Could not sync the slash commands")
+        logger.info("Memory before connecting: %.1f MB", rss_bytes() / 2**20)
+        self._phase_started_at = time.perf_counter()
+
+    async def setup_database(self) -> None:
+        """
+        Apply the pending migrations, then open the connections used by the cogs.
+
+        Returns
+        -------
+        None
+        """
+        await init_db()
+        database = self.config.get("database", {})
+        await db_manager.connect(
+            db_manager.DATABASE,
+            readers=database.get("readers", 4),
+            durability=database.get("durability", "normal"),
+            commit_window=database.get("commit_window", 0.005),
+            busy_timeout=database.get("busy_timeout", 5.0),
+        )
+
+    async def timed(self, phase: str, coroutine) -> None:
+        """
+        Run a startup phase and record how long it took.
+
+        Parameters
+        ----------
+        phase : str
+            The name of the phase, as shown in the startup log.
+        coroutine
+            The coroutine of the phase.
+
+        Returns
+        -------
+        None
+        """
+        started_at = time.perf_counter()
+        try:
+            await coroutine
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - started_at
+
+    @property
+    def prefixes(self) -> PrefixMatcher:
+        """
+        The matcher of the command prefixes, compiled again when the config changes.
+        """
+        self._prefixes.update(
+            self.config, self.user.id if self.user is not None else None
+        )
+        return self._prefixes
+
+    def invoked_command(self, message: discord.Message) -> Optional[str]:
+        """
+        Find the name of the command a message invokes, without parsing it.
+
+        Parameters
+        ----------
+        message : discord.Message
+            The message.
+
+        Returns
+        -------
+        Optional[str]
+            The name of the command, None if the message doesn't start with a prefix.
+        """
+        match = self.prefixes.match(
+            message.content, message.guild.id if message.guild is not None else None
+        )
+        return match[1] if match is not None else None
+
+    async def add_cog(self, cog: commands.Cog, /, **kwargs) -> None:
+        await super().add_cog(cog, **kwargs)
+        self.cogs_version += 1
+
+    async def remove_cog(self, name: str, /, **kwargs):
+        cog = await super().remove_cog(name, **kwargs)
+        self.cogs_version += 1
+        return cog
+
+    async def add_placeholder(self, placeholder: PlaceholderCog) -> None:
+        """
+        Register the placeholder of a lazy cog, its real cog is loaded the first time
+        one of its commands is used.
+
+        Parameters
+        ----------
+        placeholder : PlaceholderCog
+            The placeholder of the cog.
+
+        Returns
+        -------
+        None
+        """
+        await self.add_cog(placeholder)
+        self.add_dynamic_items(placeholder.component)
+        self.placeholders[placeholder.extension] = placeholder
+        for command in placeholder.get_commands():
+            self.lazy_commands[command.name] = placeholder.extension
+
+    async def load_extension(self, name: str, *, package: str = None) -> None:
+        # A placeholder gives way to the real cog, and comes back if it fails to load.
+        placeholder = self.placeholders.pop(name, None)
+        if placeholder is None:
+            return await super().load_extension(name, package=package)
+        await self.remove_cog(placeholder.qualified_name)
+        self.remove_dynamic_items(placeholder.component)
+        for command in placeholder.get_commands():
+            self.lazy_commands.pop(command.name, None)
+        try:
+            await super().load_extension(name, package=package)
+        except Exception:
+            await self.add_placeholder(placeholder)
+            raise
+
+    async def load_lazy_cog(self, extension: str) -> None:
+        """
+        Load a lazy cog, if it hasn't been loaded already.
+
+        Parameters
+        ----------
+        extension : str
+            The extension of the cog, e.g. `cogs.fun`.
+
+        Returns
+        -------
+        None
+        """
+        async with self._lazy_lock:
+            if extension not in self.placeholders:
+                return
+            started_at = time.perf_counter()
+            await self.load_extension(extension)
+            logger.info(
+                "Loaded lazy extension '%s' in %.1f ms",
+                extension,
+                (time.perf_counter() - started_at) * 1000,
+            )
+
+    async def load_lazy_cogs(self) -> None:
+        """
+        Load every lazy cog not loaded yet, e.g. before syncing the slash commands.
+
+        Returns
+        -------
+        None
+        """
+        for extension in list(self.placeholders):
+            await self.load_lazy_cog(extension)
+
+    def command_guild_ids(self) -> Set[int]:
+        """
+        The guilds the slash commands may be registered in, the guild of the config
+        and the guilds of the bot.
+        """
+        return {int(self.config["guild_id"])} | {guild.id for guild in self.guilds}
+
+    async def sync_commands(self, force: bool = False) -> List[ScopeDiff]:
+        """
+        Sync the slash commands of the scopes that changed since their last sync,
+        see helpers/command_sync.py.
+
+        Parameters
+        ----------
+        force : bool
+            Sync every scope, changed or not.
+
+        Returns
+        -------
+        List[ScopeDiff]
+            What changed in each synced scope.
+        """
+        # The slash commands of the lazy cogs only exist once they are loaded.
+        await self.load_lazy_cogs()
+        synced = await self.command_sync.sync(force=force)
+        for diff in synced:
+            logger.info("Synced the %s slash commands: %s", diff.scope, describe(diff))
+        if not synced:
+            logger.info("The slash commands are up to date, nothing to sync")
+        return synced
+
+    async def invoke(self, context: Context) -> None:
+        # The stub of a lazy cog is swapped for the real command before anything
+        # else happens, so that the checks, cooldowns and events are the real ones.
+        if isinstance(context.cog, PlaceholderCog):
+            await self.load_lazy_cog(context.cog.extension)
+            context = await self.get_context(context.message)
+        await super().invoke(context)
+
+    async def close(self) -> None:
+        """
+        The code in this function is executed when the bot shuts down.
+
+        Returns
+        -------
+        None
+        """
+        await super().close()
+        if getattr(self, "metrics_server", None) is not None:
+            self.metrics_server.close()
+        if getattr(self, "ipc", None) is not None:
+            await self.ipc.close()
+        await db_manager.close()
+
+    async def publish(self, message: dict) -> None:
+        """
+        Tell the other workers of the cluster about a change, so that they update
+        their caches. Does nothing when the bot runs on its own.
+
+        Parameters
+        ----------
+        message : dict
+            The message, with at least a `type`.
+
+        Returns
+        -------
+        None
+        """
+        if getattr(self, "ipc", None) is not None:
+            await self.ipc.publish(message)
+
+    async def handle_blacklist_add(self, message: dict) -> None:
+        db_manager.blacklist_cache.add(message["user_id"])
+
+    async def handle_blacklist_remove(self, message: dict) -> None:
+        db_manager.blacklist_cache.discard(message["user_id"])
+
+    async def handle_blacklist_refresh(self, message: dict) -> None:
+        await db_manager.refresh_blacklist()
+
+    async def handle_config_reload(self, message: dict) -> None:
+        try:
+            config_service.reload()
+        except exceptions.ConfigError as e:
+            logger.error("Keeping the previous config: %s", e.message)
+
+
+class ShardedDiscordBot(DiscordBot, commands.AutoShardedBot):
+    """
+    The bot, connected to Discord through several shards managed by discord.py.
+    """
 
-intents = discord.Intents.all()
+    connection_events = {
+        "shard_connect": "connected",
+        "shard_resumed": "resumed",
+        "shard_disconnect": "disconnected",
+    }
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # The task reading the websocket of each shard, which is replaced when the
+        # shard reconnects.
+        self._shard_tasks: Dict[asyncio.Task, int] = {}
+
+    def dispatch(self, event_name: str, /, *args, **kwargs) -> None:
+        if event_name in self.connection_events:
+            # READY and RESUMED are parsed by the task reading the websocket of the
+            # shard, the connection events come from it with the ID of the shard.
+            shard_id = args[0]
+            task = asyncio.current_task()
+            if event_name != "shard_disconnect" and task not in self._shard_tasks:
+                # The READY or RESUMED event, received before the task was known.
+                self.shard_monitor.event(shard_id)
+            self._shard_tasks = {
+                other: other_shard_id
+                for other, other_shard_id in self._shard_tasks.items()
+                if other_shard_id != shard_id
+            }
+            if event_name != "shard_disconnect":
+                self._shard_tasks[task] = shard_id
+        super().dispatch(event_name, *args, **kwargs)
+
+    def event_shard_id(self, args: tuple) -> Optional[int]:
+        return args[0]
+
+    def socket_event(self) -> None:
+        shard_id = self._shard_tasks.get(asyncio.current_task())
+        if shard_id is not None:
+            self.shard_monitor.event(shard_id)
+
+    def shard_latencies(self) -> List[Tuple[int, float]]:
+        return self.latencies
+
+
+def command_prefix(bot: DiscordBot, message: discord.Message) -> List[str]:
+    """
+    The prefixes of the guild of a message, mentioning the bot included.
+    """
+    return bot.prefixes.prefixes(message.guild.id if message.guild else None)
+
+
+# Sharding is opt-in, discord.py works out the number of shards unless the config
+# sets it, and runs them all unless the config sets the IDs of the shards to run. The
+# workers of a cluster run the shards the launcher gives them.
+sharding = config.get("sharding", {})
+if cluster is not None:
+    bot_class = ShardedDiscordBot
+    policy["shard_count"] = cluster["shard_count"]
+    policy["shard_ids"] = cluster["shard_ids"]
+elif sharding.get("enabled"):
+    bot_class = ShardedDiscordBot
+    policy["shard_count"] = sharding.get("shard_count")
+    policy["shard_ids"] = sharding.get("shard_ids")
+else:
+    bot_class = DiscordBot
 
-bot = Bot(
-    command_prefix=commands.when_mentioned_or(config["prefix"]),
-    intents=intents,
+bot = bot_class(
+    command_prefix=command_prefix,
     help_command=None,
+    tree_cls=LazyCommandTree,
+    **policy,
 )
+bot.end_startup_phase("config")
 
 
 async def init_db():
-    async with aiosqlite.connect("database/database.db") as db:
-        with open("database/schema.sql") as database_file:
-            await db.executescript(database_file.read())
-        await db.commit()
+    async with aiosqlite.connect(db_manager.DATABASE) as db:
+        applied = await migrations.migrate(db)
+        for version in applied:
+            logger.info("Applied database migration %s", version)
 
 
 """
-Create a bot variable to access the config file in cogs so that you don't need to 
-import it every time. 
+The bot has a config property to access the config file in cogs so that you don't
+need to import it every time. It is shared with the checks and always reflects the
+latest valid version of the file.
 
 The config is available using the following code:
 - bot.config # In this file
 - self.bot.config # In cogs
 """
-bot.config = config
+
+
+@bot.before_invoke
+async def before_invoke(context: Context) -> None:
+    """
+    The code in this function is executed before every command, once its checks have
+    passed and its arguments have been converted.
+
+    Parameters
+    ----------
+    context : Context
+        The context of the command about to be executed.
+
+    Returns
+    -------
+    None
+    """
+    metrics.checks_done(context)
 
 
 @bot.event
@@ -61,14 +546,44 @@ async def on_ready() -> None:
     -------
     None
     """
-    print(f"Logged in as {bot.user.name}")
-    print(f"discord.py API version: {discord.__version__}")
-    print(f"Python version: {platform.python_version()}")
-    print(f"Running on: {platform.system()} {platform.release()} ({os.name})")
-    print("-------------------")
+    logger.info("Logged in as %s", bot.user.name)
+    logger.info("discord.py API version: %s", discord.__version__)
+    logger.info("Python version: %s", platform.python_version())
+    logger.info(
+        "Running on: %s %s (%s)", platform.system(), platform.release(), os.name
+    )
+    if "gateway" not in bot.startup_timings:
+        bot.end_startup_phase("gateway")
+        bot.startup_timings["total"] = time.perf_counter() - STARTED_AT
+        logger.info(
+            "Startup timings: %s",
+            ", ".join(
+                f"{phase} {seconds * 1000:.0f} ms"
+                for phase, seconds in bot.startup_timings.items()
+            ),
+        )
+        memory = memory_report(bot)
+        logger.info(
+            "Memory when ready: %.1f MB, %d guilds, %d users, %d members and %d "
+            "messages cached (intents: %s)",
+            memory["rss_bytes"] / 2**20,
+            memory["guilds"],
+            memory["users"],
+            memory["members"],
+            memory["messages"],
+            ", ".join(name for name, enabled in bot.intents if enabled),
+        )
     status_task.start()
 
 
+@tasks.loop(seconds=1.0)
+async def hot_reload_task() -> None:
+    """
+    Reload the cogs whose source changed, when the `hot_reload` setting is enabled.
+    """
+    await bot.hot_reloader.check()
+
+
 @tasks.loop(minutes=1.0)
 async def status_task() -> None:
     """
@@ -79,7 +594,14 @@ async def status_task() -> None:
     None
     """
     statuses = ["with you!", "with Krypton!", "with humans!"]
-    await bot.change_presence(activity=discord.Game(random.choice(statuses)))
+    if not isinstance(bot, commands.AutoShardedBot):
+        await bot.change_presence(activity=discord.Game(random.choice(statuses)))
+        return
+    for shard_id in bot.shards:
+        await bot.change_presence(
+            activity=discord.Game(f"{random.choice(statuses)} | Shard {shard_id}"),
+            shard_id=shard_id,
+        )
 
 
 @bot.event
@@ -99,9 +621,59 @@ async def on_message(message: discord.Message) -> None:
     """
     if message.author == bot.user or message.author.bot:
         return
+    # Ordinary chat is discarded before any context is built, see
+    # helpers/prefixes.py, and spam is dropped before the message is parsed, see
+    # helpers/ratelimit.py. The owners are never limited.
+    name = bot.invoked_command(message)
+    if name is None:
+        return
+    # Aliases and other capitalisations pay the cost of the command they invoke.
+    command = bot.get_command(name) or bot.get_command(name.lower())
+    if message.author.id not in bot.config.owners and not bot.rate_limiter.allow(
+        message.author.id,
+        message.channel.id,
+        message.guild.id if message.guild is not None else None,
+        command.qualified_name if command is not None else name,
+        bot.config.get("rate_limits", {}),
+    ):
+        return
     await bot.process_commands(message)
 
 
+def log_command(context: Context, outcome: str, error: Exception = None) -> None:
+    """
+    Log a structured record of an executed command. The record is only built here,
+    it is written to the log files by a background thread.
+
+    Parameters
+    ----------
+    context : Context
+        The context of the command that has been executed.
+    outcome : str
+        `success` or `error`.
+    error : Exception, optional
+        The error the command failed with.
+    """
+    if context.command is None:
+        return
+    latency = getattr(context, "latency", None)
+    fields = {
+        "command": context.command.qualified_name,
+        "guild_id": context.guild.id if context.guild is not None else None,
+        "guild": context.guild.name if context.guild is not None else None,
+        "channel_id": context.channel.id,
+        "user_id": context.author.id,
+        "user": str(context.author),
+        "latency_ms": round(latency * 1000, 2) if latency is not None else None,
+        "outcome": outcome,
+    }
+    if error is not None:
+        fields["error"] = type(error).__name__
+    command_logger.info(
+        "Executed %s command (%s)", fields["command"], outcome, extra={"fields": fields}
+    )
+
+
 @bot.event
 async def on_command_completion(context: Context) -> None:
     """
@@ -117,19 +689,61 @@ async def on_command_completion(context: Context) -> None:
     -------
     None
     """
-    full_command_name = context.command.qualified_name
-    split = full_command_name.split(" ")
-    executed_command = str(split[0])
-    if context.guild is not None:
-        print(
-            f"Executed {executed_command} command in {context.guild.name} "
-            f"(ID: {context.guild.id}) by {context.author} (ID: {context.author.id}) "
-        )
-    else:
-        print(
-            f"Executed {executed_command} command by {context.author} "
-            f"(ID: {context.author.id}) in DMs"
-        )
+    log_command(context, "success")
+
+
+def cooldown_description(error: commands.CommandOnCooldown) -> str:
+    minutes, seconds = divmod(error.retry_after, 60)
+    hours, minutes = divmod(minutes, 60)
+    hours = hours % 24
+    return (
+        f"You can use this command again in "
+        f"{f'{round(hours)} hours' if round(hours) > 0 else ''} "
+        f"{f'{round(minutes)} minutes' if round(minutes) > 0 else ''} "
+        f"{f'{round(seconds)} seconds' if round(seconds) > 0 else ''}."
+    )
+
+
+"""
+The responses to the routine errors, any other error is counted and logged, see
+helpers/errors.py. UserBlacklisted can occur when using the
+@checks.not_blacklisted() check in your command, or you can raise the error by
+yourself, same for UserNotOwner and the @checks.is_owner() check.
+"""
+error_responses = ErrorResponses(
+    window=config.get("errors", {}).get("dedupe_window", 10.0)
+)
+error_responses.register(
+    commands.CommandOnCooldown, "Hey, please slow down!", cooldown_description
+)
+error_responses.register(
+    exceptions.UserBlacklisted, "Error!", "You are blacklisted from using the bot."
+)
+error_responses.register(
+    exceptions.UserNotOwner, "Error!", "You are not the owner of the bot!"
+)
+error_responses.register(
+    commands.MissingPermissions,
+    "Error!",
+    lambda error: "You are missing the permission(s) `"
+    + ", ".join(error.missing_permissions)
+    + "` to execute this command!",
+)
+error_responses.register(
+    commands.BotMissingPermissions,
+    "Error!",
+    lambda error: "I am missing the permission(s) `"
+    + ", ".join(error.missing_permissions)
+    + "` to fully perform this command!",
+)
+# We need to capitalize because the command arguments have no capital letter in the
+# code.
+error_responses.register(
+    commands.MissingRequiredArgument, "Error!", lambda error: str(error).capitalize()
+)
+error_responses.register(
+    commands.CommandNotFound, "Error!", lambda error: str(error).capitalize()
+)
 
 
 @bot.event
@@ -148,92 +762,69 @@ async def on_command_error(context: Context, error) -> None:
     -------
     None
     """
-    if isinstance(error, commands.CommandOnCooldown):
-        minutes, seconds = divmod(error.retry_after, 60)
-        hours, minutes = divmod(minutes, 60)
-        hours = hours % 24
-        embed = discord.Embed(
-            title="Hey, please slow down!",
-            description=f"You can use this command again in "
-            f"{f'{round(hours)} hours' if round(hours) > 0 else ''} "
-            f"{f'{round(minutes)} minutes' if round(minutes) > 0 else ''} "
-            f"{f'{round(seconds)} seconds' if round(seconds) > 0 else ''}.",
-            color=0xE02B2B,
-        )
-        await context.send(embed=embed)
-    elif isinstance(error, exceptions.UserBlacklisted):
-        """
-        The code here will only execute if the error is an instance of
-        'UserBlacklisted', which can occur when using the @checks.not_blacklisted()
-        check in your command, or you can raise the error by yourself.
-        """
-        embed = discord.Embed(
-            title="Error!",
-            description="You are blacklisted from using the bot.",
-            color=0xE02B2B,
-        )
-        await context.send(embed=embed)
-    elif isinstance(error, exceptions.UserNotOwner):
-        """
-        Same as above, just for the @checks.is_owner() check.
-        """
-        embed = discord.Embed(
-            title="Error!",
-            description="You are not the owner of the bot!",
-            color=0xE02B2B,
-        )
-        await context.send(embed=embed)
-    elif isinstance(error, commands.MissingPermissions):
-        embed = discord.Embed(
-            title="Error!",
-            description="You are missing the permission(s) `"
-            + ", ".join(error.missing_permissions)
-            + "` to execute this command!",
-            color=0xE02B2B,
-        )
-        await context.send(embed=embed)
-    elif isinstance(error, commands.BotMissingPermissions):
-        embed = discord.Embed(
-            title="Error!",
-            description="I am missing the permission(s) `"
-            + ", ".join(error.missing_permissions)
-            + "` to fully perform this command!",
-            color=0xE02B2B,
-        )
-        await context.send(embed=embed)
-    elif isinstance(
-            error, (commands.MissingRequiredArgument, commands.CommandNotFound)
-    ):
-        embed = discord.Embed(
-            title="Error!",
-            # We need to capitalize because the command arguments have no capital
-            # letter in the code.
-            description=str(error).capitalize(),
-            color=0xE02B2B,
-        )
-        await context.send(embed=embed)
-    raise error
+    log_command(context, "error", error)
+    response = error_responses.lookup(error)
+    if response is None:
+        error_responses.report(context, error)
+        return
+    if error_responses.should_reply(context, error):
+        await context.send(embed=response.render(error))
 
 
 async def load_cogs() -> None:
     """
-    The code in this function is executed whenever the bot will start.
+    The code in this function is executed whenever the bot will start. The cogs
+    listed in the `lazy_cogs` entry of the config only get a placeholder, see
+    helpers/lazy_cogs.py.
 
     Returns
     -------
     None
     """
+    lazy_cogs = set(bot.config.get("lazy_cogs", []))
+    manifest = {}
+    if lazy_cogs:
+        try:
+            manifest = read_manifest()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Could not read the cog manifest, loading every cog: %s", e)
     for cog_file in os.listdir(f"./cogs"):
         if cog_file.endswith(".py"):
             extension = cog_file[:-3]
+            if extension in lazy_cogs and extension in manifest:
+                await bot.add_placeholder(
+                    PlaceholderCog(extension, manifest[extension])
+                )
+                logger.info("Deferred extension '%s'", extension)
+                continue
             try:
                 await bot.load_extension(f"cogs.{extension}")
-                print(f"Loaded extension '{extension}'")
+                logger.info("Loaded extension '%s'", extension)
             except Exception as e:
                 exception = f"{type(e).__name__}: {e}"
-                print(f"Failed to load extension {extension}\n{exception}")
+                logger.error("Failed to load extension %s\n%s", extension, exception)
 
 
-asyncio.run(init_db())
-asyncio.run(load_cogs())
-bot.run(config["token"])
+async def main() -> None:
+    """
+    Start the bot on a single event loop, the database and the cogs are set up in
+    the setup hook.
+
+    Returns
+    -------
+    None
+    """
+    async with bot:
+        bot.end_startup_phase("loop")
+        await bot.start(config["token"])
+
+
+if __name__ == "__main__":
+    # discord.py logs through the handlers set up above instead of its own, which
+    # `bot.run` would otherwise install.
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_listener.stop()
@@ -2,6 +2,7 @@
 Modified from https://github.com/kkrypt0nn (https://krypton.ninja)
 """
 import random
+import re
 
 import aiohttp
 import discord
@@ -10,54 +11,116 @@ from discord.ext import commands
 from discord.ext.commands import Context
 
 from helpers import checks
-from bot import config
+from helpers.config import config_service
 
+config = config_service.get()
 
-class Choice(discord.ui.View):
-    def __init__(self):
-        super().__init__()
-        self.value = None
 
-    @discord.ui.button(label="Heads", style=discord.ButtonStyle.blurple)
-    async def confirm(
-        self, button: discord.ui.Button, interaction: discord.Interaction
-    ):
-        self.value = "heads"
-        self.stop()
+class CoinflipBet(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"fun:coinflip:(?P<user_id>[0-9]+):(?P<bet>heads|tails)",
+):
+    """
+    A bet of the coin flip. The player and the bet are held in the custom ID, so the
+    bot keeps nothing per game and the game can still be played after a restart.
+    """
+
+    def __init__(self, user_id: int, bet: str) -> None:
+        super().__init__(
+            discord.ui.Button(
+                label=bet.capitalize(),
+                style=discord.ButtonStyle.blurple,
+                custom_id=f"fun:coinflip:{user_id}:{bet}",
+            )
+        )
+        self.user_id = user_id
+        self.bet = bet
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Button,
+        match: re.Match,
+    ) -> "CoinflipBet":
+        return cls(int(match["user_id"]), match["bet"])
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        result = random.choice(["heads", "tails"])
+        if self.bet == result:
+            embed = discord.Embed(
+                description=f"Correct! You guessed `{self.bet}` and I flipped "
+                f"the coin to `{result}`.",
+                color=0x9C84EF,
+            )
+        else:
+            embed = discord.Embed(
+                description=f"Woops! You guessed `{self.bet}` and I flipped the "
+                f"coin to `{result}`, better luck next time!",
+                color=0xE02B2B,
+            )
+        await interaction.response.edit_message(embed=embed, view=None, content=None)
 
-    @discord.ui.button(label="Tails", style=discord.ButtonStyle.blurple)
-    async def cancel(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.value = "tails"
-        self.stop()
 
+class RockPaperScissors(
+    discord.ui.DynamicItem[discord.ui.Select],
+    template=r"fun:rps:(?P<user_id>[0-9]+)",
+):
+    """
+    The choice of the rock paper scissors game, stateless like `CoinflipBet`.
+    """
 
-class RockPaperScissors(discord.ui.Select):
-    def __init__(self):
+    def __init__(self, user_id: int) -> None:
         options = [
             discord.SelectOption(
-                label="Scissors", description="You choose scissors.", emoji="✂"
+                label="Scissors",
+                value="scissors",
+                description="You choose scissors.",
+                emoji="✂",
             ),
             discord.SelectOption(
-                label="Rock", description="You choose rock.", emoji="🪨"
+                label="Rock", value="rock", description="You choose rock.", emoji="🪨"
             ),
             discord.SelectOption(
-                label="paper", description="You choose paper.", emoji="🧻"
+                label="Paper",
+                value="paper",
+                description="You choose paper.",
+                emoji="🧻",
             ),
         ]
         super().__init__(
-            placeholder="Choose...",
-            min_values=1,
-            max_values=1,
-            options=options,
+            discord.ui.Select(
+                placeholder="Choose...",
+                min_values=1,
+                max_values=1,
+                options=options,
+                custom_id=f"fun:rps:{user_id}",
+            )
         )
+        self.user_id = user_id
 
-    async def callback(self, interaction: discord.Interaction):
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Select,
+        match: re.Match,
+    ) -> "RockPaperScissors":
+        return cls(int(match["user_id"]))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+    async def callback(self, interaction: discord.Interaction) -> None:
         choices = {
             "rock": 0,
             "paper": 1,
             "scissors": 2,
         }
-        user_choice = self.values[0].lower()
+        user_choice = self.item.values[0]
         user_choice_index = choices[user_choice]
 
         bot_choice = random.choice(list(choices.keys()))
@@ -65,10 +128,10 @@ class RockPaperScissors(discord.ui.Select):
 
         result_embed = discord.Embed(color=0x9C84EF)
         result_embed.set_author(
-            name=interaction.user.name, icon_url=interaction.user.avatar.url
+            name=interaction.user.name, icon_url=interaction.user.display_avatar.url
         )
         if random.random() <= 0.05:
-            result_embed.description(
+            result_embed.description = (
                 f"🍀🍀Critical Hit!🍀🍀\n I rolled a 20 and automatically won!"
             )
         elif user_choice_index == bot_choice_index:
@@ -99,16 +162,17 @@ class RockPaperScissors(discord.ui.Select):
         )
 
 
-class RockPaperScissorsView(discord.ui.View):
-    def __init__(self):
-        super().__init__()
-        self.add_item(RockPaperScissors())
+# Registered once when the cog is loaded, see helpers/lazy_cogs.py.
+DYNAMIC_ITEMS = (CoinflipBet, RockPaperScissors)
 
 
 class Fun(commands.Cog, name="fun"):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(*DYNAMIC_ITEMS)
+
     @commands.hybrid_command(
         name="coinflip", description="Make a coin flip, but give your bet before."
     )
@@ -127,24 +191,12 @@ class Fun(commands.Cog, name="fun"):
         -------
         None
         """
-        buttons = Choice()
+        # The coin is flipped by the button the player clicks, see CoinflipBet.
+        buttons = discord.ui.View(timeout=None)
+        buttons.add_item(CoinflipBet(context.author.id, "heads"))
+        buttons.add_item(CoinflipBet(context.author.id, "tails"))
         embed = discord.Embed(description="What is your bet?", color=0x9C84EF)
-        message = await context.send(embed=embed, view=buttons)
-        await buttons.wait()  # We wait for the user to click a button.
-        result = random.choice(["heads", "tails"])
-        if buttons.value == result:
-            embed = discord.Embed(
-                description=f"Correct! You guessed `{buttons.value}` and I flipped "
-                f"the coin to `{result}`.",
-                color=0x9C84EF,
-            )
-        else:
-            embed = discord.Embed(
-                description=f"Woops! You guessed `{buttons.value}` and I flipped the "
-                f"coin to `{result}`, better luck next time!",
-                color=0xE02B2B,
-            )
-        await message.edit(embed=embed, view=None, content=None)
+        await context.send(embed=embed, view=buttons)
 
     @commands.hybrid_command(
         name="rps", description="Play the rock paper scissors game against the bot."
@@ -164,9 +216,11 @@ class Fun(commands.Cog, name="fun"):
         -------
         None
         """
-        view = RockPaperScissorsView()
+        view = discord.ui.View(timeout=None)
+        view.add_item(RockPaperScissors(context.author.id))
         await context.send("Please make your choice", view=view)
 
 
 async def setup(bot):
+    bot.add_dynamic_items(*DYNAMIC_ITEMS)
     await bot.add_cog(Fun(bot))
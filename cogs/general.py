@@ -1,8 +1,12 @@
 """
 Modified from https://github.com/kkrypt0nn (https://krypton.ninja)
 """
+import asyncio
 import platform
 import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 
 import discord
 from discord import app_commands
@@ -10,12 +14,339 @@ from discord.ext import commands
 from discord.ext.commands import Context
 
 from helpers import checks
-from bot import config
+from helpers.config import config_service
+from helpers.prefixes import display_prefix
+from helpers.shards import format_shard
+
+config = config_service.get()
+
+# The intents the commands of this cog rely on, see helpers/cache_policy.py.
+INTENTS = ("guilds",)
+
+# Discord allows 1024 characters per field and 6000 per embed, the help pages are
+# kept shorter than that so that they stay readable.
+FIELD_LIMIT = 1024
+HELP_PAGE_LIMIT = 3000
+
+# The server info shows the first roles only.
+SERVER_INFO_ROLES = 50
+# Without the members intent the member count is fetched from Discord, and the
+# server info showing it is rendered again, with a fresh count, after this many
+# seconds.
+MEMBER_COUNT_TTL = 600
+
+
+def help_pages(bot: commands.Bot, prefix: str) -> List[discord.Embed]:
+    """
+    Render the list of commands of every cog, split into pages.
+
+    Parameters
+    ----------
+    bot : commands.Bot
+        The bot whose commands are listed.
+    prefix : str
+        The prefix shown in front of the commands.
+
+    Returns
+    -------
+    List[discord.Embed]
+        The pages, there is always at least one.
+    """
+    fields = []
+    for name, cog in bot.cogs.items():
+        data = []
+        for command in cog.get_commands():
+            description = command.description.partition("\n")[0]
+            data.append(f"{prefix}{command.name} - {description}")
+        # A cog with many commands is split into several fields.
+        chunk: List[str] = []
+        size = 0
+        for line in data:
+            if chunk and size + len(line) + 1 > FIELD_LIMIT - 6:
+                fields.append((name, "\n".join(chunk)))
+                chunk, size = [], 0
+            chunk.append(line[: FIELD_LIMIT - 6])
+            size += len(chunk[-1]) + 1
+        if chunk:
+            fields.append((name, "\n".join(chunk)))
+
+    pages: List[List[Tuple[str, str]]] = [[]]
+    size = 0
+    for field in fields:
+        length = len(field[0]) + len(field[1])
+        if pages[-1] and (size + length > HELP_PAGE_LIMIT or len(pages[-1]) == 25):
+            pages.append([])
+            size = 0
+        pages[-1].append(field)
+        size += length
+
+    embeds = []
+    for number, page in enumerate(pages, start=1):
+        embed = discord.Embed(
+            title="Help", description="List of available commands:", color=0x9C84EF
+        )
+        for name, help_text in page:
+            embed.add_field(
+                name=name.capitalize(), value=f"```{help_text}```", inline=False
+            )
+        if len(pages) > 1:
+            embed.set_footer(text=f"Page {number}/{len(pages)}")
+        embeds.append(embed)
+    return embeds
+
+
+class HelpView(discord.ui.View):
+    """
+    Pages through the rendered help, the pages are never rendered again.
+    """
+
+    def __init__(self, author_id: int, pages: List[discord.Embed]):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.pages = pages
+        self.number = 0
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = self.number <= 0
+        self.next_page.disabled = self.number >= len(self.pages) - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def show(self, interaction: discord.Interaction, number: int) -> None:
+        self.number = max(0, min(number, len(self.pages) - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(
+            embed=self.pages[self.number], view=self
+        )
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.blurple)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self.show(interaction, self.number - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.blurple)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self.show(interaction, self.number + 1)
+
+
+class GuildSummary:
+    """
+    What the server info shows about a guild, kept up to date by the events of the
+    guild instead of being collected on every call. The embed is rendered the first
+    time it is needed after a change, and reused until the next one.
+    """
+
+    __slots__ = (
+        "roles",
+        "channel_kinds",
+        "channel_counts",
+        "embed",
+        "expires_at",
+        "lock",
+    )
+
+    def __init__(self, guild: discord.Guild) -> None:
+        self.roles: Dict[int, discord.Role] = {role.id: role for role in guild.roles}
+        self.channel_kinds: Dict[int, str] = {
+            channel.id: self.channel_kind(channel) for channel in guild.channels
+        }
+        self.channel_counts = Counter(self.channel_kinds.values())
+        self.embed: Optional[discord.Embed] = None
+        self.expires_at: Optional[float] = None
+        # Held while rendering, so that concurrent calls fetch the count once.
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def channel_kind(channel: discord.abc.GuildChannel) -> str:
+        if isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
+            return "voice"
+        if isinstance(channel, discord.CategoryChannel):
+            return "category"
+        return "text"
+
+    def invalidate(self) -> None:
+        self.embed = None
+
+    def role_created(self, role: discord.Role) -> None:
+        self.roles[role.id] = role
+        self.invalidate()
+
+    def role_deleted(self, role: discord.Role) -> None:
+        self.roles.pop(role.id, None)
+        self.invalidate()
+
+    def channel_created(self, channel: discord.abc.GuildChannel) -> None:
+        self.channel_deleted(channel)
+        kind = self.channel_kinds[channel.id] = self.channel_kind(channel)
+        self.channel_counts[kind] += 1
+        self.invalidate()
+
+    def channel_deleted(self, channel: discord.abc.GuildChannel) -> None:
+        kind = self.channel_kinds.pop(channel.id, None)
+        if kind is not None:
+            self.channel_counts[kind] -= 1
+        self.invalidate()
+
+    def get_embed(self) -> Optional[discord.Embed]:
+        """
+        Get the rendered server info, None if it has to be rendered again.
+        """
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.embed = None
+        return self.embed
+
+    def render(
+        self, guild: discord.Guild, member_count: int, fetched: bool
+    ) -> discord.Embed:
+        """
+        Render the server info of the guild and keep it until the next change.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild.
+        member_count : int
+            The number of members of the guild.
+        fetched : bool
+            Whether the member count was fetched from Discord, it then isn't kept up
+            to date by the events and the embed expires.
+
+        Returns
+        -------
+        discord.Embed
+            The server info.
+        """
+        # Sorted like guild.roles, by position.
+        roles = sorted(self.roles.values())
+        names = [role.name for role in roles[:SERVER_INFO_ROLES]]
+        if len(roles) > SERVER_INFO_ROLES:
+            names.append(f">>>> Displaying[{SERVER_INFO_ROLES}/{len(roles)}] Roles")
+        names = ", ".join(names)
+        if len(names) > FIELD_LIMIT:
+            names = names[: FIELD_LIMIT - 3] + "..."
+
+        embed = discord.Embed(
+            title="**Server Name:**", description=f"{guild}", color=0x9C84EF
+        )
+        if guild.icon is not None:
+            embed.set_thumbnail(url=guild.icon.url)
+        embed.add_field(name="Server ID", value=guild.id)
+        embed.add_field(name="Member Count", value=member_count)
+        embed.add_field(
+            name="Text/Voice Channels",
+            value=f"{self.channel_counts['text']}/{self.channel_counts['voice']}",
+        )
+        embed.add_field(name=f"Roles ({len(roles)})", value=names)
+        embed.set_footer(text=f"Created at: {guild.created_at}")
+        self.embed = embed
+        self.expires_at = time.monotonic() + MEMBER_COUNT_TTL if fetched else None
+        return embed
 
 
 class General(commands.Cog, name="general"):
     def __init__(self, bot):
         self.bot = bot
+        # The rendered help pages for each prefix, with the cog set version they
+        # were rendered for.
+        self._help_cache: Dict[str, Tuple[int, List[discord.Embed]]] = {}
+        # The summaries of the guilds the server info was asked in, by guild ID.
+        self._summaries: Dict[int, GuildSummary] = {}
+
+    def _summary(self, guild: discord.Guild) -> Optional[GuildSummary]:
+        return self._summaries.get(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        summary = self._summary(role.guild)
+        if summary is not None:
+            summary.role_created(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        summary = self._summary(role.guild)
+        if summary is not None:
+            summary.role_deleted(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(
+        self, before: discord.Role, after: discord.Role
+    ) -> None:
+        # The cached role is updated in place, only the embed is outdated.
+        summary = self._summary(after.guild)
+        if summary is not None:
+            summary.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(
+        self, channel: discord.abc.GuildChannel
+    ) -> None:
+        summary = self._summary(channel.guild)
+        if summary is not None:
+            summary.channel_created(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(
+        self, channel: discord.abc.GuildChannel
+    ) -> None:
+        summary = self._summary(channel.guild)
+        if summary is not None:
+            summary.channel_deleted(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(
+        self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ) -> None:
+        # Only a change of type, e.g. from text to voice, moves it between counts.
+        summary = self._summary(after.guild)
+        if summary is None:
+            return
+        if GuildSummary.channel_kind(before) != GuildSummary.channel_kind(after):
+            summary.channel_created(after)
+
+    @commands.Cog.listener()
+    async def on_guild_update(
+        self, before: discord.Guild, after: discord.Guild
+    ) -> None:
+        summary = self._summary(after)
+        if summary is not None:
+            summary.invalidate()
+
+    @commands.Cog.listener("on_member_join")
+    @commands.Cog.listener("on_member_remove")
+    async def on_member_count_change(self, member: discord.Member) -> None:
+        summary = self._summary(member.guild)
+        if summary is not None:
+            summary.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self._summaries.pop(guild.id, None)
+
+    def get_help_pages(self, prefix: str) -> List[discord.Embed]:
+        """
+        Get the help pages, rendered again only when a cog has been added or removed
+        since the last time.
+
+        Parameters
+        ----------
+        prefix : str
+            The prefix shown in front of the commands.
+
+        Returns
+        -------
+        List[discord.Embed]
+            The pages.
+        """
+        cached = self._help_cache.get(prefix)
+        if cached is None or cached[0] != self.bot.cogs_version:
+            cached = (self.bot.cogs_version, help_pages(self.bot, prefix))
+            self._help_cache[prefix] = cached
+        return cached[1]
 
     @commands.hybrid_command(
         name="help", description="List all commands the bot has loaded."
@@ -23,22 +354,14 @@ class General(commands.Cog, name="general"):
     @app_commands.guilds(config["guild_id"])
     @checks.not_blacklisted()
     async def help(self, context: Context) -> None:
-        prefix = self.bot.config["prefix"]
-        embed = discord.Embed(
-            title="Help", description="List of available commands:", color=0x9C84EF
+        prefix = display_prefix(
+            self.bot.config, context.guild.id if context.guild else None
         )
-        for i in self.bot.cogs:
-            cog = self.bot.get_cog(i.lower())
-            cog_commands = cog.get_commands()
-            data = []
-            for command in cog_commands:
-                description = command.description.partition("\n")[0]
-                data.append(f"{prefix}{command.name} - {description}")
-            help_text = "\n".join(data)
-            embed.add_field(
-                name=i.capitalize(), value=f"```{help_text}```", inline=False
-            )
-        await context.send(embed=embed)
+        pages = self.get_help_pages(prefix)
+        if len(pages) == 1:
+            await context.send(embed=pages[0])
+            return
+        await context.send(embed=pages[0], view=HelpView(context.author.id, pages))
 
     @commands.hybrid_command(
         name="get_bot_info",
@@ -59,6 +382,9 @@ class General(commands.Cog, name="general"):
         -------
         None
         """
+        prefix = display_prefix(
+            self.bot.config, context.guild.id if context.guild else None
+        )
         embed = discord.Embed(
             description="Used [Krypton's](https://krypton.ninja) template",
             color=0x9C84EF,
@@ -70,13 +396,24 @@ class General(commands.Cog, name="general"):
         )
         embed.add_field(
             name="Prefix:",
-            value=f"/ (Slash Commands) or {self.bot.config['prefix']} for normal "
-            f"commands",
+            value=f"/ (Slash Commands) or {prefix} for normal commands",
             inline=False,
         )
         embed.set_footer(text=f"Requested by {context.author}")
         await context.send(embed=embed)
 
+    async def render_server_info(
+        self, guild: discord.Guild, summary: GuildSummary
+    ) -> discord.Embed:
+        member_count = guild.member_count
+        # Without the members intent the joins and leaves never reach the bot,
+        # the cached count is only the one sent when it connected.
+        fetched = member_count is None or not self.bot.intents.members
+        if fetched:
+            fetched_guild = await self.bot.fetch_guild(guild.id, with_counts=True)
+            member_count = fetched_guild.approximate_member_count
+        return summary.render(guild, member_count, fetched)
+
     @commands.hybrid_command(
         name="server_info",
         description="Get some useful (or not) information about the server.",
@@ -96,24 +433,16 @@ class General(commands.Cog, name="general"):
         -------
         None
         """
-        roles = [role.name for role in context.guild.roles]
-        if len(roles) > 50:
-            roles = roles[:50]
-            roles.append(f">>>> Displaying[50/{len(roles)}] Roles")
-        roles = ", ".join(roles)
-
-        embed = discord.Embed(
-            title="**Server Name:**", description=f"{context.guild}", color=0x9C84EF
-        )
-        if context.guild.icon is not None:
-            embed.set_thumbnail(url=context.guild.icon.url)
-        embed.add_field(name="Server ID", value=context.guild.id)
-        embed.add_field(name="Member Count", value=context.guild.member_count)
-        embed.add_field(
-            name="Text/Voice Channels", value=f"{len(context.guild.channels)}"
-        )
-        embed.add_field(name=f"Roles ({len(context.guild.roles)})", value=roles)
-        embed.set_footer(text=f"Created at: {context.guild.created_at}")
+        guild = context.guild
+        summary = self._summaries.get(guild.id)
+        if summary is None:
+            summary = self._summaries[guild.id] = GuildSummary(guild)
+        embed = summary.get_embed()
+        if embed is None:
+            async with summary.lock:
+                embed = summary.get_embed()
+                if embed is None:
+                    embed = await self.render_server_info(guild, summary)
         await context.send(embed=embed)
 
     @commands.hybrid_command(
@@ -140,6 +469,10 @@ class General(commands.Cog, name="general"):
             description=f"The bot latency is {round(self.bot.latency * 1000)}ms.",
             color=0x9C84EF,
         )
+        shard_id = context.guild.shard_id if context.guild is not None else 0
+        for shard in self.bot.shard_monitor.report(self.bot.shard_latencies()):
+            if shard["shard_id"] == shard_id:
+                embed.add_field(name="Shard", value=format_shard(shard))
         await context.send(embed=embed)
 
     @commands.hybrid_command(
@@ -7,7 +7,100 @@ from discord.ext import commands
 from discord.ext.commands import Context
 
 from helpers import checks, db_manager
-from bot import config
+from helpers.config import config_service
+
+config = config_service.get()
+
+INTENTS = ("guilds",)
+
+WARNINGS_PER_PAGE = 10
+
+
+def warnings_embed(
+    user: discord.User, page: list, number: int, total: int
+) -> discord.Embed:
+    embed = discord.Embed(title=f"Warnings of {user}", color=0x9C84EF)
+    if not page:
+        embed.description = "This user has no warnings."
+        return embed
+    embed.description = "\n".join(
+        f"• Warned by <@{warning[2]}>: **{warning[3]}** (<t:{warning[4]}>) - "
+        f"Warn ID #{warning[5]}"
+        for warning in page
+    )
+    pages = max(1, -(-total // WARNINGS_PER_PAGE))
+    embed.set_footer(
+        text=f"Page {number}/{pages} - {total} {'warning' if total == 1 else 'warnings'}"
+    )
+    return embed
+
+
+class WarningsView(discord.ui.View):
+    """
+    Pages through the warnings of a user. Only the page being viewed is fetched from
+    the database, using the IDs of its first and last warnings to find the pages
+    around it.
+    """
+
+    def __init__(
+        self,
+        author_id: int,
+        user: discord.User,
+        server_id: int,
+        page: list,
+        total: int,
+    ):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.user = user
+        self.server_id = server_id
+        self.page = page
+        self.number = 1
+        self.total = total
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = self.number <= 1
+        self.next_page.disabled = self.number * WARNINGS_PER_PAGE >= self.total
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def show(
+        self, interaction: discord.Interaction, page: list, number: int
+    ) -> None:
+        if page:
+            self.page = page
+            self.number = number
+        self.update_buttons()
+        await interaction.response.edit_message(
+            embed=warnings_embed(self.user, self.page, self.number, self.total),
+            view=self,
+        )
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.blurple)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        page = await db_manager.get_warnings_page(
+            self.user.id,
+            self.server_id,
+            after_id=self.page[0][5],
+            limit=WARNINGS_PER_PAGE,
+        )
+        await self.show(interaction, page, self.number - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.blurple)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        page = await db_manager.get_warnings_page(
+            self.user.id,
+            self.server_id,
+            before_id=self.page[-1][5],
+            limit=WARNINGS_PER_PAGE,
+        )
+        await self.show(interaction, page, self.number + 1)
 
 
 class Moderation(commands.Cog, name="moderation"):
@@ -46,9 +139,19 @@ class Moderation(commands.Cog, name="moderation"):
         -------
         None
         """
-        member = context.guild.get_member(user.id) or await context.guild.fetch_member(
-            user.id
-        )
+        # Only the bot's own member is cached with the minimal intents.
+        member = context.guild.get_member(user.id)
+        if member is None:
+            try:
+                member = await context.guild.fetch_member(user.id)
+            except discord.NotFound:
+                embed = discord.Embed(
+                    title="Error!",
+                    description=f"**{user}** is not on this server.",
+                    color=0xE02B2B,
+                )
+                await context.send(embed=embed)
+                return
         try:
             await member.edit(nick=nickname)
             embed = discord.Embed(
@@ -67,6 +170,40 @@ class Moderation(commands.Cog, name="moderation"):
             )
             await context.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="warnings",
+        description="Shows the warnings of a user in the server.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @commands.has_permissions(manage_messages=True)
+    @checks.not_blacklisted()
+    @app_commands.describe(user="The user you want to get the warnings of.")
+    async def warnings(self, context: Context, user: discord.User) -> None:
+        """
+        Shows the warnings of a user in the server, one page at a time.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+        user : discord.User
+            The user you want to get the warnings of.
+
+        Returns
+        -------
+        None
+        """
+        total = await db_manager.count_warnings(user.id, context.guild.id)
+        page = await db_manager.get_warnings_page(
+            user.id, context.guild.id, limit=WARNINGS_PER_PAGE
+        )
+        embed = warnings_embed(user, page, 1, total)
+        if total <= WARNINGS_PER_PAGE:
+            await context.send(embed=embed)
+            return
+        view = WarningsView(context.author.id, user, context.guild.id, page, total)
+        await context.send(embed=embed, view=view)
+
 
 async def setup(bot):
     await bot.add_cog(Moderation(bot))
@@ -1,13 +1,22 @@
 """
 Modified from https://github.com/kkrypt0nn (https://krypton.ninja)
 """
+from typing import AsyncIterator
+
+import aiohttp
 import discord
 from discord import app_commands, HTTPException
 from discord.ext import commands
 from discord.ext.commands import Context
 
-from helpers import checks, db_manager
-from bot import config
+import exceptions
+from helpers import blacklist_io, checks, db_manager
+from helpers.command_sync import describe
+from helpers.config import config_service
+from helpers.metrics import metrics
+from helpers.shards import format_shard
+
+config = config_service.get()
 
 
 class Owner(commands.Cog, name="owner"):
@@ -16,29 +25,46 @@ class Owner(commands.Cog, name="owner"):
 
     @commands.command(
         name="sync",
-        description="Synchronizes the slash commands.",
+        description="Synchronizes the slash commands that changed.",
     )
-    @app_commands.describe(scope="The scope of the sync. Can be `global` or `guild`")
+    @app_commands.describe(force="Synchronize every scope, even the unchanged ones")
     @checks.is_owner()
-    async def sync(self, context: Context) -> None:
+    async def sync(self, context: Context, force: bool = False) -> None:
         """
-        Synchronizes the slash commands.
+        Synchronizes the slash commands of the scopes, global or guild, whose
+        commands changed since their last synchronization.
 
         Parameters
         ----------
         context : Context
             The hybrid command context.
+        force : bool
+            Synchronize every scope, even the unchanged ones.
 
         Returns
         -------
         None
         """
-        await context.bot.tree.sync()
+        try:
+            synced = await context.bot.sync_commands(force=force)
+        except HTTPException as e:
+            embed = discord.Embed(
+                title="Slash Commands Sync",
+                description=f"Could not synchronize the slash commands: {e.text}",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
         embed = discord.Embed(
             title="Slash Commands Sync",
-            description="Slash commands have been globally synchronized.",
+            description="Slash commands have been synchronized."
+            if synced
+            else "Slash commands are up to date, nothing to synchronize.",
             color=0x9C84EF,
         )
+        for diff in synced:
+            scope = "Global" if diff.guild is None else f"Guild {diff.scope}"
+            embed.add_field(name=scope, value=describe(diff)[:1024], inline=False)
         await context.send(embed=embed)
 
     @commands.hybrid_command(
@@ -158,6 +184,166 @@ class Owner(commands.Cog, name="owner"):
         )
         await context.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="reload_changed",
+        description="Reloads the cogs whose source changed.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @checks.is_owner()
+    async def reload_changed(self, context: Context) -> None:
+        """
+        The bot will reload the cogs whose source, or the source of the helpers they
+        use, changed since the last check.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+
+        Returns
+        -------
+        None
+        """
+        results, restart_needed = await self.bot.hot_reloader.check()
+        failed = [result for result in results if result.error is not None]
+        embed = discord.Embed(
+            title="Reload",
+            description="\n".join(f"`{result}`" for result in results)
+            or "Nothing changed.",
+            color=0xE02B2B if failed else 0x9C84EF,
+        )
+        if restart_needed:
+            embed.add_field(
+                name="Needs a restart",
+                value=", ".join(f"`{name}`" for name in restart_needed),
+            )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="reload_config",
+        description="Reloads the config file.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @checks.is_owner()
+    async def reload_config(self, context: Context) -> None:
+        """
+        Reloads the config file right away instead of waiting for the change to be
+        noticed.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            config_service.reload()
+        except exceptions.ConfigError as e:
+            embed = discord.Embed(
+                title="Error!",
+                description=f"Could not reload the config, keeping the previous "
+                f"one.\n{e.message}",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        await self.bot.publish({"type": "config_reload"})
+        embed = discord.Embed(
+            title="Reload Config",
+            description="Successfully reloaded the config.",
+            color=0x9C84EF,
+        )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="stats",
+        description="Shows the latency of the commands.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @checks.is_owner()
+    async def stats(self, context: Context) -> None:
+        """
+        Shows how many times each command ran and how long it took, split between
+        the checks, the database and the Discord API.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+
+        Returns
+        -------
+        None
+        """
+        embed = discord.Embed(
+            title="Command Statistics",
+            description="Latencies in milliseconds as p50 / p95 / p99.",
+            color=0x9C84EF,
+        )
+        # An embed can't have more than 25 fields.
+        for command in metrics.commands()[:25]:
+            summary = metrics.summary(command)
+            lines = []
+            for phase, phase_summary in summary.items():
+                p50, p95, p99 = (
+                    phase_summary[key] * 1000 for key in ("p50", "p95", "p99")
+                )
+                lines.append(f"{phase}: {p50:.1f} / {p95:.1f} / {p99:.1f}")
+            calls = summary["total"]["count"]
+            embed.add_field(
+                name=f"{command} ({calls} {'call' if calls == 1 else 'calls'})",
+                value="```" + "\n".join(lines) + "```",
+                inline=False,
+            )
+        if not embed.fields:
+            embed.description = "No command has been executed yet."
+        prefixes = self.bot.prefixes
+        embed.set_footer(
+            text=f"{prefixes.discarded} of {prefixes.checked} messages discarded "
+            f"before parsing"
+        )
+        await context.send(embed=embed)
+
+    @commands.hybrid_command(
+        name="shards",
+        description="Shows the health of the shards.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @checks.is_owner()
+    async def shards(self, context: Context) -> None:
+        """
+        Shows the latency, the event rate and the reconnects of every shard.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+
+        Returns
+        -------
+        None
+        """
+        shards = self.bot.shard_monitor.report(self.bot.shard_latencies())
+        embed = discord.Embed(
+            title="Shards",
+            description="```"
+            + "\n".join(format_shard(shard) for shard in shards[:50])
+            + "```",
+            color=0x9C84EF,
+        )
+        guilds = {}
+        for guild in self.bot.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        embed.set_footer(
+            text=f"{len(shards)} {'shard' if len(shards) == 1 else 'shards'}, "
+            f"{sum(shard['disconnects'] for shard in shards)} disconnects, "
+            f"up to {max(guilds.values(), default=0)} guilds per shard"
+        )
+        await context.send(embed=embed)
+
     @commands.hybrid_command(
         name="shutdown",
         description="Make the bot shutdown.",
@@ -205,7 +391,10 @@ class Owner(commands.Cog, name="owner"):
                 title="Blacklist",
                 description="You need to specify a subcommand.\n\n**Subcommands:**\n"
                 "`add` - Add a user to the blacklist.\n"
-                "`remove` - Remove a user from the blacklist.",
+                "`remove` - Remove a user from the blacklist.\n"
+                "`import` - Add the users of a CSV or JSON file to the blacklist.\n"
+                "`export` - Download the blacklist as a CSV or JSON file.\n"
+                "`refresh` - Reload the blacklist from the database.",
                 color=0xE02B2B,
             )
             await context.send(embed=embed)
@@ -244,6 +433,7 @@ class Owner(commands.Cog, name="owner"):
             await context.send(embed=embed)
             return
         total = await db_manager.add_user_to_blacklist(user_id)
+        await self.bot.publish({"type": "blacklist_add", "user_id": user_id})
         embed = discord.Embed(
             title="User Blacklisted",
             description=f"**{user.name}** has been successfully added to the blacklist",
@@ -288,6 +478,7 @@ class Owner(commands.Cog, name="owner"):
             await context.send(embed=embed)
             return
         total = await db_manager.remove_user_from_blacklist(user_id)
+        await self.bot.publish({"type": "blacklist_remove", "user_id": user_id})
         embed = discord.Embed(
             title="User removed from blacklist",
             description=f"**{user.name}** has been successfully removed from the "
@@ -300,6 +491,168 @@ class Owner(commands.Cog, name="owner"):
         )
         await context.send(embed=embed)
 
+    @blacklist.command(
+        base="blacklist",
+        name="import",
+        description="Adds the users of a CSV or JSON file to the blacklist.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @app_commands.describe(
+        file="A CSV file with the user IDs in the first column, or a JSON array"
+    )
+    @checks.is_owner()
+    async def blacklist_import(
+        self, context: Context, file: discord.Attachment
+    ) -> None:
+        """
+        Adds the users of a CSV or JSON file to the blacklist, e.g. one exported by
+        another community. The file is read as it is downloaded, and the users are
+        added in chunks, the ones already in the blacklist are skipped.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+        file : discord.Attachment
+            The CSV or JSON file, gzipped if its name ends with `.gz`.
+
+        Returns
+        -------
+        None
+        """
+        await context.defer()
+
+        async def download() -> AsyncIterator[bytes]:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(file.url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(65536):
+                        yield chunk
+
+        try:
+            result = await blacklist_io.import_blacklist(
+                download(),
+                blacklist_io.file_format(file.filename),
+                gzipped=blacklist_io.is_gzipped(file.filename),
+            )
+        except (ValueError, aiohttp.ClientError) as e:
+            # The users added before the error are kept.
+            await self.bot.publish({"type": "blacklist_refresh"})
+            embed = discord.Embed(
+                title="Error!",
+                description=f"Could not import `{file.filename}`: {e}",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        await self.bot.publish({"type": "blacklist_refresh"})
+        total = result["total"]
+        embed = discord.Embed(
+            title="Blacklist Imported",
+            description=f"**{result['added']}** of the {result['read']} users of "
+            f"`{file.filename}` have been added to the blacklist, the others were "
+            f"already in it.",
+            color=0x9C84EF,
+        )
+        if result["invalid"]:
+            embed.add_field(name="Invalid Entries", value=result["invalid"])
+        embed.set_footer(
+            text=f"There are now {total} {'user' if total == 1 else 'users'} in the "
+            f"blacklist "
+        )
+        await context.send(embed=embed)
+
+    @blacklist.command(
+        base="blacklist",
+        name="export",
+        description="Downloads the blacklist as a CSV or JSON file.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @app_commands.describe(file_format="The format of the file, `csv` or `json`")
+    @checks.is_owner()
+    async def blacklist_export(
+        self, context: Context, file_format: str = "csv"
+    ) -> None:
+        """
+        Downloads the blacklist as a CSV or JSON file, which can be imported by
+        another bot. A file too big to be uploaded is gzipped.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+        file_format : str
+            The format of the file, `csv` or `json`.
+
+        Returns
+        -------
+        None
+        """
+        file_format = file_format.lower()
+        if file_format not in blacklist_io.FORMATS:
+            embed = discord.Embed(
+                title="Error!",
+                description="The format must be `csv` or `json`.",
+                color=0xE02B2B,
+            )
+            await context.send(embed=embed)
+            return
+        await context.defer()
+        if context.guild is not None:
+            size_limit = context.guild.filesize_limit
+        else:
+            size_limit = discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        with await blacklist_io.export_blacklist(file_format) as export:
+            try:
+                upload, filename = blacklist_io.fit_upload(
+                    export, f"blacklist.{file_format}", size_limit
+                )
+            except ValueError as e:
+                embed = discord.Embed(
+                    title="Error!",
+                    description=f"Could not export the blacklist: {e}",
+                    color=0xE02B2B,
+                )
+                await context.send(embed=embed)
+                return
+            with upload:
+                await context.send(file=discord.File(upload, filename=filename))
+
+    @blacklist.command(
+        base="blacklist",
+        name="refresh",
+        description="Reloads the in-memory blacklist from the database.",
+    )
+    @app_commands.guilds(config["guild_id"])
+    @checks.is_owner()
+    async def blacklist_refresh(self, context: Context) -> None:
+        """
+        Reloads the in-memory blacklist from the database, for when the database has
+        been edited by hand.
+
+        Parameters
+        ----------
+        context : Context
+            The hybrid command context.
+
+        Returns
+        -------
+        None
+        """
+        total = await db_manager.refresh_blacklist()
+        await self.bot.publish({"type": "blacklist_refresh"})
+        stats = db_manager.blacklist_cache.stats()
+        embed = discord.Embed(
+            title="Blacklist Refreshed",
+            description=f"There are now {total} {'user' if total == 1 else 'users'} "
+            f"in the blacklist.",
+            color=0x9C84EF,
+        )
+        embed.add_field(name="Cache Hits", value=stats["hits"])
+        embed.add_field(name="Cache Misses", value=stats["misses"])
+        embed.add_field(name="Refreshes", value=stats["refreshes"])
+        await context.send(embed=embed)
+
 
 async def setup(bot):
     await bot.add_cog(Owner(bot))
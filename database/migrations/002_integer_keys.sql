@@ -0,0 +1,65 @@
+-- Store the Discord IDs as integers and give both tables a primary key, so that
+-- lookups by user are index seeks instead of full table scans.
+
+CREATE TABLE `blacklist_new` (
+  `user_id` INTEGER PRIMARY KEY NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO `blacklist_new` (`user_id`, `created_at`)
+SELECT CAST(`user_id` AS INTEGER), `created_at` FROM `blacklist` ORDER BY `rowid`;
+
+DROP TABLE `blacklist`;
+ALTER TABLE `blacklist_new` RENAME TO `blacklist`;
+
+CREATE TABLE `warns_new` (
+  `server_id` INTEGER NOT NULL,
+  `user_id` INTEGER NOT NULL,
+  `id` INTEGER NOT NULL,
+  `moderator_id` INTEGER NOT NULL,
+  `reason` varchar(255) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`server_id`, `user_id`, `id`)
+) WITHOUT ROWID;
+
+-- Warnings that were given the same ID by concurrent inserts keep their data: the
+-- first one keeps the ID and the others are numbered after the user's last warning.
+CREATE TEMP TABLE `warns_numbered` AS
+SELECT
+  CAST(`server_id` AS INTEGER) AS `server_id`,
+  CAST(`user_id` AS INTEGER) AS `user_id`,
+  `id`,
+  CAST(`moderator_id` AS INTEGER) AS `moderator_id`,
+  `reason`,
+  `created_at`,
+  ROW_NUMBER() OVER (
+    PARTITION BY CAST(`server_id` AS INTEGER), CAST(`user_id` AS INTEGER), `id`
+    ORDER BY `rowid`
+  ) AS `duplicate`,
+  MAX(`id`) OVER (
+    PARTITION BY CAST(`server_id` AS INTEGER), CAST(`user_id` AS INTEGER)
+  ) AS `last_id`,
+  `rowid` AS `position`
+FROM `warns`;
+
+INSERT INTO `warns_new`
+  (`server_id`, `user_id`, `id`, `moderator_id`, `reason`, `created_at`)
+SELECT `server_id`, `user_id`, `id`, `moderator_id`, `reason`, `created_at`
+FROM `warns_numbered` WHERE `duplicate` = 1;
+
+INSERT INTO `warns_new`
+  (`server_id`, `user_id`, `id`, `moderator_id`, `reason`, `created_at`)
+SELECT
+  `server_id`,
+  `user_id`,
+  `last_id` + ROW_NUMBER() OVER (
+    PARTITION BY `server_id`, `user_id` ORDER BY `position`
+  ),
+  `moderator_id`,
+  `reason`,
+  `created_at`
+FROM `warns_numbered` WHERE `duplicate` > 1;
+
+DROP TABLE `warns_numbered`;
+DROP TABLE `warns`;
+ALTER TABLE `warns_new` RENAME TO `warns`;
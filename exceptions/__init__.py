@@ -22,3 +22,13 @@ class UserNotOwner(commands.CheckFailure):
     def __init__(self, message="User is not an owner of the bot!"):
         self.message = message
         super().__init__(self.message)
+
+
+class ConfigError(Exception):
+    """
+    Thrown when the config file can't be read or is invalid.
+    """
+
+    def __init__(self, message="The config file is invalid!"):
+        self.message = message
+        super().__init__(self.message)
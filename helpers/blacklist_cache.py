@@ -0,0 +1,89 @@
+"""
+In-memory copy of the blacklist table.
+"""
+from typing import Iterable, Optional, Set
+
+
+class BlacklistCache:
+    """
+    A set of the blacklisted user IDs, loaded from the database when the bot starts
+    and kept up to date by the functions of the database manager that write to the
+    blacklist table.
+
+    Lookups are counted so that the cache can be checked from the bot: a hit is a
+    lookup answered from memory and a miss is a lookup that had to go to the
+    database because the cache was not loaded yet.
+    """
+
+    def __init__(self) -> None:
+        self._user_ids: Set[int] = set()
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self._user_ids)
+
+    def replace(self, user_ids: Iterable[int]) -> None:
+        """
+        Replace the content of the cache with the given user IDs.
+
+        Parameters
+        ----------
+        user_ids : Iterable[int]
+            Every blacklisted user ID.
+        """
+        self._user_ids = {int(user_id) for user_id in user_ids}
+        self.loaded = True
+        self.refreshes += 1
+
+    def clear(self) -> None:
+        """
+        Empty the cache and mark it as not loaded.
+        """
+        self._user_ids = set()
+        self.loaded = False
+
+    def add(self, user_id: int) -> None:
+        self._user_ids.add(int(user_id))
+
+    def discard(self, user_id: int) -> None:
+        self._user_ids.discard(int(user_id))
+
+    def lookup(self, user_id: int) -> Optional[bool]:
+        """
+        Check if a user is blacklisted without touching the database.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the user that should be checked.
+
+        Returns
+        -------
+        Optional[bool]
+            True if the user is blacklisted, False if not, or None if the cache is
+            not loaded and the database has to be asked instead.
+        """
+        if not self.loaded:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return user_id in self._user_ids
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache.
+
+        Returns
+        -------
+        dict
+            The number of cached users, hits, misses and refreshes.
+        """
+        return {
+            "size": len(self._user_ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
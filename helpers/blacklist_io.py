@@ -0,0 +1,335 @@
+"""
+Streaming import and export of the blacklist, to share it between communities.
+
+Two formats are read and written:
+
+    user_id,created_at              [{"user_id": 123, "created_at": 1700000000}, ...]
+    123,1700000000
+    456,1700000000
+
+The imported files may also be a CSV with the user IDs in the first column and no
+header, or a JSON array of user IDs, as numbers or strings. Both are parsed as their
+bytes arrive, so a file of any size only costs one chunk of memory, and the exports
+are written to a temporary file one page of the table at a time. An export too big
+to be uploaded is gzipped, and the imported files ending with `.gz` are decompressed
+as they arrive.
+"""
+import codecs
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from typing import IO, AsyncIterator, Iterator, List, Optional, Tuple
+
+from helpers import db_manager
+
+FORMATS = ("csv", "json")
+
+# The largest snowflake, bigger numbers can't be Discord IDs.
+MAX_ID = 2**63 - 1
+
+# The longest line, or JSON value, waiting for the next chunk. An entry is a user
+# ID, anything longer is a malformed file and would otherwise be buffered whole.
+MAX_PENDING = 4096
+
+# The most bytes decompressed at once from a gzipped file, so that a small chunk
+# can't expand to a huge string.
+MAX_DECOMPRESSED = 65536
+
+
+def is_gzipped(filename: str) -> bool:
+    return filename.lower().endswith(".gz")
+
+
+def file_format(filename: str) -> str:
+    """
+    Guess the format of an imported file from its name, CSV unless it ends with
+    `.json` or `.json.gz`.
+    """
+    filename = filename.lower()
+    if is_gzipped(filename):
+        filename = filename[:-3]
+    return "json" if filename.endswith(".json") else "csv"
+
+
+class UserIdReader:
+    """
+    Parses the user IDs out of the chunks of a CSV or JSON file, gzipped or not,
+    and counts the entries that aren't user IDs.
+    """
+
+    def __init__(self, file_format: str, gzipped: bool = False) -> None:
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown format '{file_format}'")
+        self.file_format = file_format
+        self.invalid = 0
+        self._decompressor = (
+            zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        )
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._first_row = True
+        # Where the JSON parser is: before the array, inside it or after it.
+        self._state = "start"
+        self._json = json.JSONDecoder()
+
+    def _user_id(self, value) -> Optional[int]:
+        if isinstance(value, dict):
+            value = value.get("user_id", value.get("id"))
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if isinstance(value, int) and not isinstance(value, bool):
+            if 0 < value <= MAX_ID:
+                return value
+        self.invalid += 1
+        return None
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[int]:
+        """
+        Parse the next chunk of the file.
+
+        Parameters
+        ----------
+        chunk : bytes
+            The next bytes of the file.
+        final : bool
+            Whether this is the last chunk.
+
+        Returns
+        -------
+        List[int]
+            The user IDs completed by the chunk.
+
+        Raises
+        ------
+        ValueError
+            The JSON isn't an array, is malformed, an entry is too long, or the
+            gzipped file is corrupt.
+        """
+        if self._decompressor is None:
+            return self._parse(chunk, final)
+        user_ids = []
+        try:
+            data = self._decompressor.decompress(chunk, MAX_DECOMPRESSED)
+            while self._decompressor.unconsumed_tail:
+                user_ids += self._parse(data, False)
+                data = self._decompressor.decompress(
+                    self._decompressor.unconsumed_tail, MAX_DECOMPRESSED
+                )
+            if final:
+                data += self._decompressor.flush()
+        except zlib.error as e:
+            raise ValueError(f"The gzipped file is corrupt: {e}")
+        if final and not self._decompressor.eof:
+            raise ValueError("The gzipped file is truncated.")
+        return user_ids + self._parse(data, final)
+
+    def _parse(self, data: bytes, final: bool) -> List[int]:
+        self._buffer += self._decoder.decode(data, final)
+        if self.file_format == "csv":
+            user_ids = list(self._csv_rows(final))
+        else:
+            user_ids = list(self._json_items(final))
+        if len(self._buffer) > MAX_PENDING:
+            raise ValueError(
+                f"An entry is longer than {MAX_PENDING} characters, the file is "
+                f"malformed."
+            )
+        return user_ids
+
+    def _csv_rows(self, final: bool) -> Iterator[int]:
+        # Only split on line feeds, str.splitlines also breaks on characters like
+        # U+2028 that can appear inside a row.
+        lines = self._buffer.split("\n")
+        # The last line continues in the next chunk, or is empty.
+        self._buffer = "" if final else lines.pop()
+        for row in csv.reader(line.rstrip("\r") for line in lines):
+            if not row or not row[0].strip():
+                continue
+            first_row, self._first_row = self._first_row, False
+            if first_row and not row[0].strip().isdigit():
+                # The header.
+                continue
+            user_id = self._user_id(row[0])
+            if user_id is not None:
+                yield user_id
+
+    def _json_items(self, final: bool) -> Iterator[int]:
+        position = 0
+        buffer = self._buffer
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer):
+                break
+            if self._state == "start":
+                if buffer[position] != "[":
+                    raise ValueError("The JSON file must contain an array.")
+                self._state = "items"
+                position += 1
+                continue
+            if self._state == "end":
+                raise ValueError("Unexpected data after the JSON array.")
+            if buffer[position] == "]":
+                self._state = "end"
+                position += 1
+                continue
+            if buffer[position] == ",":
+                position += 1
+                continue
+            try:
+                value, end = self._json.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise ValueError(f"Invalid JSON at character {position}.")
+                # The value continues in the next chunk.
+                break
+            if (
+                not final
+                and isinstance(value, (int, float))
+                and (end == len(buffer) or buffer[end] in ".eE")
+            ):
+                # A number cut in two by the chunks, e.g. after its dot, would be read
+                # as a smaller one.
+                break
+            position = end
+            user_id = self._user_id(value)
+            if user_id is not None:
+                yield user_id
+        self._buffer = buffer[position:]
+        if final and self._state != "end":
+            raise ValueError("The JSON array isn't closed.")
+
+
+async def import_blacklist(
+    chunks: AsyncIterator[bytes],
+    file_format: str,
+    chunk_size: int = 1000,
+    gzipped: bool = False,
+) -> dict:
+    """
+    Add every user ID of a file to the blacklist, `chunk_size` users per transaction.
+
+    Parameters
+    ----------
+    chunks : AsyncIterator[bytes]
+        The content of the file, as it is downloaded.
+    file_format : str
+        `csv` or `json`.
+    chunk_size : int
+        The number of users inserted per transaction.
+    gzipped : bool
+        Whether the file is gzipped.
+
+    Returns
+    -------
+    dict
+        The number of user IDs `read`, `added` to the blacklist, `invalid` entries
+        and the `total` of blacklisted users.
+
+    Raises
+    ------
+    ValueError
+        The file is malformed, the chunks read before the error are kept.
+    """
+    reader = UserIdReader(file_format, gzipped)
+    pending: List[int] = []
+    read = added = 0
+    async for chunk in chunks:
+        pending.extend(reader.feed(chunk))
+        while len(pending) >= chunk_size:
+            read += chunk_size
+            added += await db_manager.add_users_to_blacklist(pending[:chunk_size])
+            del pending[:chunk_size]
+    pending.extend(reader.feed(b"", final=True))
+    if pending:
+        read += len(pending)
+        added += await db_manager.add_users_to_blacklist(pending)
+    return {
+        "read": read,
+        "added": added,
+        "invalid": reader.invalid,
+        "total": len(db_manager.blacklist_cache),
+    }
+
+
+async def export_blacklist(file_format: str) -> IO[bytes]:
+    """
+    Write the blacklist to a temporary file, one page of the table at a time.
+
+    Parameters
+    ----------
+    file_format : str
+        `csv` or `json`.
+
+    Returns
+    -------
+    IO[bytes]
+        The file, rewound, deleted once closed.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format '{file_format}'")
+    file = tempfile.TemporaryFile()
+    first = True
+    if file_format == "csv":
+        file.write(b"user_id,created_at\n")
+    else:
+        file.write(b"[")
+    async for user_id, created_at in db_manager.iter_blacklist():
+        if file_format == "csv":
+            file.write(f"{user_id},{created_at}\n".encode())
+        else:
+            entry = json.dumps({"user_id": user_id, "created_at": created_at})
+            file.write(f"{'' if first else ','}\n  {entry}".encode())
+        first = False
+    if file_format == "json":
+        file.write(b"\n]\n" if not first else b"]\n")
+    file.seek(0)
+    return file
+
+
+def fit_upload(
+    file: IO[bytes], filename: str, size_limit: int
+) -> Tuple[IO[bytes], str]:
+    """
+    Make an export fit in an upload, by gzipping it if it is too big.
+
+    Parameters
+    ----------
+    file : IO[bytes]
+        The export, rewound.
+    filename : str
+        The name of the export, e.g. `blacklist.csv`.
+    size_limit : int
+        The maximum size of an upload, in bytes.
+
+    Returns
+    -------
+    Tuple[IO[bytes], str]
+        The export, or a gzipped copy of it, rewound, and its name.
+
+    Raises
+    ------
+    ValueError
+        The export is too big even once gzipped.
+    """
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    if size <= size_limit:
+        return file, filename
+    compressed = tempfile.TemporaryFile()
+    with gzip.GzipFile(filename, "wb", fileobj=compressed) as archive:
+        shutil.copyfileobj(file, archive)
+    compressed_size = compressed.tell()
+    file.seek(0)
+    if compressed_size > size_limit:
+        compressed.close()
+        raise ValueError(
+            f"The export is {size / 2**20:.1f} MB, {compressed_size / 2**20:.1f} MB "
+            f"gzipped, over the upload limit of {size_limit / 2**20:.1f} MB."
+        )
+    compressed.seek(0)
+    return compressed, f"{filename}.gz"
@@ -0,0 +1,128 @@
+"""
+The intents and the cache policy of the bot.
+
+By default the bot asks for every intent and discord.py caches every member,
+presence and message it sees. With `"intents": "minimal"` in the config, the bot
+only asks for the intents it needs to read commands, plus the ones the cogs declare
+in a module-level `INTENTS` tuple, only caches its own member and keeps
+`max_messages` messages, none unless set. Commands that used to rely on the cache
+fetch what they need instead.
+
+The cogs are read without being imported, so that lazy cogs stay unloaded.
+"""
+import ast
+import os
+import sys
+from typing import Any, Dict, Mapping, Set
+
+import discord
+
+# What the bot itself needs: the guilds, and the content of the messages for the
+# prefix commands.
+BASE_INTENTS = ("guilds", "guild_messages", "dm_messages", "message_content")
+
+
+def declared_intents(directory: str = "cogs") -> Set[str]:
+    """
+    Collect the `INTENTS` declared by the cogs.
+
+    Parameters
+    ----------
+    directory : str
+        The folder of the cogs.
+
+    Returns
+    -------
+    Set[str]
+        The names of the intents, e.g. `members`.
+    """
+    names: Set[str] = set()
+    for cog_file in os.listdir(directory):
+        if not cog_file.endswith(".py"):
+            continue
+        with open(os.path.join(directory, cog_file)) as file:
+            module = ast.parse(file.read(), cog_file)
+        for node in module.body:
+            if (
+                isinstance(node, ast.Assign)
+                and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and node.targets[0].id == "INTENTS"
+            ):
+                names.update(ast.literal_eval(node.value))
+    return names
+
+
+def cache_policy(config: Mapping) -> Dict[str, Any]:
+    """
+    Work out the intents and the cache settings of the bot from the config.
+
+    Parameters
+    ----------
+    config : Mapping
+        The config.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The keyword arguments of the bot: `intents`, `member_cache_flags`,
+        `max_messages` and `chunk_guilds_at_startup`.
+    """
+    if config.get("intents", "all") != "minimal":
+        return {
+            "intents": discord.Intents.all(),
+            "max_messages": config.get("max_messages", 1000),
+        }
+    intents = discord.Intents.none()
+    for name in set(BASE_INTENTS) | declared_intents():
+        setattr(intents, name, True)
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.from_intents(intents),
+        "max_messages": config.get("max_messages"),
+        "chunk_guilds_at_startup": intents.members,
+    }
+
+
+def rss_bytes() -> int:
+    """
+    The resident memory of the process, from /proc when available, 0 when it can't
+    be measured, e.g. on Windows.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        # Only available on Unix.
+        import resource
+    except ImportError:
+        return 0
+    # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_report(bot: discord.Client) -> Dict[str, int]:
+    """
+    Measure the resident memory and the size of the caches of discord.py.
+
+    Parameters
+    ----------
+    bot : discord.Client
+        The bot.
+
+    Returns
+    -------
+    Dict[str, int]
+        The resident memory in bytes and the number of cached guilds, users,
+        members and messages.
+    """
+    return {
+        "rss_bytes": rss_bytes(),
+        "guilds": len(bot.guilds),
+        "users": len(bot.users),
+        "members": sum(len(guild.members) for guild in bot.guilds),
+        "messages": len(bot.cached_messages),
+    }
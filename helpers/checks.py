@@ -1,13 +1,13 @@
 """
 Modified from https://github.com/kkrypt0nn (https://krypton.ninja)
 """
-import json
 from typing import Callable, TypeVar
 
 from discord.ext import commands
 
 from exceptions import UserNotOwner, UserBlacklisted
 from helpers import db_manager
+from helpers.config import config_service
 
 T = TypeVar("T")
 
@@ -29,9 +29,7 @@ def is_owner() -> Callable[[T], T]:
     """
 
     async def predicate(context: commands.Context) -> bool:
-        with open("config.json") as file:
-            data = json.load(file)
-        if context.author.id not in data["owners"]:
+        if context.author.id not in config_service.get().owners:
             raise UserNotOwner
         return True
 
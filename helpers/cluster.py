@@ -0,0 +1,187 @@
+"""
+Running the bot as a cluster of worker processes, see launcher.py.
+
+The launcher starts every worker with the shards it should run and the address of
+a local IPC hub in its environment. The hub relays every message a worker publishes
+to all the other workers, which is how the blacklist and config changes made in one
+process reach the in-memory caches of the others.
+
+A message is one JSON object per line, the first line sent by a worker is the
+secret token the launcher gave it.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+# The environment of a worker, set by the launcher.
+CLUSTER_ID_ENV = "DISCORD_BOT_CLUSTER_ID"
+SHARD_COUNT_ENV = "DISCORD_BOT_SHARD_COUNT"
+SHARD_IDS_ENV = "DISCORD_BOT_SHARD_IDS"
+IPC_ADDRESS_ENV = "DISCORD_BOT_IPC_ADDRESS"
+IPC_TOKEN_ENV = "DISCORD_BOT_IPC_TOKEN"
+
+logger = logging.getLogger("discord_bot.cluster")
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def worker_settings() -> Optional[Dict]:
+    """
+    Get the settings the launcher gave to this process.
+
+    Returns
+    -------
+    Optional[Dict]
+        The `cluster_id`, `shard_count` and `shard_ids` of the worker, None if the
+        bot wasn't started by the launcher.
+    """
+    if CLUSTER_ID_ENV not in os.environ:
+        return None
+    return {
+        "cluster_id": int(os.environ[CLUSTER_ID_ENV]),
+        "shard_count": int(os.environ[SHARD_COUNT_ENV]),
+        "shard_ids": [int(shard) for shard in os.environ[SHARD_IDS_ENV].split(",")],
+    }
+
+
+class IpcHub:
+    """
+    The side of the launcher: accepts the workers and relays their messages.
+    """
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+        self.server: Optional[asyncio.Server] = None
+        self._workers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.server = await asyncio.start_server(self._serve, host, port)
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self._workers):
+            writer.close()
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            token = (await reader.readline()).decode().strip()
+            if not hmac.compare_digest(token, self.token):
+                return
+            self._workers.add(writer)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for worker in list(self._workers):
+                    if worker is not writer:
+                        worker.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # The launcher is stopping, the connection just ends.
+            pass
+        finally:
+            self._workers.discard(writer)
+            writer.close()
+
+
+class IpcClient:
+    """
+    The side of a worker: publishes messages to the other workers and hands the
+    ones it receives to the handler of their `type`. The connection is opened again
+    if the launcher restarts its hub.
+    """
+
+    def __init__(self, address: str, token: str) -> None:
+        self.host, _, port = address.rpartition(":")
+        self.port = int(port)
+        self.token = token
+        self.handlers: Dict[str, Handler] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_environment(cls) -> Optional["IpcClient"]:
+        """
+        Create the client of the hub the launcher gave to this process, if any.
+        """
+        if IPC_ADDRESS_ENV not in os.environ:
+            return None
+        return cls(os.environ[IPC_ADDRESS_ENV], os.environ[IPC_TOKEN_ENV])
+
+    def on(self, message_type: str, handler: Handler) -> None:
+        self.handlers[message_type] = handler
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def publish(self, message: dict) -> None:
+        """
+        Send a message to every other worker. Messages published while the hub is
+        unreachable are dropped, the other workers then only catch up when they see
+        the config file change or when their blacklist is refreshed.
+
+        Parameters
+        ----------
+        message : dict
+            The message, with at least a `type`.
+        """
+        if self._writer is None:
+            logger.warning("Not connected to the cluster, dropped %s", message)
+            return
+        try:
+            self._writer.write(json.dumps(message).encode() + b"\n")
+            await self._writer.drain()
+        except ConnectionError as e:
+            logger.warning("Could not publish %s: %s", message, e)
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(self.token.encode() + b"\n")
+                await writer.drain()
+                self._writer = writer
+                delay = 1.0
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await self._handle(line)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                logger.warning("Lost the connection to the cluster: %s", e)
+            self._writer = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _handle(self, line: bytes) -> None:
+        try:
+            message = json.loads(line)
+            handler = self.handlers.get(message.get("type"))
+        except (ValueError, AttributeError):
+            logger.warning("Ignored an invalid cluster message: %r", line)
+            return
+        if handler is None:
+            return
+        try:
+            await handler(message)
+        except Exception:
+            logger.exception("Failed to handle the cluster message %s", message)
@@ -0,0 +1,221 @@
+"""
+Syncing the slash commands only when they changed.
+
+Syncing uploads every command of a scope, the global one or a guild, and Discord
+only allows a few syncs per minute. The payload of every command is hashed instead,
+the same payload `CommandTree.sync` would upload, and the hashes of the last sync of
+each scope are kept in a JSON file:
+
+    {"global": {"digest": "...", "commands": {"ping": "...", ...}}, "<guild id>": ...}
+
+A scope is only synced when its digest differs from the stored one, and comparing
+the hashes of its commands tells which ones were added, changed or removed. A guild
+that had commands and has none anymore is synced too, to remove them from Discord.
+A state file that can't be read is ignored, every scope is then synced again.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+import discord
+from discord import app_commands
+
+STATE_PATH = "database/command_sync.json"
+
+GLOBAL_SCOPE = "global"
+
+logger = logging.getLogger("discord_bot.command_sync")
+
+
+def _digest(data) -> str:
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _command_key(payload: dict) -> str:
+    # A slash command and a context menu can share a name.
+    if payload.get("type", 1) == discord.AppCommandType.chat_input.value:
+        return payload["name"]
+    return f"{payload['name']} ({discord.AppCommandType(payload['type']).name})"
+
+
+class ScopeDiff:
+    """
+    The difference between the commands of a scope and its last sync.
+    """
+
+    __slots__ = (
+        "scope",
+        "digest",
+        "previous_digest",
+        "commands",
+        "added",
+        "changed",
+        "removed",
+    )
+
+    def __init__(self, scope: str, commands: Dict[str, str], previous: dict) -> None:
+        self.scope = scope
+        self.commands = commands
+        self.digest = _digest(sorted(commands.items()))
+        self.previous_digest = previous.get("digest")
+        previous_commands = previous.get("commands", {})
+        self.added = sorted(set(commands) - set(previous_commands))
+        self.removed = sorted(set(previous_commands) - set(commands))
+        self.changed = sorted(
+            name
+            for name, digest in commands.items()
+            if name in previous_commands and previous_commands[name] != digest
+        )
+
+    @property
+    def guild(self) -> Optional[discord.Object]:
+        return None if self.scope == GLOBAL_SCOPE else discord.Object(int(self.scope))
+
+    @property
+    def outdated(self) -> bool:
+        return self.digest != self.previous_digest
+
+
+class CommandSync:
+    """
+    Syncs the scopes of a command tree whose commands changed since their last sync.
+    """
+
+    def __init__(
+        self,
+        tree: app_commands.CommandTree,
+        path: str = STATE_PATH,
+        guild_ids: Callable[[], Iterable[int]] = tuple,
+    ) -> None:
+        self.tree = tree
+        self.path = path
+        # The guilds that may have commands, besides the ones synced before.
+        self.guild_ids = guild_ids
+
+    def load_state(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring the unreadable '%s': %s", self.path, e)
+            return {}
+        if not isinstance(state, dict) or not all(
+            scope == GLOBAL_SCOPE or scope.isdigit() for scope in state
+        ):
+            logger.warning("Ignoring the invalid '%s'", self.path)
+            return {}
+        return state
+
+    def save_state(self, state: Dict[str, dict]) -> None:
+        # Written in one go, so that a crash can't leave a truncated file.
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(state, file, indent=2, sort_keys=True)
+            file.write("\n")
+        os.replace(temporary_path, self.path)
+
+    def scopes(self, state: Dict[str, dict]) -> List[str]:
+        synced = {int(scope) for scope in state if scope != GLOBAL_SCOPE}
+        guild_ids = synced | {
+            guild_id
+            for guild_id in self.guild_ids()
+            if self.tree.get_commands(guild=discord.Object(guild_id))
+        }
+        return [GLOBAL_SCOPE] + [str(guild_id) for guild_id in sorted(guild_ids)]
+
+    async def command_digests(self, scope: str) -> Dict[str, str]:
+        """
+        Hash the payload of every command of a scope.
+
+        Parameters
+        ----------
+        scope : str
+            `global` or the ID of a guild.
+
+        Returns
+        -------
+        Dict[str, str]
+            The hash of each command, by name.
+        """
+        guild = None if scope == GLOBAL_SCOPE else discord.Object(int(scope))
+        translator = self.tree.translator
+        digests = {}
+        for command in self.tree.get_commands(guild=guild):
+            if translator:
+                payload = await command.get_translated_payload(self.tree, translator)
+            else:
+                payload = command.to_dict(self.tree)
+            digests[_command_key(payload)] = _digest(payload)
+        return digests
+
+    async def diff(self) -> List[ScopeDiff]:
+        """
+        Compare every scope to its last sync.
+
+        Returns
+        -------
+        List[ScopeDiff]
+            The difference of each scope, the global one first.
+        """
+        return await self._diff(self.load_state())
+
+    async def _diff(self, state: Dict[str, dict]) -> List[ScopeDiff]:
+        return [
+            ScopeDiff(scope, await self.command_digests(scope), state.get(scope, {}))
+            for scope in self.scopes(state)
+        ]
+
+    async def sync(self, force: bool = False) -> List[ScopeDiff]:
+        """
+        Sync the scopes whose commands changed, and store their new hashes.
+
+        Parameters
+        ----------
+        force : bool
+            Sync every scope, even if its commands didn't change, e.g. when they were
+            synced from somewhere else.
+
+        Returns
+        -------
+        List[ScopeDiff]
+            The difference of each synced scope.
+
+        Raises
+        ------
+        discord.HTTPException
+            Syncing a scope failed, the scopes synced before it are stored.
+        """
+        state = self.load_state()
+        synced = []
+        try:
+            for diff in await self._diff(state):
+                if not (force or diff.outdated):
+                    continue
+                await self.tree.sync(guild=diff.guild)
+                synced.append(diff)
+                state[diff.scope] = {"digest": diff.digest, "commands": diff.commands}
+        finally:
+            if synced:
+                self.save_state(state)
+        return synced
+
+
+def describe(diff: ScopeDiff) -> str:
+    """
+    Summarize what the sync of a scope changed, for the sync command and the logs.
+    """
+    parts = [
+        f"{label}: {', '.join(names)}"
+        for label, names in (
+            ("added", diff.added),
+            ("changed", diff.changed),
+            ("removed", diff.removed),
+        )
+        if names
+    ]
+    return "; ".join(parts) or "nothing changed"
@@ -0,0 +1,134 @@
+"""
+Cached, hot-reloadable access to the config.json file.
+"""
+import json
+import logging
+import os
+import time
+from types import MappingProxyType
+from typing import Any, FrozenSet, Iterator, Mapping, Optional
+
+from exceptions import ConfigError
+
+CONFIG_PATH = "config.json"
+
+logger = logging.getLogger(__name__)
+
+
+class Config(Mapping):
+    """
+    A read-only view of a parsed config file. It behaves like the dictionary that
+    used to be loaded from the file, with the owners also available as a frozenset
+    so that owner checks are a single membership test.
+    """
+
+    def __init__(
+        self, data: dict, owners: FrozenSet[int] = frozenset(), mtime: float = 0.0
+    ) -> None:
+        self._data = MappingProxyType(dict(data))
+        self.owners = owners
+        self.mtime = mtime
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"<Config keys={sorted(k for k in self._data if k != 'token')}>"
+
+
+class ConfigService:
+    """
+    Keeps the parsed config in memory and only reads the file again when its
+    modification time changed, which is checked at most once every
+    `check_interval` seconds.
+
+    A file that can't be read or parsed while the bot is running is reported and
+    ignored, the previous config stays in use.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH, check_interval: float = 5.0) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._config: Optional[Config] = None
+        self._next_check = 0.0
+        self._failed_mtime: Optional[float] = None
+
+    def _read(self) -> Config:
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path) as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            raise ConfigError(f"'{self.path}' not found! Please add it and try again.")
+        except (OSError, ValueError) as e:
+            raise ConfigError(f"Could not load '{self.path}': {e}")
+        if not isinstance(data, dict):
+            raise ConfigError(f"'{self.path}' must contain a JSON object.")
+        owners = data.get("owners", [])
+        try:
+            if not isinstance(owners, list) or any(
+                isinstance(owner, (bool, float)) for owner in owners
+            ):
+                raise TypeError
+            owners = frozenset(int(owner) for owner in owners)
+        except (TypeError, ValueError):
+            raise ConfigError(f"'owners' in '{self.path}' must be a list of user IDs.")
+        return Config(data, owners, mtime)
+
+    def load(self) -> Config:
+        """
+        Read the config file, raising if it is missing or invalid.
+
+        Returns
+        -------
+        Config
+            The freshly loaded config.
+
+        Raises
+        ------
+        ConfigError
+            Raised if the file can't be read or parsed.
+        """
+        self._config = self._read()
+        self._next_check = time.monotonic() + self.check_interval
+        return self._config
+
+    def reload(self) -> Config:
+        """
+        Same as `load`, kept separate so that forced reloads read as such.
+        """
+        return self.load()
+
+    def get(self) -> Config:
+        """
+        Get the current config, reloading it first if the file has changed.
+
+        Returns
+        -------
+        Config
+            The current config.
+        """
+        if self._config is None:
+            return self.load()
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._config
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime not in (self._config.mtime, self._failed_mtime):
+                self._failed_mtime = mtime
+                self._config = self._read()
+                self._failed_mtime = None
+        except (OSError, ConfigError) as e:
+            logger.error("Keeping the previous config: %s", e)
+        return self._config
+
+
+config_service = ConfigService()
@@ -1,11 +1,129 @@
 """
 Modified from https://github.com/kkrypt0nn (https://krypton.ninja)
 """
+import sqlite3
+from typing import AsyncIterator, Iterable, List, Optional
+
 import aiosqlite
 
+from helpers.blacklist_cache import BlacklistCache
+from helpers.db_pool import ConnectionPool
+from helpers.metrics import track_database
+from helpers.write_queue import WriteQueue
+
 DATABASE = "database/database.db"
 
+_pool: Optional[ConnectionPool] = None
+_writes: Optional[WriteQueue] = None
+
+blacklist_cache = BlacklistCache()
+
+
+async def connect(
+    path: str = DATABASE,
+    readers: int = 4,
+    durability: str = "normal",
+    commit_window: float = 0.005,
+    busy_timeout: float = 5.0,
+) -> None:
+    """
+    This function will open the shared connection pool used by every other function
+    of this module, start the queue grouping the writes into shared transactions and
+    load the blacklist in memory. It should be called once when the bot starts.
+
+    Parameters
+    ----------
+    path : str
+        The path of the SQLite database file.
+    readers : int
+        The number of read-only connections to keep open.
+    durability : str
+        The durability mode of the database, `full`, `normal` or `fast`.
+    commit_window : float
+        How long, in seconds, writes are collected before being committed together.
+    busy_timeout : float
+        How long, in seconds, to wait for another process holding a lock on the
+        database.
+
+    Returns
+    -------
+    None
+    """
+    global _pool, _writes
+    if _pool is not None:
+        return
+    pool = ConnectionPool(
+        path, readers=readers, durability=durability, busy_timeout=busy_timeout
+    )
+    await pool.open()
+    _pool = pool
+    _writes = WriteQueue(pool, window=commit_window)
+    _writes.start()
+    await refresh_blacklist()
+
 
+async def close() -> None:
+    """
+    This function will close the shared connection pool. It should be called once
+    when the bot shuts down.
+
+    Returns
+    -------
+    None
+    """
+    global _pool, _writes
+    if _pool is None:
+        return
+    if _writes is not None:
+        await _writes.stop()
+        _writes = None
+    pool, _pool = _pool, None
+    blacklist_cache.clear()
+    await pool.close()
+
+
+def _get_pool() -> ConnectionPool:
+    if _pool is None:
+        raise RuntimeError(
+            "The database is not connected, call db_manager.connect() first."
+        )
+    return _pool
+
+
+def _get_writes() -> WriteQueue:
+    if _writes is None:
+        raise RuntimeError(
+            "The database is not connected, call db_manager.connect() first."
+        )
+    return _writes
+
+
+async def _count(db: aiosqlite.Connection, query: str, parameters=()) -> int:
+    async with db.execute(query, parameters) as cursor:
+        result = await cursor.fetchone()
+        return result[0] if result is not None else 0
+
+
+@track_database
+async def refresh_blacklist() -> int:
+    """
+    This function will reload the in-memory blacklist from the database. It only
+    needs to be called by hand when the database has been edited from outside of
+    the bot.
+
+    Returns
+    -------
+    int
+        The number of blacklisted users.
+    """
+    async with _get_pool().reader() as db:
+        async with db.execute("SELECT user_id FROM blacklist") as cursor:
+            rows = await cursor.fetchall()
+    blacklist_cache.replace(row[0] for row in rows)
+    return len(blacklist_cache)
+
+
+@track_database
 async def is_blacklisted(user_id: int) -> bool:
     """
     This function will check if a user is blacklisted.
@@ -20,7 +138,10 @@ async def is_blacklisted(user_id: int) -> bool:
     bool
         True if the user is blacklisted, False if not.
     """
-    async with aiosqlite.connect(DATABASE) as db:
+    cached = blacklist_cache.lookup(user_id)
+    if cached is not None:
+        return cached
+    async with _get_pool().reader() as db:
         async with db.execute(
             "SELECT * FROM blacklist WHERE user_id=?", (user_id,)
         ) as cursor:
@@ -28,6 +149,7 @@ async def is_blacklisted(user_id: int) -> bool:
             return result is not None
 
 
+@track_database
 async def add_user_to_blacklist(user_id: int) -> int:
     """
     This function will add a user based on its ID in the blacklist.
@@ -42,15 +164,17 @@ async def add_user_to_blacklist(user_id: int) -> int:
     int
         Row count of the number of blacklisted users
     """
-    async with aiosqlite.connect(DATABASE) as db:
+
+    async def operation(db: aiosqlite.Connection) -> int:
         await db.execute("INSERT INTO blacklist(user_id) VALUES (?)", (user_id,))
-        await db.commit()
-        rows = await db.execute("SELECT COUNT(*) FROM blacklist")
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+        return await _count(db, "SELECT COUNT(*) FROM blacklist")
+
+    total = await _get_writes().submit(operation)
+    blacklist_cache.add(user_id)
+    return total
 
 
+@track_database
 async def remove_user_from_blacklist(user_id: int) -> int:
     """
     This function will remove a user based on its ID from the blacklist.
@@ -65,15 +189,151 @@ async def remove_user_from_blacklist(user_id: int) -> int:
     int
         Row count of the number of blacklisted users.
     """
-    async with aiosqlite.connect(DATABASE) as db:
+
+    async def operation(db: aiosqlite.Connection) -> int:
         await db.execute("DELETE FROM blacklist WHERE user_id=?", (user_id,))
-        await db.commit()
-        rows = await db.execute("SELECT COUNT(*) FROM blacklist")
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+        return await _count(db, "SELECT COUNT(*) FROM blacklist")
+
+    total = await _get_writes().submit(operation)
+    blacklist_cache.discard(user_id)
+    return total
 
 
+@track_database
+async def add_users_to_blacklist(user_ids: Iterable[int]) -> int:
+    """
+    This function will add many users to the blacklist in a single transaction,
+    skipping the ones already in it. Big imports should be split into chunks, so
+    that the other writes don't wait for the whole import.
+
+    Parameters
+    ----------
+    user_ids : Iterable[int]
+        The IDs of the users that should be added into the blacklist.
+
+    Returns
+    -------
+    int
+        The number of users that were not in the blacklist yet.
+    """
+    user_ids = [int(user_id) for user_id in user_ids]
+
+    async def operation(db: aiosqlite.Connection) -> int:
+        changes = db.total_changes
+        await db.executemany(
+            "INSERT OR IGNORE INTO blacklist(user_id) VALUES (?)",
+            ((user_id,) for user_id in user_ids),
+        )
+        return db.total_changes - changes
+
+    added = await _get_writes().submit(operation)
+    for user_id in user_ids:
+        blacklist_cache.add(user_id)
+    return added
+
+
+@track_database
+async def get_blacklist_page(after_id: int = 0, limit: int = 1000) -> list:
+    """
+    This function will get one page of the blacklist, ordered by user ID.
+
+    Parameters
+    ----------
+    after_id : int
+        Only get the users with a greater ID, the last ID of the previous page.
+    limit : int
+        The maximum number of users of the page.
+
+    Returns
+    -------
+    list
+        The ID of each user and when they were blacklisted, as a Unix timestamp.
+    """
+    async with _get_pool().reader() as db:
+        async with db.execute(
+            "SELECT user_id, CAST(strftime('%s', created_at) AS INTEGER) "
+            "FROM blacklist WHERE user_id>? ORDER BY user_id LIMIT ?",
+            (after_id, limit),
+        ) as cursor:
+            return await cursor.fetchall()
+
+
+async def iter_blacklist(page_size: int = 1000) -> AsyncIterator[tuple]:
+    """
+    This function will go through the whole blacklist, only keeping one page of it
+    in memory at a time.
+
+    Parameters
+    ----------
+    page_size : int
+        The number of users fetched from the database at once.
+
+    Yields
+    ------
+    tuple
+        The ID of each user and when they were blacklisted.
+    """
+    after_id = 0
+    while True:
+        page = await get_blacklist_page(after_id, limit=page_size)
+        for user in page:
+            yield user
+        if len(page) < page_size:
+            return
+        after_id = page[-1][0]
+
+
+# The next warning ID is allocated inside the INSERT itself, so the lookup of the
+# last ID and the write happen atomically in a single statement. RETURNING needs
+# SQLite 3.35 or newer, older versions look the ID up first.
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_INSERT_WARN = (
+    "INSERT INTO warns(server_id, user_id, id, moderator_id, reason) "
+    "SELECT ?, ?, COALESCE(MAX(id), 0) + 1, ?, ? FROM warns "
+    "WHERE server_id=? AND user_id=? RETURNING id"
+)
+
+_NEXT_WARN_ID = (
+    "SELECT COALESCE(MAX(id), 0) + 1 FROM warns WHERE server_id=? AND user_id=?"
+)
+
+
+async def _insert_warn(
+    db: aiosqlite.Connection,
+    user_id: int,
+    server_id: int,
+    moderator_id: int,
+    reason: str,
+) -> int:
+    if not _HAS_RETURNING:
+        # The writes run in the transaction of the write queue, which holds the
+        # write lock of the database, so no other warning can take the ID between
+        # the two statements.
+        async with db.execute(_NEXT_WARN_ID, (server_id, user_id)) as cursor:
+            (warn_id,) = await cursor.fetchone()
+        await db.execute(
+            "INSERT INTO warns(server_id, user_id, id, moderator_id, reason) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (server_id, user_id, warn_id, moderator_id, reason),
+        )
+        return warn_id
+    async with db.execute(
+        _INSERT_WARN,
+        (
+            server_id,
+            user_id,
+            moderator_id,
+            reason,
+            server_id,
+            user_id,
+        ),
+    ) as cursor:
+        result = await cursor.fetchone()
+        return result[0]
+
+
+@track_database
 async def add_warn(user_id: int, server_id: int, moderator_id: int, reason: str) -> int:
     """
     This function will add a warning to the database.
@@ -94,33 +354,48 @@ async def add_warn(user_id: int, server_id: int, moderator_id: int, reason: str)
     warn_id : int
         The ID of the warning.
     """
-    async with aiosqlite.connect(DATABASE) as db:
-        rows = await db.execute(
-            "SELECT id FROM warns WHERE user_id=? AND server_id=? ORDER BY id DESC "
-            "LIMIT 1",
-            (
-                user_id,
-                server_id,
-            ),
-        )
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            warn_id = result[0] + 1 if result is not None else 1
-            await db.execute(
-                "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (
-                    warn_id,
-                    user_id,
-                    server_id,
-                    moderator_id,
-                    reason,
-                ),
-            )
-            await db.commit()
-            return warn_id
 
+    async def operation(db: aiosqlite.Connection) -> int:
+        return await _insert_warn(db, user_id, server_id, moderator_id, reason)
+
+    return await _get_writes().submit(operation)
+
+
+@track_database
+async def add_warns(
+    user_ids: List[int], server_id: int, moderator_id: int, reason: str
+) -> List[int]:
+    """
+    This function will warn many users at once, in a single transaction. It is meant
+    for cleaning up after a raid.
+
+    Parameters
+    ----------
+    user_ids : List[int]
+        The IDs of the users that should be warned.
+    server_id : int
+        The ID of the server.
+    moderator_id : int
+        The ID of the moderator assessing the warnings.
+    reason : str
+        The reason why the users should be warned.
+
+    Returns
+    -------
+    List[int]
+        The ID of the warning of each user, in the same order as `user_ids`.
+    """
+
+    async def operation(db: aiosqlite.Connection) -> List[int]:
+        return [
+            await _insert_warn(db, user_id, server_id, moderator_id, reason)
+            for user_id in user_ids
+        ]
+
+    return await _get_writes().submit(operation)
 
+
+@track_database
 async def remove_warn(warn_id: int, user_id: int, server_id: int) -> int:
     """
     This function will remove a warning from the database.
@@ -139,7 +414,8 @@ async def remove_warn(warn_id: int, user_id: int, server_id: int) -> int:
     int
         Row count of the number of warnings.
     """
-    async with aiosqlite.connect(DATABASE) as db:
+
+    async def operation(db: aiosqlite.Connection) -> int:
         await db.execute(
             "DELETE FROM warns WHERE id=? AND user_id=? AND server_id=?",
             (
@@ -148,22 +424,30 @@ async def remove_warn(warn_id: int, user_id: int, server_id: int) -> int:
                 server_id,
             ),
         )
-        await db.commit()
-        rows = await db.execute(
+        return await _count(
+            db,
             "SELECT COUNT(*) FROM warns WHERE user_id=? AND server_id=?",
             (
                 user_id,
                 server_id,
             ),
         )
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
 
+    return await _get_writes().submit(operation)
 
+
+_WARNING_COLUMNS = (
+    "SELECT user_id, server_id, moderator_id, reason, strftime('%s', created_at), id "
+    "FROM warns"
+)
+
+
+@track_database
 async def get_warnings(user_id: int, server_id: int) -> list:
     """
-    This function will get all the warnings of a user.
+    This function will get all the warnings of a user. For users with a long history,
+    prefer `get_warnings_page` or `iter_warnings`, which don't load every warning in
+    memory at once.
 
     Parameters
     ----------
@@ -177,18 +461,130 @@ async def get_warnings(user_id: int, server_id: int) -> list:
     list
         A list of all the warnings of the user.
     """
-    async with aiosqlite.connect(DATABASE) as db:
-        rows = await db.execute(
-            "SELECT user_id, server_id, moderator_id, reason, strftime('%s', "
-            "created_at), id FROM warns WHERE user_id=? AND server_id=?",
+    async with _get_pool().reader() as db:
+        async with db.execute(
+            f"{_WARNING_COLUMNS} WHERE server_id=? AND user_id=? ORDER BY id",
             (
-                user_id,
                 server_id,
+                user_id,
             ),
+        ) as cursor:
+            return await cursor.fetchall()
+
+
+@track_database
+async def get_warnings_page(
+    user_id: int,
+    server_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = 10,
+) -> list:
+    """
+    This function will get one page of the warnings of a user, newest first. Pages
+    are found from the warning IDs (keyset pagination), so any page costs the same
+    index seek no matter how deep into the history it is.
+
+    Parameters
+    ----------
+    user_id : int
+        The ID of the user that should be checked.
+    server_id : int
+        The ID of the server that should be checked.
+    before_id : Optional[int]
+        Only get the warnings older than this warning ID, to get the next page.
+    after_id : Optional[int]
+        Only get the warnings newer than this warning ID, to get the previous page.
+    limit : int
+        The maximum number of warnings of the page.
+
+    Returns
+    -------
+    list
+        The warnings of the page, newest first.
+    """
+    if after_id is not None:
+        query = (
+            f"{_WARNING_COLUMNS} WHERE server_id=? AND user_id=? AND id>? "
+            "ORDER BY id ASC LIMIT ?"
+        )
+        parameters = (server_id, user_id, after_id, limit)
+    elif before_id is not None:
+        query = (
+            f"{_WARNING_COLUMNS} WHERE server_id=? AND user_id=? AND id<? "
+            "ORDER BY id DESC LIMIT ?"
+        )
+        parameters = (server_id, user_id, before_id, limit)
+    else:
+        query = (
+            f"{_WARNING_COLUMNS} WHERE server_id=? AND user_id=? "
+            "ORDER BY id DESC LIMIT ?"
         )
-        async with rows as cursor:
+        parameters = (server_id, user_id, limit)
+    async with _get_pool().reader() as db:
+        async with db.execute(query, parameters) as cursor:
             result = await cursor.fetchall()
-            result_list = []
-            for row in result:
-                result_list.append(row)
-            return result_list
+    if after_id is not None:
+        result.reverse()
+    return result
+
+
+async def iter_warnings(
+    user_id: int, server_id: int, page_size: int = 100
+) -> AsyncIterator[tuple]:
+    """
+    This function will go through all the warnings of a user, newest first, only
+    keeping one page of them in memory at a time.
+
+    Parameters
+    ----------
+    user_id : int
+        The ID of the user that should be checked.
+    server_id : int
+        The ID of the server that should be checked.
+    page_size : int
+        The number of warnings fetched from the database at once.
+
+    Yields
+    ------
+    tuple
+        The warnings of the user.
+    """
+    before_id = None
+    while True:
+        page = await get_warnings_page(
+            user_id, server_id, before_id=before_id, limit=page_size
+        )
+        for warning in page:
+            yield warning
+        if len(page) < page_size:
+            return
+        before_id = page[-1][5]
+
+
+@track_database
+async def count_warnings(user_id: int, server_id: int) -> int:
+    """
+    This function will count the warnings of a user.
+
+    Parameters
+    ----------
+    user_id : int
+        The ID of the user that should be checked.
+    server_id : int
+        The ID of the server that should be checked.
+
+    Returns
+    -------
+    int
+        The number of warnings of the user.
+    """
+    async with _get_pool().reader() as db:
+        return await _count(
+            db,
+            "SELECT COUNT(*) FROM warns WHERE server_id=? AND user_id=?",
+            (
+                server_id,
+                user_id,
+            ),
+        )
@@ -0,0 +1,133 @@
+"""
+Long-lived SQLite connection pool used by the database helpers.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+# The durability modes map to a journal mode and a synchronous level:
+# - full: the SQLite defaults, every commit is fsynced before it returns.
+# - normal: write-ahead log with fewer fsyncs, a commit can only be lost on power loss.
+# - fast: write-ahead log without any fsync, only for throwaway databases.
+DURABILITY_MODES: Dict[str, Tuple[str, str]] = {
+    "full": ("DELETE", "FULL"),
+    "normal": ("WAL", "NORMAL"),
+    "fast": ("WAL", "OFF"),
+}
+
+
+class ConnectionPool:
+    """
+    A pool of long-lived aiosqlite connections: one writer and a fixed number of
+    readers.
+
+    Every aiosqlite connection owns a worker thread, so keeping the connections open
+    for the lifetime of the bot avoids spawning a thread and re-opening the database
+    file for every query. Each connection also keeps its own prepared statement
+    cache, so the queries the bot runs are only compiled once per connection.
+
+    SQLite only allows a single writer at a time, which is why writes are serialized
+    through one connection guarded by a lock, while reads are spread over the reader
+    connections.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        readers: int = 4,
+        statement_cache: int = 128,
+        durability: str = "normal",
+        busy_timeout: float = 5.0,
+    ) -> None:
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown durability mode '{durability}', expected one of "
+                f"{', '.join(DURABILITY_MODES)}."
+            )
+        self.path = path
+        self.size = max(1, readers)
+        self.statement_cache = statement_cache
+        self.durability = durability
+        self.busy_timeout = busy_timeout
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._connections: List[aiosqlite.Connection] = []
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the pool currently holds no open connections.
+        """
+        return not self._connections
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(
+            self.path,
+            cached_statements=self.statement_cache,
+            timeout=self.busy_timeout,
+        )
+        journal_mode, synchronous = DURABILITY_MODES[self.durability]
+        if not read_only:
+            # The journal mode is stored in the database file, so the writer sets it
+            # for every connection.
+            await db.execute(f"PRAGMA journal_mode = {journal_mode}")
+        await db.execute(f"PRAGMA synchronous = {synchronous}")
+        if read_only:
+            await db.execute("PRAGMA query_only = ON")
+        self._connections.append(db)
+        return db
+
+    async def open(self) -> None:
+        """
+        Open the writer and the reader connections.
+        """
+        if not self.closed:
+            return
+        try:
+            self._writer = await self._connect()
+            for _ in range(self.size):
+                self._readers.put_nowait(await self._connect(read_only=True))
+        except Exception:
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        """
+        Close every connection of the pool.
+        """
+        connections, self._connections = self._connections, []
+        self._writer = None
+        self._readers = asyncio.Queue()
+        for db in connections:
+            await db.close()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Borrow a read-only connection, waiting for one to be free if needed.
+        """
+        if self.closed:
+            raise RuntimeError("The connection pool is not open.")
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Borrow the writer connection. Any open transaction is rolled back if the
+        block raises, so a failed write never leaks into the next one.
+        """
+        if self.closed:
+            raise RuntimeError("The connection pool is not open.")
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
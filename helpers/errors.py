@@ -0,0 +1,209 @@
+"""
+Responses to the errors of the commands.
+
+The routine errors, like cooldowns or missing permissions, are mapped to a response
+template in a registry, looked up by exception type. Their embed is prebuilt when the
+text doesn't depend on the error, and the same error is only answered once per user
+and per channel within a short window, so that someone spamming a command on cooldown
+doesn't make the bot spam back.
+
+Any other error is unexpected: it is counted by fingerprint, the exception type and
+the line it was raised from, and only logged with its traceback the 1st, 2nd, 4th,
+8th... time it is seen. Only the most recently seen fingerprints are counted, one
+seen again after being evicted starts over and is logged again.
+"""
+import logging
+import time
+import traceback
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple, Type, Union
+
+import discord
+from discord.ext.commands import Context
+
+logger = logging.getLogger("discord_bot.errors")
+
+
+class ErrorResponse:
+    """
+    The template of the embed sent for one type of error.
+    """
+
+    __slots__ = ("title", "description", "embed")
+
+    def __init__(
+        self, title: str, description: Union[str, Callable[[Exception], str]]
+    ) -> None:
+        self.title = title
+        self.description = description
+        self.embed: Optional[discord.Embed] = None
+        if isinstance(description, str):
+            self.embed = discord.Embed(
+                title=title, description=description, color=0xE02B2B
+            )
+
+    def render(self, error: Exception) -> discord.Embed:
+        if self.embed is not None:
+            return self.embed
+        return discord.Embed(
+            title=self.title, description=self.description(error), color=0xE02B2B
+        )
+
+
+def fingerprint(error: Exception) -> str:
+    """
+    Identify an error by its type and the line it was raised from, so that the
+    same bug hit many times is counted as one.
+
+    Parameters
+    ----------
+    error : Exception
+        The error, the error wrapped by discord.py is used if there is one.
+
+    Returns
+    -------
+    str
+        The fingerprint, e.g. `KeyError@cogs/fun.py:42`.
+    """
+    error = getattr(error, "original", error)
+    frames = traceback.extract_tb(error.__traceback__)
+    if not frames:
+        return type(error).__name__
+    frame = frames[-1]
+    return f"{type(error).__name__}@{frame.filename}:{frame.lineno}"
+
+
+class ErrorResponses:
+    """
+    The registry of the error responses, with the deduplication of the replies and
+    the counts of the unexpected errors.
+    """
+
+    def __init__(
+        self,
+        window: float = 10.0,
+        max_recent: int = 10_000,
+        max_unexpected: int = 1_000,
+    ) -> None:
+        self.window = window
+        self.max_recent = max_recent
+        self.max_unexpected = max_unexpected
+        self.responses: Dict[Type[Exception], ErrorResponse] = {}
+        self._resolved: Dict[type, Optional[ErrorResponse]] = {}
+        self._recent: "OrderedDict[Tuple, float]" = OrderedDict()
+        self.coalesced = 0
+        # The count of each fingerprint, the least recently seen first.
+        self.unexpected: "OrderedDict[str, int]" = OrderedDict()
+
+    def register(
+        self,
+        error_type: Type[Exception],
+        title: str,
+        description: Union[str, Callable[[Exception], str]],
+    ) -> None:
+        """
+        Register the response to a type of error, and to its subclasses.
+
+        Parameters
+        ----------
+        error_type : Type[Exception]
+            The type of error.
+        title : str
+            The title of the embed.
+        description : Union[str, Callable[[Exception], str]]
+            The description of the embed, or a function building it from the error.
+        """
+        self.responses[error_type] = ErrorResponse(title, description)
+        self._resolved.clear()
+
+    def lookup(self, error: Exception) -> Optional[ErrorResponse]:
+        """
+        Find the response to an error, through the classes it inherits from.
+
+        Parameters
+        ----------
+        error : Exception
+            The error.
+
+        Returns
+        -------
+        Optional[ErrorResponse]
+            The response, None if the error is unexpected.
+        """
+        error_type = type(error)
+        if error_type not in self._resolved:
+            self._resolved[error_type] = next(
+                (
+                    self.responses[cls]
+                    for cls in error_type.__mro__
+                    if cls in self.responses
+                ),
+                None,
+            )
+        return self._resolved[error_type]
+
+    def should_reply(self, context: Context, error: Exception) -> bool:
+        """
+        Tell whether the same error has been answered to the same user or in the same
+        channel within the window, in which case the reply is skipped.
+
+        Parameters
+        ----------
+        context : Context
+            The context of the command that failed.
+        error : Exception
+            The error.
+
+        Returns
+        -------
+        bool
+            True if a reply should be sent.
+        """
+        now = time.monotonic()
+        while self._recent:
+            seen_at = next(iter(self._recent.values()))
+            if now - seen_at < self.window and len(self._recent) < self.max_recent:
+                break
+            self._recent.popitem(last=False)
+
+        command = context.command.qualified_name if context.command else None
+        keys = (
+            (type(error), command, "user", context.author.id),
+            (type(error), command, "channel", context.channel.id),
+        )
+        if any(key in self._recent for key in keys):
+            self.coalesced += 1
+            return False
+        for key in keys:
+            self._recent[key] = now
+        return True
+
+    def report(self, context: Context, error: Exception) -> None:
+        """
+        Count an unexpected error and log it if its count is a power of two.
+
+        Parameters
+        ----------
+        context : Context
+            The context of the command that failed.
+        error : Exception
+            The error.
+        """
+        key = fingerprint(error)
+        count = self.unexpected.pop(key, 0) + 1
+        self.unexpected[key] = count
+        if len(self.unexpected) > self.max_unexpected:
+            self.unexpected.popitem(last=False)
+        if count & (count - 1):
+            return
+        original = getattr(error, "original", error)
+        logger.error(
+            "Unexpected error in %s (%s, seen %d %s)",
+            context.command.qualified_name if context.command else "a command",
+            key,
+            count,
+            "time" if count == 1 else "times",
+            exc_info=(type(original), original, original.__traceback__),
+            extra={"fields": {"fingerprint": key, "count": count}},
+        )
+
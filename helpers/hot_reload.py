@@ -0,0 +1,260 @@
+"""
+Reloading the cogs whose source changed, without restarting the bot.
+
+The reloader keeps the modification time, the size and a hash of every Python file
+in the watched folders. When a file's content changed, the loaded extensions that
+import it, directly or through other helpers, are reloaded. A file that was only
+touched doesn't reload anything.
+
+The helpers imported by bot.py hold the state of the running bot, e.g. the database
+connections, the config or the metrics, and the bot keeps references to them. They
+are never reloaded, a change to one of them is reported as needing a restart. The
+other helpers, e.g. checks.py, are imported again before the extensions using them.
+
+A helper that fails to import keeps its previous module, and the extensions using
+it aren't reloaded. An extension that fails to reload is rolled back to its previous
+module by discord.py.
+"""
+import ast
+import hashlib
+import importlib
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from discord.ext import commands
+
+WATCHED_FOLDERS = ("cogs", "helpers")
+
+logger = logging.getLogger("discord_bot.hot_reload")
+
+
+def module_name(path: str) -> str:
+    return os.path.splitext(os.path.normpath(path))[0].replace(os.sep, ".")
+
+
+def imported_modules(path: str, known: Set[str]) -> Set[str]:
+    """
+    List the modules of the bot a file imports.
+
+    Parameters
+    ----------
+    path : str
+        The path of the Python file.
+    known : Set[str]
+        The names of the modules to look for, e.g. `helpers.checks`.
+
+    Returns
+    -------
+    Set[str]
+        The names of the known modules imported by the file.
+    """
+    with open(path) as file:
+        tree = ast.parse(file.read(), path)
+    imported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            imported.add(node.module)
+            # `from helpers import checks` imports the module helpers.checks.
+            imported.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return imported & known
+
+
+class ReloadResult:
+    """
+    The outcome of the reload of one module.
+    """
+
+    __slots__ = ("name", "seconds", "error")
+
+    def __init__(
+        self, name: str, seconds: float, error: Optional[BaseException] = None
+    ) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.error = error
+
+    def __str__(self) -> str:
+        if self.error is None:
+            return f"{self.name} in {self.seconds * 1000:.1f} ms"
+        return f"{self.name} failed: {self.error}"
+
+
+class HotReloader:
+    """
+    Watches the source of the cogs and the helpers and reloads what changed.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        folders: Tuple[str, ...] = WATCHED_FOLDERS,
+        entry_point: str = "bot.py",
+    ) -> None:
+        self.bot = bot
+        self.folders = folders
+        self.entry_point = entry_point
+        # The mtime in nanoseconds, the size and the hash of every watched file.
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+        self.scan()
+
+    def _watched_files(self) -> List[str]:
+        paths = []
+        for folder in self.folders:
+            for file_name in sorted(os.listdir(folder)):
+                if file_name.endswith(".py"):
+                    paths.append(os.path.join(folder, file_name))
+        return paths
+
+    def scan(self) -> Set[str]:
+        """
+        Look for the watched files whose content changed since the last scan.
+
+        Returns
+        -------
+        Set[str]
+            The names of the modules that changed, added or removed.
+        """
+        changed = set()
+        files = {}
+        for path in self._watched_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            previous = self._files.get(path)
+            if previous is not None and previous[:2] == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                files[path] = previous
+                continue
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            files[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            if previous is None or previous[2] != digest:
+                changed.add(module_name(path))
+        changed.update(module_name(path) for path in set(self._files) - set(files))
+        first_scan = not self._files
+        self._files = files
+        return set() if first_scan else changed
+
+    def dependencies(self) -> Dict[str, Set[str]]:
+        """
+        Map every watched module to all the watched modules it imports, directly or
+        not.
+        """
+        modules = {module_name(path): path for path in self._files}
+        known = set(modules)
+        direct = {}
+        for name, path in modules.items():
+            try:
+                direct[name] = imported_modules(path, known)
+            except SyntaxError:
+                # Reloading it will fail and report the error.
+                direct[name] = set()
+        closure = {}
+        for name in modules:
+            seen: Set[str] = set()
+            pending = list(direct[name])
+            while pending:
+                dependency = pending.pop()
+                if dependency not in seen:
+                    seen.add(dependency)
+                    pending.extend(direct.get(dependency, ()))
+            closure[name] = seen
+        return closure
+
+    def stateful_modules(self) -> Set[str]:
+        """
+        The watched modules imported by the entry point of the bot, never reloaded.
+        """
+        dependencies = self.dependencies()
+        imported = imported_modules(self.entry_point, set(dependencies))
+        for name in list(imported):
+            imported |= dependencies[name]
+        return imported
+
+    def _import_again(self, name: str) -> ReloadResult:
+        started_at = time.perf_counter()
+        previous = sys.modules.pop(name, None)
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            if previous is not None:
+                sys.modules[name] = previous
+                package, _, attribute = name.rpartition(".")
+                if package in sys.modules:
+                    setattr(sys.modules[package], attribute, previous)
+            return ReloadResult(name, time.perf_counter() - started_at, e)
+        return ReloadResult(name, time.perf_counter() - started_at)
+
+    async def check(self) -> Tuple[List[ReloadResult], List[str]]:
+        """
+        Reload the extensions whose source or dependencies changed since the last
+        check.
+
+        Returns
+        -------
+        Tuple[List[ReloadResult], List[str]]
+            The result of every reload, the helpers first, and the changed modules
+            that need a restart of the bot.
+        """
+        changed = self.scan()
+        if not changed:
+            return [], []
+        dependencies = self.dependencies()
+        stateful = self.stateful_modules()
+        restart_needed = sorted(changed & stateful)
+        helpers = {
+            name
+            for name in dependencies
+            if name not in stateful
+            and not name.startswith("cogs.")
+            and (name in changed or dependencies[name] & (changed - stateful))
+        }
+        results = []
+        failed: Set[str] = set()
+        # A helper depends on more modules than any of the helpers it imports, so
+        # they are imported again before it.
+        for name in sorted(helpers, key=lambda name: len(dependencies[name])):
+            if name not in sys.modules or dependencies[name] & failed:
+                continue
+            result = self._import_again(name)
+            results.append(result)
+            if result.error is not None:
+                failed.add(name)
+        for extension in sorted(self.bot.extensions):
+            affected = {extension} | dependencies.get(extension, set())
+            if not affected & ((changed | helpers) - stateful):
+                continue
+            if affected & failed:
+                continue
+            started_at = time.perf_counter()
+            error = None
+            try:
+                await self.bot.reload_extension(extension)
+            except commands.ExtensionError as e:
+                error = e
+            results.append(
+                ReloadResult(extension, time.perf_counter() - started_at, error)
+            )
+        for result in results:
+            if result.error is None:
+                logger.info("Reloaded %s", result)
+            else:
+                logger.error(
+                    "Could not reload %s, kept its previous module",
+                    result.name,
+                    exc_info=result.error,
+                )
+        if restart_needed:
+            logger.warning(
+                "Changed, but only picked up after a restart: %s",
+                ", ".join(restart_needed),
+            )
+        return results, restart_needed
@@ -0,0 +1,172 @@
+"""
+Lazy loading of the cogs.
+
+The cogs listed in the `lazy_cogs` entry of the config are not imported when the bot
+starts. A placeholder cog holding a stub of each of their commands, read from the
+manifest, is registered under the same name instead, so that the help command still
+lists them. The real cog is loaded the first time one of its commands is invoked,
+with the prefix or as a slash command, and the invocation then runs as usual.
+
+The components of a cog, e.g. the buttons of its games, outlive the messages of the
+bot and its restarts, so the placeholder also answers for them: a cog lists its
+dynamic items in a module-level `DYNAMIC_ITEMS` tuple and prefixes their custom IDs
+with its name, e.g. `fun:coinflip:...`. A click on one of them loads the cog, then
+is handed to the item of the cog matching the custom ID.
+
+The manifest has one entry per command, with its `name`, its `description` and the
+`cog` it belongs to, which is also the name of its module in the cogs folder. It is
+generated from the real cogs, and should be generated again when a command changes:
+
+    python -m helpers.lazy_cogs
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Type
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from discord.ext.commands import Context
+
+MANIFEST_PATH = "cogs/manifest.json"
+
+
+def read_manifest(path: str = MANIFEST_PATH) -> Dict[str, List[dict]]:
+    """
+    Read the command manifest.
+
+    Parameters
+    ----------
+    path : str
+        The path of the manifest.
+
+    Returns
+    -------
+    Dict[str, List[dict]]
+        The entries of the manifest grouped by cog.
+    """
+    with open(path) as file:
+        entries = json.load(file)
+    manifest: Dict[str, List[dict]] = {}
+    for entry in entries:
+        manifest.setdefault(entry["cog"], []).append(entry)
+    return manifest
+
+
+async def _stub(cog: "PlaceholderCog", context: Context) -> None:
+    # The bot swaps a stub for the real command before invoking it, this is only
+    # reached if the real cog doesn't have the command anymore.
+    raise commands.CommandNotFound(f'Command "{context.invoked_with}" is not found')
+
+
+# The template of each placeholder is set on its own subclass, this one never matches.
+class LazyComponent(discord.ui.DynamicItem[discord.ui.Item], template=r"(?!)"):
+    """
+    Catches the components of a lazy cog, see `PlaceholderCog.component`.
+    """
+
+    extension: str
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Item,
+        match: re.Match,
+    ) -> discord.ui.DynamicItem:
+        await interaction.client.load_lazy_cog(cls.extension)
+        for factory in getattr(sys.modules.get(cls.extension), "DYNAMIC_ITEMS", ()):
+            template = factory.__discord_ui_compiled_template__
+            factory_match = template.fullmatch(item.custom_id)
+            if factory_match is not None:
+                return await factory.from_custom_id(interaction, item, factory_match)
+        raise LookupError(f"No item of {cls.extension} matches {item.custom_id!r}")
+
+
+class PlaceholderCog(commands.Cog):
+    """
+    Stands in for a cog that hasn't been loaded yet, with a stub of each of its
+    commands.
+    """
+
+    def __init__(self, extension: str, entries: List[dict]) -> None:
+        self.__cog_name__ = extension
+        self.extension = f"cogs.{extension}"
+        self.__cog_commands__ = tuple(
+            commands.Command(
+                _stub, name=entry["name"], description=entry["description"]
+            )
+            for entry in entries
+        )
+        # Registered by the bot while the placeholder stands in for the cog.
+        self.component: Type[LazyComponent] = type(
+            f"LazyComponent_{extension}",
+            (LazyComponent,),
+            {"extension": self.extension},
+            template=re.escape(extension) + ":.+",
+        )
+
+
+class LazyCommandTree(app_commands.CommandTree):
+    """
+    A command tree loading the cog of a slash command that hasn't been loaded yet,
+    before the command is looked up.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type in (
+            discord.InteractionType.application_command,
+            discord.InteractionType.autocomplete,
+        ):
+            extension = self.client.lazy_commands.get(interaction.data.get("name"))
+            if extension is not None:
+                await self.client.load_lazy_cog(extension)
+        return True
+
+
+async def build_manifest(directory: str = "cogs") -> List[dict]:
+    """
+    Load every cog in a throwaway bot and list their commands.
+
+    Parameters
+    ----------
+    directory : str
+        The folder of the cogs.
+
+    Returns
+    -------
+    List[dict]
+        The entries of the manifest.
+    """
+    bot = commands.Bot(
+        command_prefix="!", intents=discord.Intents.none(), help_command=None
+    )
+    entries = []
+    for cog_file in sorted(os.listdir(directory)):
+        if not cog_file.endswith(".py"):
+            continue
+        extension = cog_file[:-3]
+        await bot.load_extension(f"{directory}.{extension}")
+        for cog in bot.cogs.values():
+            if cog.__module__ != f"{directory}.{extension}":
+                continue
+            for command in cog.get_commands():
+                entries.append(
+                    {
+                        "name": command.name,
+                        "description": command.description,
+                        "cog": extension,
+                    }
+                )
+    return entries
+
+
+if __name__ == "__main__":
+    manifest = asyncio.run(build_manifest())
+    with open(MANIFEST_PATH, "w") as file:
+        json.dump(manifest, file, indent=2)
+        file.write("\n")
+    print(f"Wrote {len(manifest)} commands to {MANIFEST_PATH}")
@@ -0,0 +1,135 @@
+"""
+Non-blocking logging for the bot.
+
+Records are put on a queue by the event loop and written by a background thread,
+so logging never waits on disk or console I/O. Everything goes to the console and to
+rotating JSON-lines files, and the per-command records can be sampled so that busy
+servers don't flood the log.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from typing import Mapping, Optional
+
+LOG_FILE = "logs/bot.jsonl"
+
+# The logger of the command records, they carry their data in a `fields` attribute.
+COMMAND_LOGGER = "discord_bot.commands"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, including its structured fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random fraction of the command records. The rate can be set for the
+    whole bot and overridden per guild, records that aren't about a command are
+    always kept.
+    """
+
+    def __init__(self, rate: float = 1.0, guild_rates: Optional[Mapping] = None):
+        super().__init__()
+        self.rate = rate
+        self.guild_rates = {
+            int(guild_id): guild_rate
+            for guild_id, guild_rate in (guild_rates or {}).items()
+        }
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name != COMMAND_LOGGER:
+            return True
+        fields = getattr(record, "fields", None) or {}
+        rate = self.guild_rates.get(fields.get("guild_id"), self.rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts the records on the queue untouched: the listener runs in the same process,
+    so the message and the traceback are formatted by the background thread rather
+    than on the event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(settings: Optional[Mapping] = None) -> logging.handlers.QueueListener:
+    """
+    Send the logs of the bot, and of discord.py, through a queue to the console and
+    to rotating JSON-lines files.
+
+    Parameters
+    ----------
+    settings : Optional[Mapping]
+        The `logging` section of the config: `level`, `file`, `max_bytes`,
+        `backup_count`, `sample_rate` and `guild_sample_rates`.
+
+    Returns
+    -------
+    logging.handlers.QueueListener
+        The started listener writing the records, it should be stopped on shutdown
+        to flush the remaining records.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    settings = settings or {}
+    path = settings.get("file", LOG_FILE)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=settings.get("max_bytes", 10 * 1024 * 1024),
+        backupCount=settings.get("backup_count", 5),
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)-8s %(name)s: %(message)s")
+    )
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(
+        SamplingFilter(
+            settings.get("sample_rate", 1.0), settings.get("guild_sample_rates")
+        )
+    )
+    root = logging.getLogger()
+    root.setLevel(settings.get("level", "INFO"))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        records, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    _listener = listener
+    return listener
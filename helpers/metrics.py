@@ -0,0 +1,320 @@
+"""
+Latency and throughput metrics of the commands.
+
+Every command invocation gets a timing record, created when the `command` event is
+dispatched and finished with the `command_completion` or `command_error` event. The
+time spent in the checks, in the database and in the Discord REST API is accumulated
+on the record of the command currently running, found through a context variable,
+and every phase ends up in a per-command histogram.
+
+The Discord phase covers the requests made through the REST client of the bot,
+replies to slash commands go through the interaction webhook instead and are only
+part of the total.
+"""
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# The upper bounds of the histogram buckets, in seconds.
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PHASES = ("checks", "database", "discord", "total")
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram, percentiles are estimated by interpolating within the
+    bucket they fall into, bounded by the smallest and largest observed values.
+    """
+
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Estimate a percentile of the observed values.
+
+        Parameters
+        ----------
+        percentile : float
+            The percentile, between 0 and 100.
+
+        Returns
+        -------
+        float
+            The estimated value, in seconds.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = percentile / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = max(BUCKETS[index - 1] if index > 0 else 0.0, self.min)
+                upper = min(
+                    BUCKETS[index] if index < len(BUCKETS) else self.max, self.max
+                )
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+
+class CommandTiming:
+    """
+    The timing record of one command invocation.
+    """
+
+    __slots__ = ("command", "started_at", "checked_at", "database", "discord")
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.started_at = time.perf_counter()
+        self.checked_at: Optional[float] = None
+        self.database = 0.0
+        self.discord = 0.0
+
+
+_current: ContextVar[Optional[CommandTiming]] = ContextVar(
+    "current_command_timing", default=None
+)
+
+
+class Metrics:
+    """
+    Collects the timing records of the commands into histograms.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.outcomes: Counter = Counter()
+        self.started_at = time.time()
+
+    def start(self, context) -> None:
+        """
+        Start timing a command, called when the `command` event is dispatched.
+        """
+        if context.command is None:
+            return
+        timing = CommandTiming(context.command.qualified_name)
+        context.timing = timing
+        _current.set(timing)
+
+    def checks_done(self, context) -> None:
+        """
+        Mark the end of the checks and argument conversion of a command, called from
+        the global before invoke hook.
+        """
+        timing = getattr(context, "timing", None)
+        if timing is None:
+            return
+        timing.checked_at = time.perf_counter()
+
+    def finish(self, context, outcome: str) -> None:
+        """
+        Record the timing of a command, called when the `command_completion` or
+        `command_error` event is dispatched. The total latency is also kept on the
+        context, as `context.latency`, for the command log.
+        """
+        timing = getattr(context, "timing", None)
+        if timing is None:
+            return
+        context.timing = None
+        if _current.get() is timing:
+            _current.set(None)
+        now = time.perf_counter()
+        checked_at = timing.checked_at if timing.checked_at is not None else now
+        self._observe(timing.command, "checks", checked_at - timing.started_at)
+        self._observe(timing.command, "database", timing.database)
+        self._observe(timing.command, "discord", timing.discord)
+        context.latency = now - timing.started_at
+        self._observe(timing.command, "total", context.latency)
+        self.outcomes[(timing.command, outcome)] += 1
+
+    def _observe(self, command: str, phase: str, value: float) -> None:
+        histogram = self.histograms.get((command, phase))
+        if histogram is None:
+            histogram = self.histograms[(command, phase)] = Histogram()
+        histogram.observe(value)
+
+    def commands(self) -> List[str]:
+        """
+        Get the timed commands, the most used first.
+        """
+        counts = {
+            command: histogram.count
+            for (command, phase), histogram in self.histograms.items()
+            if phase == "total"
+        }
+        return sorted(counts, key=counts.get, reverse=True)
+
+    def summary(self, command: str) -> Dict[str, Dict[str, float]]:
+        """
+        Get the count and the p50, p95 and p99 latencies of every phase of a command.
+
+        Parameters
+        ----------
+        command : str
+            The qualified name of the command.
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            The statistics of each phase, the latencies are in seconds.
+        """
+        summary = {}
+        for phase in PHASES:
+            histogram = self.histograms.get((command, phase))
+            if histogram is None:
+                continue
+            summary[phase] = {
+                "count": histogram.count,
+                "p50": histogram.percentile(50),
+                "p95": histogram.percentile(95),
+                "p99": histogram.percentile(99),
+            }
+        return summary
+
+    def prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The metrics.
+        """
+        lines = [
+            "# HELP discord_bot_command_duration_seconds Time spent per command phase.",
+            "# TYPE discord_bot_command_duration_seconds histogram",
+        ]
+        for (command, phase), histogram in sorted(self.histograms.items()):
+            labels = f'command="{command}",phase="{phase}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"discord_bot_command_duration_seconds_bucket{{{labels},"
+                    f'le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f"discord_bot_command_duration_seconds_bucket{{{labels},"
+                f'le="+Inf"}} {histogram.count}'
+            )
+            lines.append(
+                f"discord_bot_command_duration_seconds_sum{{{labels}}} {histogram.sum}"
+            )
+            lines.append(
+                f"discord_bot_command_duration_seconds_count{{{labels}}} "
+                f"{histogram.count}"
+            )
+        lines.append("# HELP discord_bot_commands_total Executed commands by outcome.")
+        lines.append("# TYPE discord_bot_commands_total counter")
+        for (command, outcome), count in sorted(self.outcomes.items()):
+            lines.append(
+                f'discord_bot_commands_total{{command="{command}",'
+                f'outcome="{outcome}"}} {count}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _timed(phase: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return await func(*args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                setattr(
+                    timing,
+                    phase,
+                    getattr(timing, phase) + time.perf_counter() - started_at,
+                )
+
+        return wrapper
+
+    return decorator
+
+
+"""
+Decorators adding the time spent in a coroutine to the database or Discord phase of
+the command currently running:
+- @track_database # On the functions of the database manager
+- track_discord(bot.http.request) # On the REST client of the bot
+"""
+track_database = _timed("database")
+track_discord = _timed("discord")
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = metrics.prometheus().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_exporter(host: str = "127.0.0.1", port: int = 9100) -> asyncio.Server:
+    """
+    Serve the metrics in the Prometheus text format over HTTP.
+
+    Parameters
+    ----------
+    host : str
+        The address to listen on, local only by default.
+    port : int
+        The port to listen on.
+
+    Returns
+    -------
+    asyncio.Server
+        The server, it should be closed on shutdown.
+    """
+    return await asyncio.start_server(_serve, host, port)
@@ -0,0 +1,97 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+Every migration is a numbered `.sql` file in `database/migrations`, for example
+`002_integer_keys.sql`. The number of the last applied migration is stored in the
+database itself with `PRAGMA user_version`, and each migration runs in its own
+transaction together with the version bump, so a database is never left half
+upgraded.
+"""
+import os
+import re
+from typing import List, Tuple
+
+import aiosqlite
+
+MIGRATIONS_DIR = "database/migrations"
+
+_MIGRATION_FILE = re.compile(r"^(\d+)_\w+\.sql$")
+
+
+def get_migrations(directory: str = MIGRATIONS_DIR) -> List[Tuple[int, str]]:
+    """
+    List the migrations of a directory.
+
+    Parameters
+    ----------
+    directory : str
+        The directory containing the migration files.
+
+    Returns
+    -------
+    List[Tuple[int, str]]
+        The version and path of every migration, sorted by version.
+    """
+    migrations = []
+    for file_name in os.listdir(directory):
+        match = _MIGRATION_FILE.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(directory, file_name)))
+    migrations.sort()
+    return migrations
+
+
+async def get_version(db: aiosqlite.Connection) -> int:
+    """
+    Get the schema version of a database.
+
+    Parameters
+    ----------
+    db : aiosqlite.Connection
+        The connection to the database.
+
+    Returns
+    -------
+    int
+        The version of the last applied migration, 0 for a new database.
+    """
+    async with db.execute("PRAGMA user_version") as cursor:
+        result = await cursor.fetchone()
+        return result[0] if result is not None else 0
+
+
+async def migrate(
+    db: aiosqlite.Connection, directory: str = MIGRATIONS_DIR
+) -> List[int]:
+    """
+    Apply every migration newer than the current schema version of the database.
+
+    Parameters
+    ----------
+    db : aiosqlite.Connection
+        The connection to the database.
+    directory : str
+        The directory containing the migration files.
+
+    Returns
+    -------
+    List[int]
+        The versions of the migrations that have been applied.
+    """
+    current = await get_version(db)
+    applied = []
+    for version, path in get_migrations(directory):
+        if version <= current:
+            continue
+        with open(path) as migration_file:
+            script = migration_file.read()
+        try:
+            await db.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;"
+            )
+        except Exception:
+            if db.in_transaction:
+                await db.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -0,0 +1,137 @@
+"""
+Precompiled matching of the command prefixes.
+
+Most messages the bot receives are ordinary chat, so they are discarded by looking at
+their first character, then with one anchored regular expression per guild, before
+discord.py builds a context for them. The prefixes come from the config:
+
+    "prefix": "!",                          # or a list of prefixes
+    "guild_prefixes": {"<guild id>": "?"}   # or a list, replaces the default ones
+
+and mentioning the bot always works as a prefix, in every guild.
+"""
+import re
+from typing import Dict, FrozenSet, List, Mapping, Optional, Pattern, Tuple, Union
+
+
+def _as_list(prefixes: Union[str, List[str]]) -> List[str]:
+    return [prefixes] if isinstance(prefixes, str) else list(prefixes)
+
+
+def display_prefix(config: Mapping, guild_id: Optional[int]) -> str:
+    """
+    Get the prefix to show in the messages of the bot, the first one of the guild.
+
+    Parameters
+    ----------
+    config : Mapping
+        The current config.
+    guild_id : Optional[int]
+        The ID of the guild, None in private messages.
+
+    Returns
+    -------
+    str
+        The prefix.
+    """
+    prefixes = config.get("guild_prefixes", {}).get(str(guild_id))
+    if prefixes is None:
+        prefixes = config.get("prefix", "")
+    prefixes = _as_list(prefixes)
+    return prefixes[0] if prefixes else ""
+
+
+class _Prefixes:
+    __slots__ = ("prefixes", "first_characters", "pattern")
+
+    def __init__(self, prefixes: List[str]) -> None:
+        # The longest prefixes first, so that `!!` wins over `!`.
+        self.prefixes = sorted(set(filter(None, prefixes)), key=len, reverse=True)
+        self.first_characters: FrozenSet[str] = frozenset(
+            prefix[0] for prefix in self.prefixes
+        )
+        self.pattern: Pattern = re.compile(
+            "(" + "|".join(map(re.escape, self.prefixes)) + r")(\S*)"
+        )
+
+
+class PrefixMatcher:
+    """
+    Finds the prefix and the command name of a message, and counts the messages
+    discarded without being parsed.
+    """
+
+    def __init__(self) -> None:
+        self.checked = 0
+        self.discarded = 0
+        self._config: Optional[Mapping] = None
+        self._user_id: Optional[int] = None
+        self._default = _Prefixes([])
+        self._guilds: Dict[int, _Prefixes] = {}
+
+    def update(self, config: Mapping, user_id: Optional[int]) -> None:
+        """
+        Compile the prefixes again if the config or the user of the bot changed.
+
+        Parameters
+        ----------
+        config : Mapping
+            The current config.
+        user_id : Optional[int]
+            The ID of the bot, None before it has logged in.
+        """
+        if config is self._config and user_id == self._user_id:
+            return
+        self._config = config
+        self._user_id = user_id
+        mentions = [f"<@{user_id}> ", f"<@!{user_id}> "] if user_id else []
+        self._default = _Prefixes(mentions + _as_list(config.get("prefix", [])))
+        self._guilds = {
+            int(guild_id): _Prefixes(mentions + _as_list(prefixes))
+            for guild_id, prefixes in config.get("guild_prefixes", {}).items()
+        }
+
+    def prefixes(self, guild_id: Optional[int]) -> List[str]:
+        """
+        Get the prefixes of a guild, the default ones in private messages.
+
+        Parameters
+        ----------
+        guild_id : Optional[int]
+            The ID of the guild.
+
+        Returns
+        -------
+        List[str]
+            The prefixes, the longest first.
+        """
+        return self._guilds.get(guild_id, self._default).prefixes
+
+    def match(
+        self, content: str, guild_id: Optional[int]
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Find the prefix a message starts with and the command it invokes.
+
+        Parameters
+        ----------
+        content : str
+            The content of the message.
+        guild_id : Optional[int]
+            The ID of the guild of the message.
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            The prefix and the command name, None if the message isn't a command.
+        """
+        self.checked += 1
+        prefixes = self._guilds.get(guild_id, self._default)
+        if not content or content[0] not in prefixes.first_characters:
+            self.discarded += 1
+            return None
+        match = prefixes.pattern.match(content)
+        if match is None:
+            self.discarded += 1
+            return None
+        return match.group(1), match.group(2)
@@ -0,0 +1,156 @@
+"""
+Global rate limiting of the commands sent as messages.
+
+Every message that looks like a command takes tokens from three buckets, the one of
+its author, of its channel and of its guild, before it is parsed. A bucket holds up
+to `capacity` tokens and is refilled over `per` seconds, a message that would empty
+one of them is dropped without an answer, so that spam costs neither the checks nor
+the REST rate limits of the bot.
+
+The `rate_limits` section of the config sets the buckets, the cost of each command
+and overrides per guild:
+
+    "rate_limits": {
+        "user": {"capacity": 10, "per": 10},
+        "channel": {"capacity": 30, "per": 10},
+        "guild": {"capacity": 120, "per": 10},
+        "costs": {"help": 2, "server_info": 2},
+        "guilds": {"<guild id>": {"user": {"capacity": 5, "per": 10}}},
+        "max_buckets": 10000
+    }
+
+Only the most recently used buckets are kept, the others were full anyway.
+"""
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Mapping, Optional, Tuple
+
+SCOPES = ("user", "channel", "guild")
+
+DEFAULT_LIMITS = {
+    "user": {"capacity": 10, "per": 10.0},
+    "channel": {"capacity": 30, "per": 10.0},
+    "guild": {"capacity": 120, "per": 10.0},
+}
+
+# The capacity and the refill rate, in tokens per second, of each scope.
+Limits = Dict[str, Tuple[float, float]]
+
+
+def _limits(settings: Mapping, base: Optional[Limits] = None) -> Limits:
+    limits = dict(base or {})
+    for scope in SCOPES:
+        if scope in settings or base is None:
+            if base is None:
+                defaults = DEFAULT_LIMITS[scope]
+            else:
+                # A guild only overriding part of a bucket keeps the rest of the
+                # global one.
+                capacity, rate = base[scope]
+                defaults = {"capacity": capacity, "per": capacity / rate}
+            bucket = {**defaults, **settings.get(scope, {})}
+            limits[scope] = (bucket["capacity"], bucket["capacity"] / bucket["per"])
+    return limits
+
+
+class RateLimiter:
+    """
+    Token buckets per user, channel and guild, kept in a bounded LRU.
+    """
+
+    def __init__(self, settings: Optional[Mapping] = None) -> None:
+        self.buckets: "OrderedDict[Tuple[str, int], list]" = OrderedDict()
+        self.allowed = 0
+        self.rejected: Counter = Counter()
+        self._settings: Optional[Mapping] = None
+        self.configure(settings or {})
+
+    def configure(self, settings: Mapping) -> None:
+        """
+        Apply the `rate_limits` section of the config, the buckets are kept.
+
+        Parameters
+        ----------
+        settings : Mapping
+            The settings.
+        """
+        self._settings = settings
+        self.enabled = settings.get("enabled", True)
+        self.max_buckets = settings.get("max_buckets", 10_000)
+        self.costs = {
+            command.lower(): cost for command, cost in settings.get("costs", {}).items()
+        }
+        self.limits = _limits(settings)
+        self.guild_limits = {
+            int(guild_id): _limits(guild_settings, self.limits)
+            for guild_id, guild_settings in settings.get("guilds", {}).items()
+        }
+
+    def _take(
+        self, scope: str, key: int, cost: float, limits: Limits, now: float
+    ) -> Optional[list]:
+        capacity, rate = limits[scope]
+        bucket = self.buckets.get((scope, key))
+        if bucket is None:
+            bucket = self.buckets[(scope, key)] = [capacity, now]
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end((scope, key))
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket if bucket[0] >= cost else None
+
+    def allow(
+        self,
+        user_id: int,
+        channel_id: int,
+        guild_id: Optional[int],
+        command: Optional[str] = None,
+        settings: Optional[Mapping] = None,
+    ) -> bool:
+        """
+        Take the tokens of a command from the buckets of its user, channel and
+        guild, if all of them have enough.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the author of the message.
+        channel_id : int
+            The ID of the channel of the message.
+        guild_id : Optional[int]
+            The ID of the guild of the message, None in private messages.
+        command : Optional[str]
+            The qualified name of the command, to find its cost, not one of its
+            aliases.
+        settings : Optional[Mapping]
+            The current `rate_limits` section of the config, applied if it changed.
+
+        Returns
+        -------
+        bool
+            True if the command can go on, False if it should be dropped.
+        """
+        if settings is not None and settings is not self._settings:
+            if settings != self._settings:
+                self.configure(settings)
+        if not self.enabled:
+            return True
+        cost = self.costs.get(command.lower(), 1) if command else 1
+        limits = self.guild_limits.get(guild_id, self.limits)
+        now = time.monotonic()
+        keys = [("user", user_id), ("channel", channel_id)]
+        if guild_id is not None:
+            keys.append(("guild", guild_id))
+        buckets = []
+        for scope, key in keys:
+            bucket = self._take(scope, key, cost, limits, now)
+            if bucket is None:
+                self.rejected[scope] += 1
+                return False
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket[0] -= cost
+        self.allowed += 1
+        return True
@@ -0,0 +1,124 @@
+"""
+Health of the gateway connections, per shard.
+
+The bot counts the gateway events each shard receives, to get their rate over the
+last minute, and how many times each shard connected, resumed or was disconnected.
+A bot that isn't sharded has a single connection, counted as shard 0.
+"""
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# The event rate is averaged over this many seconds.
+RATE_WINDOW = 60
+
+
+class ShardHealth:
+    """
+    The counters of one shard.
+    """
+
+    __slots__ = ("events", "connects", "resumes", "disconnects", "_seconds")
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.connects = 0
+        self.resumes = 0
+        self.disconnects = 0
+        # The number of events received during each of the last seconds.
+        self._seconds: Deque[List[int]] = deque()
+
+    @property
+    def reconnects(self) -> int:
+        return max(0, self.connects - 1) + self.resumes
+
+    def event(self, now: int) -> None:
+        self.events += 1
+        if self._seconds and self._seconds[-1][0] == now:
+            self._seconds[-1][1] += 1
+            return
+        self._seconds.append([now, 1])
+        while self._seconds[0][0] <= now - RATE_WINDOW:
+            self._seconds.popleft()
+
+    def rate(self, now: int) -> float:
+        """
+        Get the number of events received per second over the last minute.
+        """
+        events = sum(
+            count for second, count in self._seconds if second > now - RATE_WINDOW
+        )
+        return events / RATE_WINDOW
+
+
+class ShardMonitor:
+    """
+    The health of every shard of the bot, fed by its `dispatch` method.
+    """
+
+    def __init__(self) -> None:
+        self.shards: Dict[int, ShardHealth] = {}
+
+    def _shard(self, shard_id: Optional[int]) -> ShardHealth:
+        shard_id = shard_id or 0
+        health = self.shards.get(shard_id)
+        if health is None:
+            health = self.shards[shard_id] = ShardHealth()
+        return health
+
+    def event(self, shard_id: Optional[int]) -> None:
+        self._shard(shard_id).event(int(time.monotonic()))
+
+    def connected(self, shard_id: Optional[int]) -> None:
+        self._shard(shard_id).connects += 1
+
+    def resumed(self, shard_id: Optional[int]) -> None:
+        self._shard(shard_id).resumes += 1
+
+    def disconnected(self, shard_id: Optional[int]) -> None:
+        self._shard(shard_id).disconnects += 1
+
+    def report(self, latencies: List[Tuple[int, float]]) -> List[dict]:
+        """
+        Get the health of every shard.
+
+        Parameters
+        ----------
+        latencies : List[Tuple[int, float]]
+            The ID and the heartbeat latency, in seconds, of each shard.
+
+        Returns
+        -------
+        List[dict]
+            The `shard_id`, `latency`, `events`, `event_rate` per second,
+            `reconnects` and `disconnects` of each shard.
+        """
+        now = int(time.monotonic())
+        report = []
+        for shard_id, latency in sorted(latencies):
+            health = self._shard(shard_id)
+            report.append(
+                {
+                    "shard_id": shard_id,
+                    "latency": latency,
+                    "events": health.events,
+                    "event_rate": health.rate(now),
+                    "reconnects": health.reconnects,
+                    "disconnects": health.disconnects,
+                }
+            )
+        return report
+
+
+def format_shard(shard: dict) -> str:
+    """
+    Render the health of a shard on one line, for the ping and shards commands.
+    """
+    latency = shard["latency"]
+    # The latency is NaN until the first heartbeat has been answered.
+    latency = "n/a" if math.isnan(latency) else f"{latency * 1000:.0f}ms"
+    return (
+        f"#{shard['shard_id']}: {latency}, {shard['event_rate']:.1f} events/s, "
+        f"{shard['reconnects']} reconnects"
+    )
@@ -0,0 +1,154 @@
+"""
+Group commit of the database writes.
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+import aiosqlite
+
+from helpers.db_pool import ConnectionPool
+
+T = TypeVar("T")
+
+Operation = Callable[[aiosqlite.Connection], Awaitable[T]]
+
+
+class WriteQueue:
+    """
+    Collects the writes submitted within a short window and runs them on the writer
+    connection of the pool in a single transaction, so a burst of writes costs one
+    commit, and one fsync, instead of one per write. A write submitted alone is
+    committed without waiting for the window.
+
+    Each write runs inside its own savepoint: a write that fails is rolled back on
+    its own and its error is raised to its caller, without affecting the other
+    writes of the batch. Callers only get their result once the transaction has
+    been committed.
+    """
+
+    def __init__(
+        self, pool: ConnectionPool, window: float = 0.005, max_batch: int = 256
+    ) -> None:
+        self.pool = pool
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.writes = 0
+        self._queue: "asyncio.Queue[Tuple[Operation, asyncio.Future]]" = (
+            asyncio.Queue()
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Start the background task committing the writes.
+        """
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Commit the pending writes and stop the background task.
+        """
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, operation: Operation) -> T:
+        """
+        Queue a write and wait until it has been committed.
+
+        Parameters
+        ----------
+        operation : Callable[[aiosqlite.Connection], Awaitable[T]]
+            The write, it receives the writer connection and must not commit.
+
+        Returns
+        -------
+        T
+            The value returned by the operation.
+        """
+        if not self.running:
+            raise RuntimeError("The write queue is not running.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Operation, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        # Let the writes submitted along with the first one reach the queue.
+        await asyncio.sleep(0)
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            # A lone write is committed right away, the window is only waited while
+            # a burst of writes is arriving. The writes submitted during a commit
+            # are in the queue for the next batch anyway.
+            if len(batch) == 1:
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: List[Tuple[Operation, asyncio.Future]]) -> None:
+        outcomes = []
+        try:
+            async with self.pool.writer() as db:
+                # Taking the write lock right away lets other processes sharing the
+                # database wait for it with the busy timeout, instead of failing
+                # when a read transaction is upgraded.
+                await db.execute("BEGIN IMMEDIATE")
+                for operation, future in batch:
+                    if future.done():
+                        continue
+                    await db.execute("SAVEPOINT write")
+                    try:
+                        result = await operation(db)
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO write")
+                        outcomes.append((future, None, e))
+                    else:
+                        outcomes.append((future, result, None))
+                    await db.execute("RELEASE write")
+                await db.commit()
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(outcomes)
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,201 @@
+"""
+Runs the bot as a cluster of worker processes, to use more than one core.
+
+    python launcher.py
+
+Every worker is a `bot.py` process running a slice of the shards, all of them
+sharing the SQLite database in WAL mode. The launcher applies the migrations once,
+starts the workers a few seconds apart so that their shards don't identify at the
+same time, restarts the ones that crash and relays the cache invalidations between
+them, see helpers/cluster.py. It is configured with the `cluster` section of the
+config:
+
+    "cluster": {
+        "workers": 4,        # the number of processes, one per core by default
+        "shard_count": 16    # asked to Discord when not set
+    }
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+import exceptions
+from helpers import db_manager, migrations
+from helpers.cluster import (
+    CLUSTER_ID_ENV,
+    IPC_ADDRESS_ENV,
+    IPC_TOKEN_ENV,
+    SHARD_COUNT_ENV,
+    SHARD_IDS_ENV,
+    IpcHub,
+)
+from helpers.config import config_service
+
+# Discord lets a bot identify one shard every 5 seconds.
+IDENTIFY_INTERVAL = 5.0
+
+# A worker that crashes sooner than this after starting is restarted with a growing
+# delay, so that a broken config or token doesn't make the launcher spin.
+STABLE_AFTER = 60.0
+MAX_RESTART_DELAY = 60.0
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s %(levelname)-8s %(name)s: %(message)s"
+)
+logger = logging.getLogger("discord_bot.launcher")
+
+
+def recommended_shards(token: str) -> int:
+    """
+    Ask Discord how many shards the bot should use.
+    """
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "DiscordBot launcher"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["shards"]
+
+
+def shard_slices(shard_count: int, workers: int) -> List[List[int]]:
+    """
+    Split the shards between the workers, every worker gets at least one.
+    """
+    workers = max(1, min(workers, shard_count))
+    return [list(range(shard_count))[worker::workers] for worker in range(workers)]
+
+
+class Worker:
+    def __init__(self, cluster_id: int, shard_ids: List[int]) -> None:
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restart_delay = 1.0
+        self.restarts = 0
+
+
+class Launcher:
+    def __init__(self, shard_count: int, workers: int) -> None:
+        self.shard_count = shard_count
+        self.workers = [
+            Worker(cluster_id, shard_ids)
+            for cluster_id, shard_ids in enumerate(shard_slices(shard_count, workers))
+        ]
+        self.hub = IpcHub(secrets.token_hex(16))
+        self.stopping = False
+
+    def environment(self, worker: Worker) -> Dict[str, str]:
+        return {
+            **os.environ,
+            CLUSTER_ID_ENV: str(worker.cluster_id),
+            SHARD_COUNT_ENV: str(self.shard_count),
+            SHARD_IDS_ENV: ",".join(map(str, worker.shard_ids)),
+            IPC_ADDRESS_ENV: self.hub.address,
+            IPC_TOKEN_ENV: self.hub.token,
+        }
+
+    async def start(self, worker: Worker) -> None:
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, "bot.py", env=self.environment(worker)
+        )
+        worker.started_at = time.monotonic()
+        logger.info(
+            "Started worker %s (pid %s) with shards %s",
+            worker.cluster_id,
+            worker.process.pid,
+            worker.shard_ids,
+        )
+
+    async def supervise(self, worker: Worker) -> None:
+        """
+        Restart a worker every time it exits, until the launcher stops. A worker
+        exiting on its own with a zero code, e.g. after the shutdown command, stops
+        the whole cluster.
+        """
+        while not self.stopping:
+            code = await worker.process.wait()
+            if self.stopping:
+                return
+            if code == 0:
+                logger.info("Worker %s shut down, stopping", worker.cluster_id)
+                self.stop()
+                return
+            if time.monotonic() - worker.started_at > STABLE_AFTER:
+                worker.restart_delay = 1.0
+            logger.error(
+                "Worker %s exited with code %s, restarting in %.0f seconds",
+                worker.cluster_id,
+                code,
+                worker.restart_delay,
+            )
+            await asyncio.sleep(worker.restart_delay)
+            worker.restart_delay = min(worker.restart_delay * 2, MAX_RESTART_DELAY)
+            worker.restarts += 1
+            if not self.stopping:
+                await self.start(worker)
+
+    def stop(self) -> None:
+        self.stopping = True
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                worker.process.terminate()
+
+    async def run(self) -> None:
+        await self.hub.start()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, self.stop)
+            except NotImplementedError:
+                # Windows, Ctrl+C still interrupts the workers themselves.
+                pass
+        supervisors = []
+        try:
+            for worker in self.workers:
+                if self.stopping:
+                    break
+                await self.start(worker)
+                supervisors.append(asyncio.create_task(self.supervise(worker)))
+                await asyncio.sleep(IDENTIFY_INTERVAL * len(worker.shard_ids))
+            await asyncio.gather(*supervisors)
+            for worker in self.workers:
+                if worker.process is not None:
+                    await worker.process.wait()
+        finally:
+            await self.hub.close()
+
+
+async def init_db() -> None:
+    async with aiosqlite.connect(db_manager.DATABASE) as db:
+        applied = await migrations.migrate(db)
+        for version in applied:
+            logger.info("Applied database migration %s", version)
+
+
+def main() -> None:
+    try:
+        config = config_service.load()
+    except exceptions.ConfigError as e:
+        sys.exit(e.message)
+    cluster = config.get("cluster", {})
+    shard_count = cluster.get("shard_count") or recommended_shards(config["token"])
+    workers = cluster.get("workers") or os.cpu_count() or 1
+    # The workers would all try to apply the migrations at once otherwise.
+    asyncio.run(init_db())
+    launcher = Launcher(shard_count, workers)
+    logger.info("Running %s shards in %s workers", shard_count, len(launcher.workers))
+    asyncio.run(launcher.run())
+
+
+if __name__ == "__main__":
+    main()
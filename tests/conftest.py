@@ -0,0 +1,44 @@
+"""
+The bot isn't an installed package, its modules are imported from the root of the
+repository like bot.py does.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+import aiosqlite  # noqa: E402
+
+from helpers import db_manager, migrations  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    """
+    Run a coroutine function with db_manager connected to a new, migrated database.
+
+    The pool needs a file shared by its connections, it is a temporary one without
+    any fsync, so it is as fast as an in-memory database.
+    """
+    path = str(tmp_path / "database.db")
+
+    def run(scenario):
+        async def main():
+            async with aiosqlite.connect(path) as db:
+                await migrations.migrate(
+                    db, os.path.join(ROOT, migrations.MIGRATIONS_DIR)
+                )
+            await db_manager.connect(path, readers=2, durability="fast")
+            try:
+                return await scenario()
+            finally:
+                await db_manager.close()
+
+        return asyncio.run(main())
+
+    return run
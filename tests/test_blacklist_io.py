@@ -0,0 +1,141 @@
+import gzip
+import io
+import json
+import os
+from typing import List, Tuple
+
+import pytest
+
+from helpers import blacklist_io, db_manager
+from helpers.blacklist_io import MAX_PENDING, UserIdReader, file_format, fit_upload
+
+
+def read(
+    file_format: str, data: bytes, chunk_size: int, gzipped: bool = False
+) -> Tuple[List[int], int]:
+    reader = UserIdReader(file_format, gzipped)
+    user_ids = []
+    for start in range(0, len(data), chunk_size):
+        user_ids += reader.feed(data[start : start + chunk_size])
+    user_ids += reader.feed(b"", final=True)
+    return user_ids, reader.invalid
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+def test_reads_a_csv_export(chunk_size) -> None:
+    data = b"user_id,created_at\r\n123,1700000000\r\n456,1700000000\r\n\r\n789,0"
+    assert read("csv", data, chunk_size) == ([123, 456, 789], 0)
+
+
+def test_reads_a_csv_without_header() -> None:
+    data = "\ufeff123\n 456 ,note\nnot an id\n0\n-5\n".encode()
+    assert read("csv", data, 3) == ([123, 456], 3)
+
+
+def test_only_splits_csv_rows_on_line_feeds() -> None:
+    data = '123,"a\u2028b"\n456,"c\x1cd"\n'.encode()
+    assert read("csv", data, 4) == ([123, 456], 0)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_reads_a_json_export(chunk_size) -> None:
+    data = json.dumps(
+        [
+            {"user_id": 123, "created_at": 1700000000},
+            {"id": "456"},
+            789,
+            "1011",
+            1213141516171819,
+            None,
+            True,
+            1.5,
+            {"name": "no ID"},
+        ]
+    ).encode()
+    assert read("json", data, chunk_size) == (
+        [123, 456, 789, 1011, 1213141516171819],
+        4,
+    )
+
+
+def test_reads_an_empty_json_array() -> None:
+    assert read("json", b" [ ] \n", 1) == ([], 0)
+
+
+def test_rejects_ids_bigger_than_a_snowflake() -> None:
+    assert read("json", f"[{2**63 - 1}, {2**63}]".encode(), 1) == ([2**63 - 1], 1)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b'{"user_id": 123}', b"[123, 456", b"[123] [456]", b"[123, {]"],
+)
+def test_rejects_malformed_json(data) -> None:
+    with pytest.raises(ValueError):
+        read("json", data, 2)
+
+
+@pytest.mark.parametrize("file_format", ["csv", "json"])
+def test_rejects_entries_too_long(file_format) -> None:
+    reader = UserIdReader(file_format)
+    prefix = b"[" if file_format == "json" else b""
+    with pytest.raises(ValueError):
+        reader.feed(prefix + b'"' + b"1" * (MAX_PENDING + 1))
+
+
+def test_rejects_unknown_formats() -> None:
+    with pytest.raises(ValueError):
+        UserIdReader("xml")
+
+
+def test_guesses_the_format_from_the_file_name() -> None:
+    assert file_format("blacklist.JSON") == "json"
+    assert file_format("blacklist.csv") == "csv"
+    assert file_format("blacklist") == "csv"
+    assert file_format("blacklist.json.gz") == "json"
+    assert file_format("blacklist.csv.GZ") == "csv"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 65536])
+def test_reads_gzipped_files(chunk_size) -> None:
+    data = gzip.compress(b"user_id,created_at\n" + b"123,0\n" * 50_000 + b"456,0")
+    user_ids, invalid = read("csv", data, chunk_size, gzipped=True)
+    assert len(user_ids) == 50_001
+    assert user_ids[-2:] == [123, 456]
+    assert invalid == 0
+
+
+@pytest.mark.parametrize("data", [gzip.compress(b"123\n")[:-4], b"123\n"])
+def test_rejects_corrupt_gzipped_files(data) -> None:
+    with pytest.raises(ValueError):
+        read("csv", data, 3, gzipped=True)
+
+
+def test_uploads_small_exports_as_they_are() -> None:
+    file = io.BytesIO(b"user_id,created_at\n123,0\n")
+    assert fit_upload(file, "blacklist.csv", 1024) == (file, "blacklist.csv")
+
+
+def test_gzips_exports_over_the_upload_limit(database) -> None:
+    async def scenario():
+        await db_manager.add_users_to_blacklist(range(1, 5001))
+        with await blacklist_io.export_blacklist("json") as export:
+            size = export.seek(0, os.SEEK_END)
+            export.seek(0)
+            upload, filename = fit_upload(export, "blacklist.json", size // 2)
+            with upload:
+                return filename, upload.read(), size
+
+    filename, data, size = database(scenario)
+    assert filename == "blacklist.json.gz"
+    assert len(data) <= size // 2
+    assert read(file_format(filename), data, 4096, gzipped=True) == (
+        list(range(1, 5001)),
+        0,
+    )
+
+
+def test_refuses_exports_too_big_even_gzipped() -> None:
+    file = io.BytesIO(os.urandom(4096))
+    with pytest.raises(ValueError, match="upload limit"):
+        fit_upload(file, "blacklist.csv", 1024)
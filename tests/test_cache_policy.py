@@ -0,0 +1,22 @@
+import builtins
+import sys
+
+from helpers import cache_policy
+
+
+def test_measures_the_resident_memory() -> None:
+    assert cache_policy.rss_bytes() > 0
+
+
+def test_measures_nothing_without_proc_and_resource(monkeypatch) -> None:
+    # Like on Windows: no /proc, and importing the resource module fails.
+    open_file = builtins.open
+
+    def open_without_proc(path, *args, **kwargs):
+        if str(path).startswith("/proc"):
+            raise FileNotFoundError(path)
+        return open_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", open_without_proc)
+    monkeypatch.setitem(sys.modules, "resource", None)
+    assert cache_policy.rss_bytes() == 0
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import discord
+import pytest
+from discord import app_commands
+
+from helpers.command_sync import GLOBAL_SCOPE, CommandSync, describe
+
+GUILD_ID = 100
+
+
+def build_tree(
+    description: str = "Check if the bot is alive.",
+) -> app_commands.CommandTree:
+    tree = app_commands.CommandTree(discord.Client(intents=discord.Intents.none()))
+
+    @tree.command(name="ping", description=description)
+    async def ping(interaction: discord.Interaction) -> None:
+        pass
+
+    @tree.command(name="help", description="List the commands.")
+    async def help(interaction: discord.Interaction) -> None:
+        pass
+
+    @tree.context_menu(name="ping")
+    async def ping_user(interaction: discord.Interaction, user: discord.User) -> None:
+        pass
+
+    @tree.command(name="sync", description="Sync the commands.")
+    @app_commands.guilds(GUILD_ID)
+    async def sync(interaction: discord.Interaction) -> None:
+        pass
+
+    return tree
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    synced = []
+
+    async def sync(self, *, guild=None):
+        synced.append(GLOBAL_SCOPE if guild is None else str(guild.id))
+
+    monkeypatch.setattr(app_commands.CommandTree, "sync", sync)
+    return synced
+
+
+def command_sync(tmp_path, tree: app_commands.CommandTree) -> CommandSync:
+    return CommandSync(
+        tree, str(tmp_path / "command_sync.json"), guild_ids=lambda: [GUILD_ID, 200]
+    )
+
+
+def digests(tree: app_commands.CommandTree, scope: str = GLOBAL_SCOPE) -> dict:
+    return asyncio.run(CommandSync(tree).command_digests(scope))
+
+
+def test_digests_are_stable_and_follow_the_payloads() -> None:
+    first = digests(build_tree())
+    assert sorted(first) == ["help", "ping", "ping (user)"]
+    assert digests(build_tree()) == first
+    assert list(digests(build_tree(), str(GUILD_ID))) == ["sync"]
+    changed = digests(build_tree("Pong!"))
+    assert changed["ping"] != first["ping"]
+    assert changed["help"] == first["help"]
+
+
+def test_syncs_the_scopes_with_commands_once(tmp_path, synced) -> None:
+    sync = command_sync(tmp_path, build_tree())
+    diffs = asyncio.run(sync.sync())
+    assert synced == [GLOBAL_SCOPE, str(GUILD_ID)]
+    assert diffs[0].added == ["help", "ping", "ping (user)"]
+    assert describe(diffs[1]) == "added: sync"
+    assert asyncio.run(sync.sync()) == []
+    assert synced == [GLOBAL_SCOPE, str(GUILD_ID)]
+
+
+def test_only_syncs_the_scopes_that_changed(tmp_path, synced) -> None:
+    asyncio.run(command_sync(tmp_path, build_tree()).sync())
+    synced.clear()
+    diffs = asyncio.run(command_sync(tmp_path, build_tree("Pong!")).sync())
+    assert synced == [GLOBAL_SCOPE]
+    assert describe(diffs[0]) == "changed: ping"
+
+
+def test_syncs_a_guild_whose_commands_were_removed(tmp_path, synced) -> None:
+    asyncio.run(command_sync(tmp_path, build_tree()).sync())
+    synced.clear()
+    tree = build_tree()
+    tree.remove_command("sync", guild=discord.Object(GUILD_ID))
+    diffs = asyncio.run(command_sync(tmp_path, tree).sync())
+    assert synced == [str(GUILD_ID)]
+    assert describe(diffs[0]) == "removed: sync"
+
+
+def test_force_syncs_every_scope(tmp_path, synced) -> None:
+    sync = command_sync(tmp_path, build_tree())
+    asyncio.run(sync.sync())
+    assert [diff.scope for diff in asyncio.run(sync.sync(force=True))] == [
+        GLOBAL_SCOPE,
+        str(GUILD_ID),
+    ]
+    assert describe(asyncio.run(sync.diff())[0]) == "nothing changed"
+
+
+@pytest.mark.parametrize("content", ["{not json", "[]", '{"guild": {}}', ""])
+def test_ignores_an_unreadable_state(tmp_path, synced, content) -> None:
+    sync = command_sync(tmp_path, build_tree())
+    with open(sync.path, "w") as file:
+        file.write(content)
+    assert sync.load_state() == {}
+    asyncio.run(sync.sync())
+    assert synced == [GLOBAL_SCOPE, str(GUILD_ID)]
+    with open(sync.path) as file:
+        assert set(json.load(file)) == {GLOBAL_SCOPE, str(GUILD_ID)}
@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+import aiosqlite
+
+from helpers import migrations
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database/migrations"
+)
+
+# The schema of the databases created before the migrations, IDs stored as text.
+LEGACY_SCHEMA = """
+CREATE TABLE `blacklist` (
+  `user_id` varchar(20) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE `warns` (
+  `id` int(11) NOT NULL,
+  `user_id` varchar(20) NOT NULL,
+  `server_id` varchar(20) NOT NULL,
+  `moderator_id` varchar(20) NOT NULL,
+  `reason` varchar(255) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+async def legacy_database(path: str) -> None:
+    async with aiosqlite.connect(path) as db:
+        await db.executescript(LEGACY_SCHEMA)
+        await db.executemany(
+            "INSERT INTO blacklist(user_id) VALUES (?)",
+            [("123456789012345678",), ("5",), ("5",)],
+        )
+        # Concurrent inserts gave two warnings of the first user the ID 2.
+        await db.executemany(
+            "INSERT INTO warns(id, user_id, server_id, moderator_id, reason) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (1, "10", "1", "99", "first"),
+                (2, "10", "1", "99", "second"),
+                (2, "10", "1", "99", "duplicate"),
+                (3, "10", "1", "99", "third"),
+                (1, "11", "1", "99", "other user"),
+                (1, "10", "2", "99", "other server"),
+            ],
+        )
+        await db.commit()
+
+
+async def dump(db: aiosqlite.Connection) -> tuple:
+    async with db.execute(
+        "SELECT user_id, typeof(user_id) FROM blacklist ORDER BY user_id"
+    ) as cursor:
+        blacklist = await cursor.fetchall()
+    async with db.execute(
+        "SELECT server_id, user_id, id, reason, typeof(server_id), typeof(user_id) "
+        "FROM warns ORDER BY server_id, user_id, id"
+    ) as cursor:
+        warns = await cursor.fetchall()
+    return blacklist, warns
+
+
+def test_migrates_a_legacy_database(tmp_path) -> None:
+    async def run():
+        path = str(tmp_path / "database.db")
+        await legacy_database(path)
+        async with aiosqlite.connect(path) as db:
+            assert await migrations.migrate(db, MIGRATIONS_DIR) == [1, 2]
+            assert await migrations.get_version(db) == 2
+            return await dump(db)
+
+    blacklist, warns = asyncio.run(run())
+    assert blacklist == [(5, "integer"), (123456789012345678, "integer")]
+    assert [warn[:4] for warn in warns] == [
+        (1, 10, 1, "first"),
+        (1, 10, 2, "second"),
+        (1, 10, 3, "third"),
+        # The duplicate is numbered after the last warning of the user.
+        (1, 10, 4, "duplicate"),
+        (1, 11, 1, "other user"),
+        (2, 10, 1, "other server"),
+    ]
+    assert {warn[4:] for warn in warns} == {("integer", "integer")}
+
+
+def test_migrating_again_changes_nothing(tmp_path) -> None:
+    async def run():
+        path = str(tmp_path / "database.db")
+        await legacy_database(path)
+        async with aiosqlite.connect(path) as db:
+            await migrations.migrate(db, MIGRATIONS_DIR)
+            before = await dump(db)
+            applied = await migrations.migrate(db, MIGRATIONS_DIR)
+            return before, applied, await dump(db), await migrations.get_version(db)
+
+    before, applied, after, version = asyncio.run(run())
+    assert applied == []
+    assert after == before
+    assert version == 2
+
+
+def test_migrates_a_new_database(tmp_path) -> None:
+    async def run():
+        async with aiosqlite.connect(str(tmp_path / "database.db")) as db:
+            assert await migrations.get_version(db) == 0
+            applied = await migrations.migrate(db, MIGRATIONS_DIR)
+            return applied, await dump(db)
+
+    assert asyncio.run(run()) == ([1, 2], ([], []))
+
+
+def test_lists_the_migrations_in_order(tmp_path) -> None:
+    for file_name in ("010_later.sql", "002_second.sql", "notes.txt", "1.sql"):
+        (tmp_path / file_name).write_text("")
+    assert migrations.get_migrations(str(tmp_path)) == [
+        (2, str(tmp_path / "002_second.sql")),
+        (10, str(tmp_path / "010_later.sql")),
+    ]
@@ -0,0 +1,68 @@
+from helpers.prefixes import PrefixMatcher, display_prefix
+
+BOT_ID = 42
+
+CONFIG = {"prefix": ["!", "!!"], "guild_prefixes": {"100": "?"}}
+
+
+def matcher(config=CONFIG, user_id=BOT_ID) -> PrefixMatcher:
+    matcher = PrefixMatcher()
+    matcher.update(config, user_id)
+    return matcher
+
+
+def test_finds_the_prefix_and_the_command() -> None:
+    prefixes = matcher()
+    assert prefixes.match("!ping", None) == ("!", "ping")
+    assert prefixes.match("!warning list @user", 200) == ("!", "warning")
+    # The longest prefix wins.
+    assert prefixes.match("!!ping", None) == ("!!", "ping")
+    assert prefixes.prefixes(None)[:2] == [f"<@!{BOT_ID}> ", f"<@{BOT_ID}> "]
+
+
+def test_discards_the_other_messages() -> None:
+    prefixes = matcher()
+    assert prefixes.match("hello", None) is None
+    assert prefixes.match("", None) is None
+    assert prefixes.match("?ping", None) is None
+    assert (prefixes.checked, prefixes.discarded) == (3, 3)
+
+
+def test_guild_prefixes_replace_the_default_ones() -> None:
+    prefixes = matcher()
+    assert prefixes.match("?ping", 100) == ("?", "ping")
+    assert prefixes.match("!ping", 100) is None
+    assert prefixes.match("!ping", 200) == ("!", "ping")
+
+
+def test_mentioning_the_bot_works_everywhere() -> None:
+    prefixes = matcher()
+    for guild_id in (None, 100):
+        assert prefixes.match(f"<@{BOT_ID}> ping", guild_id) == (
+            f"<@{BOT_ID}> ",
+            "ping",
+        )
+        assert prefixes.match(f"<@!{BOT_ID}> ping", guild_id)[1] == "ping"
+    assert prefixes.match("<@7> ping", None) is None
+    assert matcher(user_id=None).match(f"<@{BOT_ID}> ping", None) is None
+
+
+def test_prefixes_are_literal() -> None:
+    prefixes = matcher({"prefix": ".*"})
+    assert prefixes.match(".*ping", None) == (".*", "ping")
+    assert prefixes.match(".ping", None) is None
+
+
+def test_compiles_again_when_the_config_changes() -> None:
+    prefixes = matcher()
+    prefixes.update({"prefix": "$"}, BOT_ID)
+    assert prefixes.match("$ping", None) == ("$", "ping")
+    assert prefixes.match("!ping", None) is None
+    assert prefixes.match("?ping", 100) is None
+
+
+def test_displays_the_first_prefix_of_the_guild() -> None:
+    assert display_prefix(CONFIG, None) == "!"
+    assert display_prefix(CONFIG, 100) == "?"
+    assert display_prefix({"prefix": "$"}, 200) == "$"
+    assert display_prefix({"prefix": []}, None) == ""
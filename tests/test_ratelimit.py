@@ -0,0 +1,97 @@
+import types
+
+import pytest
+
+from helpers import ratelimit
+from helpers.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(
+        ratelimit, "time", types.SimpleNamespace(monotonic=lambda: clock.now)
+    )
+    return clock
+
+
+def test_empties_and_refills_the_user_bucket(clock) -> None:
+    limiter = RateLimiter({"user": {"capacity": 3, "per": 3}})
+    assert [limiter.allow(1, 10, 100) for _ in range(4)] == [True, True, True, False]
+    assert limiter.rejected["user"] == 1
+    clock.now += 1
+    assert limiter.allow(1, 10, 100)
+    assert not limiter.allow(1, 10, 100)
+    # Other users have their own bucket.
+    assert limiter.allow(2, 10, 100)
+
+
+def test_a_full_channel_rejects_every_user(clock) -> None:
+    limiter = RateLimiter({"channel": {"capacity": 2, "per": 10}})
+    assert limiter.allow(1, 10, 100)
+    assert limiter.allow(2, 10, 100)
+    assert not limiter.allow(3, 10, 100)
+    assert limiter.rejected["channel"] == 1
+    assert limiter.allow(3, 11, 100)
+
+
+def test_private_messages_skip_the_guild_bucket(clock) -> None:
+    limiter = RateLimiter({"guild": {"capacity": 1, "per": 10}})
+    assert limiter.allow(1, 10, None)
+    assert limiter.allow(1, 10, None)
+    assert not any(scope == "guild" for scope, _ in limiter.buckets)
+
+
+def test_a_rejected_command_takes_no_tokens(clock) -> None:
+    limiter = RateLimiter(
+        {"user": {"capacity": 2, "per": 10}, "channel": {"capacity": 1, "per": 10}}
+    )
+    assert limiter.allow(1, 10, 100)
+    assert not limiter.allow(1, 10, 100)
+    # The user bucket still has its second token.
+    assert limiter.allow(1, 11, 100)
+
+
+def test_commands_cost_their_configured_tokens(clock) -> None:
+    limiter = RateLimiter(
+        {"user": {"capacity": 4, "per": 4}, "costs": {"Server_Info": 3}}
+    )
+    assert limiter.allow(1, 10, 100, "server_info")
+    assert not limiter.allow(1, 10, 100, "SERVER_INFO")
+    assert limiter.allow(1, 10, 100, "ping")
+    assert not limiter.allow(1, 10, 100)
+
+
+def test_guild_overrides_inherit_the_global_limits() -> None:
+    limiter = RateLimiter(
+        {
+            "user": {"capacity": 20, "per": 10},
+            "guilds": {"100": {"user": {"capacity": 40}}},
+        }
+    )
+    assert limiter.limits["user"] == (20, 2.0)
+    assert limiter.guild_limits[100]["user"] == (40, 4.0)
+    assert limiter.guild_limits[100]["channel"] == limiter.limits["channel"]
+    assert limiter.limits["guild"] == (120, 12.0)
+
+
+def test_keeps_the_most_recently_used_buckets(clock) -> None:
+    limiter = RateLimiter({"max_buckets": 3})
+    limiter.allow(1, 10, None)
+    limiter.allow(2, 10, None)
+    limiter.allow(1, 10, None)
+    limiter.allow(3, 10, None)
+    assert list(limiter.buckets) == [("user", 1), ("user", 3), ("channel", 10)]
+
+
+def test_applies_changed_settings(clock) -> None:
+    limiter = RateLimiter({"user": {"capacity": 1, "per": 10}})
+    assert limiter.allow(1, 10, 100, settings=limiter._settings)
+    assert not limiter.allow(1, 10, 100, settings=limiter._settings)
+    settings = {"user": {"capacity": 2, "per": 10}}
+    # The buckets are kept, and refilled at the new rate.
+    assert not limiter.allow(1, 10, 100, settings=settings)
+    clock.now += 5
+    assert limiter.allow(1, 10, 100, settings=settings)
+    assert limiter.allow(1, 10, 100, settings={"enabled": False})
+    assert limiter.allowed == 2
@@ -0,0 +1,86 @@
+from helpers import db_manager
+
+SERVER_ID = 1
+USER_ID = 10
+PAGE = 10
+
+
+async def add_warns(count: int) -> None:
+    for _ in range(count):
+        await db_manager.add_warn(USER_ID, SERVER_ID, 99, "Spam")
+
+
+async def page(**kwargs) -> list:
+    warnings = await db_manager.get_warnings_page(
+        USER_ID, SERVER_ID, limit=PAGE, **kwargs
+    )
+    # The ID is the last column of a warning.
+    return [warning[-1] for warning in warnings]
+
+
+def test_a_user_without_warnings_has_empty_pages(database) -> None:
+    async def scenario():
+        return [await page(), await page(before_id=5), await page(after_id=0)]
+
+    assert database(scenario) == [[], [], []]
+
+
+def test_pages_end_exactly_on_a_boundary(database) -> None:
+    async def scenario():
+        await add_warns(2 * PAGE)
+        first = await page()
+        second = await page(before_id=first[-1])
+        return first, second, await page(before_id=second[-1])
+
+    first, second, after_last = database(scenario)
+    assert first == list(range(20, 10, -1))
+    assert second == list(range(10, 0, -1))
+    assert after_last == []
+
+
+def test_pages_back_to_the_first_page(database) -> None:
+    async def scenario():
+        await add_warns(PAGE + 5)
+        first = await page()
+        second = await page(before_id=first[-1])
+        return first, second, await page(after_id=second[0])
+
+    first, second, back = database(scenario)
+    assert second == list(range(5, 0, -1))
+    # The previous page is newest first too.
+    assert back == first
+
+
+def test_paging_back_from_the_first_page_is_empty(database) -> None:
+    async def scenario():
+        await add_warns(PAGE + 5)
+        first = await page()
+        return await page(after_id=first[0])
+
+    assert database(scenario) == []
+
+
+def test_a_warning_deleted_between_pages_shifts_nothing(database) -> None:
+    async def scenario():
+        await add_warns(2 * PAGE + 5)
+        first = await page()
+        # The last warning of the page, then the first one of the next page.
+        await db_manager.remove_warn(first[-1], USER_ID, SERVER_ID)
+        await db_manager.remove_warn(first[-1] - 1, USER_ID, SERVER_ID)
+        second = await page(before_id=first[-1])
+        return first, second, await page(after_id=second[0])
+
+    first, second, back = database(scenario)
+    assert first == list(range(25, 15, -1))
+    assert second == list(range(14, 4, -1))
+    assert back == first[:-1]
+
+
+def test_a_warning_added_between_pages_shifts_nothing(database) -> None:
+    async def scenario():
+        await add_warns(PAGE + 5)
+        first = await page()
+        await add_warns(1)
+        return await page(before_id=first[-1])
+
+    assert database(scenario) == list(range(5, 0, -1))
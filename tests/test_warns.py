@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from helpers import db_manager
+
+SERVER_ID = 1
+MODERATOR_ID = 99
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "select then insert"])
+def returning(request, monkeypatch):
+    monkeypatch.setattr(db_manager, "_HAS_RETURNING", request.param)
+
+
+def test_concurrent_warns_get_unique_contiguous_ids(database, returning) -> None:
+    async def scenario():
+        warn_ids = await asyncio.gather(
+            *(
+                db_manager.add_warn(user_id, SERVER_ID, MODERATOR_ID, "Spam")
+                for _ in range(50)
+                for user_id in (10, 11)
+            )
+        )
+        return warn_ids, await db_manager.get_warnings(10, SERVER_ID)
+
+    warn_ids, warnings = database(scenario)
+    assert sorted(warn_ids[::2]) == list(range(1, 51))
+    assert sorted(warn_ids[1::2]) == list(range(1, 51))
+    # The ID is the last column of a warning.
+    assert [warning[-1] for warning in warnings] == list(range(1, 51))
+
+
+def test_bulk_warns_continue_after_the_last_id(database, returning) -> None:
+    async def scenario():
+        await db_manager.add_warn(10, SERVER_ID, MODERATOR_ID, "Spam")
+        bulk, single = await asyncio.gather(
+            db_manager.add_warns([10, 11, 12], SERVER_ID, MODERATOR_ID, "Raid"),
+            db_manager.add_warn(10, SERVER_ID, MODERATOR_ID, "Spam"),
+        )
+        return bulk, single
+
+    bulk, single = database(scenario)
+    assert bulk[1:] == [1, 1]
+    assert sorted([bulk[0], single]) == [2, 3]
+
+
+def test_ids_restart_per_user_and_server(database, returning) -> None:
+    async def scenario():
+        await db_manager.add_warn(10, SERVER_ID, MODERATOR_ID, "Spam")
+        await db_manager.remove_warn(1, 10, SERVER_ID)
+        return [
+            await db_manager.add_warn(10, SERVER_ID, MODERATOR_ID, "Spam"),
+            await db_manager.add_warn(10, 2, MODERATOR_ID, "Spam"),
+        ]
+
+    assert database(scenario) == [1, 1]
@@ -0,0 +1,118 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+from helpers.db_pool import ConnectionPool
+from helpers.write_queue import WriteQueue
+
+
+def insert(value: int, fail: bool = False):
+    async def operation(db: aiosqlite.Connection) -> int:
+        assert db.in_transaction
+        await db.execute("INSERT INTO items(value) VALUES (?)", (value,))
+        if fail:
+            raise ValueError(value)
+        return value
+
+    return operation
+
+
+async def run_queue(tmp_path, window: float, scenario):
+    pool = ConnectionPool(str(tmp_path / "database.db"), readers=1, durability="fast")
+    await pool.open()
+    async with pool.writer() as db:
+        await db.execute("CREATE TABLE items(value INTEGER NOT NULL)")
+        await db.commit()
+    queue = WriteQueue(pool, window=window)
+    queue.start()
+    try:
+        result = await scenario(queue, pool)
+    finally:
+        await queue.stop()
+        await pool.close()
+    return result
+
+
+async def committed(pool: ConnectionPool) -> list:
+    async with pool.reader() as db:
+        async with db.execute("SELECT value FROM items ORDER BY value") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+
+def test_concurrent_writes_share_one_transaction(tmp_path) -> None:
+    async def scenario(queue, pool):
+        results = await asyncio.gather(*(queue.submit(insert(i)) for i in range(10)))
+        return results, queue.batches, queue.writes, await committed(pool)
+
+    results, batches, writes, values = asyncio.run(run_queue(tmp_path, 0.05, scenario))
+    assert results == list(range(10))
+    assert (batches, writes) == (1, 10)
+    assert values == list(range(10))
+
+
+def test_writes_arriving_within_the_window_join_the_batch(tmp_path) -> None:
+    async def scenario(queue, pool):
+        async def late(value):
+            await asyncio.sleep(0.01)
+            return await queue.submit(insert(value))
+
+        await asyncio.gather(
+            queue.submit(insert(1)), queue.submit(insert(2)), late(3), late(4)
+        )
+        return queue.batches, await committed(pool)
+
+    assert asyncio.run(run_queue(tmp_path, 1.0, scenario)) == (1, [1, 2, 3, 4])
+
+
+def test_results_are_only_returned_once_committed(tmp_path) -> None:
+    async def scenario(queue, pool):
+        seen = []
+
+        async def submit(value):
+            await queue.submit(insert(value))
+            # A reader connection only sees committed rows.
+            seen.append(value in await committed(pool))
+
+        await asyncio.gather(*(submit(i) for i in range(5)))
+        return seen
+
+    assert asyncio.run(run_queue(tmp_path, 0.05, scenario)) == [True] * 5
+
+
+def test_a_failing_write_only_rolls_back_itself(tmp_path) -> None:
+    async def scenario(queue, pool):
+        results = await asyncio.gather(
+            queue.submit(insert(1)),
+            queue.submit(insert(2, fail=True)),
+            queue.submit(insert(3)),
+            return_exceptions=True,
+        )
+        return results, queue.batches, await committed(pool)
+
+    results, batches, values = asyncio.run(run_queue(tmp_path, 0.05, scenario))
+    assert results[0] == 1 and results[2] == 3
+    assert isinstance(results[1], ValueError) and results[1].args == (2,)
+    assert batches == 1
+    assert values == [1, 3]
+
+
+def test_a_lone_write_does_not_wait_for_the_window(tmp_path) -> None:
+    async def scenario(queue, pool):
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        await asyncio.wait_for(queue.submit(insert(1)), timeout=5)
+        return loop.time() - started_at, queue.batches
+
+    elapsed, batches = asyncio.run(run_queue(tmp_path, 60.0, scenario))
+    assert elapsed < 5
+    assert batches == 1
+
+
+def test_refuses_writes_when_stopped(tmp_path) -> None:
+    async def scenario():
+        queue = WriteQueue(ConnectionPool(str(tmp_path / "database.db")))
+        with pytest.raises(RuntimeError):
+            await queue.submit(insert(1))
+
+    asyncio.run(scenario())